@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: loading dump files as lists of strings vs compact records
+"""
+
+# Standard imports
+import argparse
+import csv
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+
+# Local imports
+from common_utils import (ALG_DUMP_EXT, DUMP_FIELDS_SEP,  # noqa: E402
+                          SAMPLE_TYPES, VCF_DUMP_EXT, ALGDumpRecord,
+                          VCFDumpRecord, read_dump_records)
+
+
+def get_run_dump_files(results_dir):
+    """
+    Returns the run-level dump files found below results_dir
+    :param: results_dir (str): directory containing one or several batches
+
+    :return: list((str, namedtuple)): dump file path and record type
+    """
+    dump_files = []
+    for root, _, files in os.walk(results_dir):
+        if os.path.abspath(root) == os.path.abspath(results_dir):
+            continue
+        for file_name in sorted(files):
+            # Aggregated dump files are not in a run directory
+            if file_name.split('_')[0] in SAMPLE_TYPES:
+                continue
+            file_path = os.path.join(root, file_name)
+            if file_name.endswith(ALG_DUMP_EXT):
+                dump_files.append((file_path, ALGDumpRecord))
+            elif file_name.endswith(VCF_DUMP_EXT):
+                dump_files.append((file_path, VCFDumpRecord))
+    return dump_files
+
+
+def load_lists(dump_files):
+    rows = []
+    for dump_file, _ in dump_files:
+        for data_row in csv.DictReader(open(dump_file),
+                                       delimiter=DUMP_FIELDS_SEP):
+            rows.append(list(data_row.values()))
+    return rows
+
+
+def load_records(dump_files):
+    rows, shared_strings = [], {}
+    for dump_file, record_type in dump_files:
+        rows += read_dump_records(dump_file, record_type, shared_strings)
+    return rows
+
+
+def measure(load_function, dump_files):
+    """
+    :return: (int, float, int): peak allocated memory in bytes, time in
+    seconds, number of rows loaded
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = load_function(dump_files)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak, elapsed, len(rows))
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - results_dir: directory containing the results of one or several batches
+    """
+    ARGS_RESULTS_DIR = ['results_dir', None, 'Results directory']
+    parser = argparse.ArgumentParser(
+        description='Benchmark: memory footprint of loaded dump files')
+    parser.add_argument(ARGS_RESULTS_DIR[0],
+                        type=str,
+                        help=ARGS_RESULTS_DIR[2])
+    args = parser.parse_args()
+
+    dump_files = get_run_dump_files(args.results_dir)
+    print(f"INFO\tdump files:\t{len(dump_files)}")
+    for name, load_function in [('lists', load_lists),
+                                ('records', load_records)]:
+        peak, elapsed, nb_rows = measure(load_function, dump_files)
+        print(f"INFO\t{name}\trows:{nb_rows}\tpeak_MB:{peak / 2**20:.1f}"
+              f"\ttime_s:{elapsed:.2f}")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: serial vs chromosome-partitioned aggregation of the dump files of
+a results directory, checking that both write identical files
+"""
+
+# Standard imports
+import argparse
+import contextlib
+import filecmp
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+
+# Local imports
+from aggregate_dump_files import (aggregate_runs_dumps,  # noqa: E402
+                                  get_run_id_list, new_shards,
+                                  read_runs_dumps)
+
+
+def aggregate(output_dir, nb_processes):
+    """
+    Aggregates the dump files of the runs of output_dir, partitioned by
+    chromosome if nb_processes is larger than 1
+    :return: list(str): names of the aggregated files written in output_dir
+    """
+    run_id_list = get_run_id_list(output_dir)
+    shards = new_shards() if nb_processes > 1 else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        aggregate_runs_dumps(read_runs_dumps(run_id_list, output_dir, shards),
+                             output_dir, shards, nb_processes)
+    return [
+        file_name for file_name in sorted(os.listdir(output_dir))
+        if os.path.isfile(os.path.join(output_dir, file_name))
+    ]
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - results_dir: directory containing the results of a batch, copied in a
+      temporary directory for each aggregation
+    - nb_processes (optional): number of processes of the partitioned
+      aggregation; default = number of CPUs, at least 2
+    """
+    ARGS_RESULTS_DIR = ['results_dir', None, 'Results directory']
+    ARGS_NB_PROCESSES = ['-n', '--nb_processes', 'Number of processes']
+    parser = argparse.ArgumentParser(
+        description='Benchmark: partitioned aggregation')
+    parser.add_argument(ARGS_RESULTS_DIR[0],
+                        type=str,
+                        help=ARGS_RESULTS_DIR[2])
+    parser.add_argument(ARGS_NB_PROCESSES[0],
+                        ARGS_NB_PROCESSES[1],
+                        type=int,
+                        default=max(2, os.cpu_count() or 1),
+                        help=ARGS_NB_PROCESSES[2])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dirs = {}
+        for name, nb_processes in [('serial', 1),
+                                   ('partitioned', args.nb_processes)]:
+            output_dir = os.path.join(tmp_dir, name)
+            shutil.copytree(args.results_dir, output_dir)
+            start = time.perf_counter()
+            file_names = aggregate(output_dir, nb_processes)
+            elapsed = time.perf_counter() - start
+            output_dirs[name] = output_dir
+            print(f"INFO\t{name}\tprocesses:{nb_processes}\t"
+                  f"time_s:{elapsed:.3f}")
+        _, mismatch, errors = filecmp.cmpfiles(output_dirs['serial'],
+                                               output_dirs['partitioned'],
+                                               file_names,
+                                               shallow=False)
+        assert mismatch + errors == [], f"files differ: {mismatch + errors}"
+        print(f"INFO\tidentical files:\t{len(file_names)}")
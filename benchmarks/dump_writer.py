@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: writing the VCF dump file of a run by appending each sample to the
+dump file vs with a run-level DumpWriter
+"""
+
+# Standard imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+
+# Local imports
+from common_utils import (DUMP_FIELDS_SEP, VCF_DUMP_HEADER,  # noqa: E402
+                          DumpWriter, init_dump_file)
+
+
+def get_samples_rows(nb_samples, nb_rows):
+    """
+    :return: list(list(list(str))): dump rows of each sample
+    """
+    return [[[
+        f"DNA-{s}-CG001Qv51Run1-{s}_S{s}", 'chr7',
+        str(55241600 + r), 'AGT', 'A', '0.0512', 'CG001v5.1_0014',
+        'SCOV:1200,TCOV:2400,MCOV:2500', 'WRU1:,WRU2:0,VRU1:GT,VRU2:1',
+        f"A|frameshift_variant|HIGH|EGFR|EGFR|transcript|NM_005228.5|{r}"
+    ] for r in range(nb_rows)] for s in range(nb_samples)]
+
+
+def append_samples(dump_file, samples_rows):
+    init_dump_file(dump_file, VCF_DUMP_HEADER)
+    for rows in samples_rows:
+        out_file = open(dump_file, 'a')
+        for row in rows:
+            out_file.write('\n')
+            out_file.write(DUMP_FIELDS_SEP.join([str(x) for x in row]))
+        out_file.close()
+
+
+def write_samples(dump_file, samples_rows):
+    with DumpWriter(dump_file, VCF_DUMP_HEADER) as writer:
+        for rows in samples_rows:
+            writer.write_rows(rows)
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - nb_samples, nb_rows (optional): number of samples and of rows per sample
+    """
+    ARGS_NB_SAMPLES = ['-s', '--nb_samples', 'Number of samples']
+    ARGS_NB_ROWS = ['-r', '--nb_rows', 'Number of rows per sample']
+    parser = argparse.ArgumentParser(description='Benchmark: dump writer')
+    parser.add_argument(ARGS_NB_SAMPLES[0],
+                        ARGS_NB_SAMPLES[1],
+                        type=int,
+                        default=96,
+                        help=ARGS_NB_SAMPLES[2])
+    parser.add_argument(ARGS_NB_ROWS[0],
+                        ARGS_NB_ROWS[1],
+                        type=int,
+                        default=2000,
+                        help=ARGS_NB_ROWS[2])
+    args = parser.parse_args()
+
+    samples_rows = get_samples_rows(args.nb_samples, args.nb_rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dump_file = os.path.join(tmp_dir, 'run_indels_dump.tsv')
+        for name, function in [('append per sample', append_samples),
+                               ('dump writer', write_samples)]:
+            start = time.perf_counter()
+            function(dump_file, samples_rows)
+            elapsed = time.perf_counter() - start
+            print(f"INFO\t{name}\ttime_s:{elapsed:.3f}")
@@ -0,0 +1,90 @@
+"""
+Local stand-in for the S3 buckets used by the scripts of bin
+S3 paths s3://<bucket>/<key> are mapped to files <root>/<bucket>/<key>.
+The stand-in replaces, in the current process, the three ways the scripts
+access S3:
+- boto3.client('s3').list_objects_v2 and head_object (s3_utils), objects
+  having a SHA256 checksum
+- smart_open.open on s3:// paths (log files read by s3_utils.read_s3_lines)
+- aws s3 cp commands run through subprocess
+It must be installed before the modules of bin are imported.
+"""
+
+# Standard imports
+import base64
+import builtins
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import types
+
+S3_PREFIX = 's3://'
+AWS_CP = ['aws', 's3', 'cp']
+
+
+class LocalS3:
+    """
+    S3 buckets stored in a local directory
+    """
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.subprocess_call = subprocess.call
+
+    def local_path(self, s3_path):
+        """
+        :param: s3_path (str): s3://<bucket>/<key>
+        :return: str: path of the corresponding local file
+        """
+        return os.path.join(self.root_dir, s3_path[len(S3_PREFIX):])
+
+    def list_objects_v2(self, Bucket, Prefix):
+        bucket_dir = os.path.join(self.root_dir, Bucket)
+        keys = []
+        for root, _, files in os.walk(os.path.join(bucket_dir, Prefix)):
+            for file_name in files:
+                file_path = os.path.join(root, file_name)
+                keys.append(os.path.relpath(file_path, bucket_dir))
+        keys.sort()
+        return {'KeyCount': len(keys), 'Contents': [{'Key': k} for k in keys]}
+
+    def head_object(self, Bucket, Key, ChecksumMode=None):
+        file_path = os.path.join(self.root_dir, Bucket, Key)
+        with open(file_path, 'rb') as in_file:
+            content = in_file.read()
+        s3_object = {
+            'ContentLength': len(content),
+            'ETag': f'"{hashlib.md5(content).hexdigest()}"'
+        }
+        if ChecksumMode == 'ENABLED':
+            s3_object['ChecksumSHA256'] = base64.b64encode(
+                hashlib.sha256(content).digest()).decode()
+        return s3_object
+
+    def client(self, service_name, *args, **kwargs):
+        return self
+
+    def open(self, path, *args, compression=None, **kwargs):
+        if isinstance(path, str) and path.startswith(S3_PREFIX):
+            path = self.local_path(path)
+        return builtins.open(path, *args, **kwargs)
+
+    def call(self, cmd, *args, **kwargs):
+        if isinstance(cmd, list) and cmd[:len(AWS_CP)] == AWS_CP:
+            src, dest = cmd[len(AWS_CP)], cmd[len(AWS_CP) + 1]
+            shutil.copy(self.local_path(src), dest)
+            return 0
+        return self.subprocess_call(cmd, *args, **kwargs)
+
+    def install(self):
+        """
+        Replaces boto3, smart_open and subprocess.call by the stand-in
+        """
+        boto3_module = types.ModuleType('boto3')
+        boto3_module.client = self.client
+        sys.modules['boto3'] = boto3_module
+        smart_open_module = types.ModuleType('smart_open')
+        smart_open_module.open = self.open
+        sys.modules['smart_open'] = smart_open_module
+        subprocess.call = self.call
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: grouping and co-located indels detection from the TSV dump files
+vs from the SQLite results database
+"""
+
+# Standard imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+from operator import itemgetter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+
+# Local imports
+from aggregate_dump_files import (group_data, sort_data,  # noqa: E402
+                                  split_data)
+from common_utils import (INDELS, SAMPLE_TYPES,  # noqa: E402
+                          VCFDumpRecord, get_vcf_dump_file)
+from extract_colocated_indels import read_dump_file  # noqa: E402
+from results_db import (load_runs, open_results_db,  # noqa: E402
+                        query_colocated_indels, query_grouped_indels)
+from run_ledger import read_input_log_file  # noqa: E402
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (result, time.perf_counter() - start)
+
+
+def group_from_tsv(run_id_list, output_dir):
+    indels = {sample_type: [] for sample_type in SAMPLE_TYPES}
+    shared_strings = {}
+    for run_id in run_id_list:
+        dump_file = get_vcf_dump_file(run_id, output_dir, INDELS, init=False)
+        if os.path.isfile(dump_file):
+            split_data(dump_file, indels, VCFDumpRecord, shared_strings)
+    grouped_indels = {}
+    for sample_type, indels_dump in indels.items():
+        sort_data(indels_dump)
+        grouped_indels[sample_type] = group_data(indels_dump)
+    return grouped_indels
+
+
+def colocated_from_tsv(run_id_list, output_dir, gap_len):
+    nb_groups = 0
+    for run_id in run_id_list:
+        dump_file = get_vcf_dump_file(run_id, output_dir, INDELS, init=False)
+        if os.path.isfile(dump_file):
+            for groups in read_dump_file(dump_file, gap_len).values():
+                nb_groups += len(groups)
+    return nb_groups
+
+
+def group_from_db(db):
+    return {
+        sample_type: query_grouped_indels(db, sample_type)
+        for sample_type in SAMPLE_TYPES
+    }
+
+
+def check_grouped(grouped_tsv, grouped_db):
+    """
+    Checks that the database grouping matches the TSV grouping, ordered by
+    decreasing number of samples, on the columns written by both
+    """
+    for sample_type in SAMPLE_TYPES:
+        rows_tsv = [
+            [str(x) for x in row[:7] + row[-1:]]
+            for row in sorted(grouped_tsv[sample_type],
+                              key=itemgetter(0),
+                              reverse=True)
+        ]
+        rows_db = [[str(x) for x in row] for row in grouped_db[sample_type]]
+        assert rows_tsv == rows_db, f"grouped {sample_type} rows differ"
+
+
+def colocated_from_db(db, gap_len):
+    return sum(
+        len(samples)
+        for samples in query_colocated_indels(db, gap_len).values())
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - input_log_file: input log file of a set of runs
+    - output_dir: directory containing the results of the runs
+    - gap_len (optional): gap length for co-located indels; default = 5
+    """
+    ARGS_INPUT_LOG_FILE = ['input_log_file', None, 'Input log file']
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Runs output directory']
+    ARGS_GAP_LEN = ['-g', '--gap_len', 'Gap length']
+    parser = argparse.ArgumentParser(
+        description='Benchmark: TSV dump files vs results database')
+    parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                        type=str,
+                        help=ARGS_INPUT_LOG_FILE[2])
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_GAP_LEN[0],
+                        ARGS_GAP_LEN[1],
+                        type=int,
+                        default=5,
+                        help=ARGS_GAP_LEN[2])
+    args = parser.parse_args()
+
+    sample_id_lists, _ = read_input_log_file(args.input_log_file)
+    run_id_list = [run_id for (run_id, _) in sample_id_lists.keys()]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = open_results_db(os.path.join(tmp_dir, 'results.db'))
+        _, load_time = timed(load_runs, db, args.input_log_file,
+                             args.output_dir)
+        print(f"INFO\tdb load\ttime_s:{load_time:.3f}")
+        results = {}
+        for name, function, function_args in [
+            ('grouped tsv', group_from_tsv, [run_id_list, args.output_dir]),
+            ('grouped db', group_from_db, [db]),
+            ('colocated tsv', colocated_from_tsv,
+             [run_id_list, args.output_dir, args.gap_len]),
+            ('colocated db', colocated_from_db, [db, args.gap_len])
+        ]:
+            results[name], elapsed = timed(function, *function_args)
+            nb = results[name]
+            if isinstance(nb, dict):
+                nb = sum(len(rows) for rows in nb.values())
+            print(f"INFO\t{name}\tresults:{nb}\ttime_s:{elapsed:.3f}")
+        check_grouped(results['grouped tsv'], results['grouped db'])
+        assert results['colocated tsv'] == results['colocated db']
+        db.close()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: runs the stages of the analysis of a set of runs on
+synthetic pipeline outputs stored in a local S3 stand-in and reports the
+throughput of each stage
+"""
+
+# Standard imports
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from itertools import groupby
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'bin'))
+
+# The S3 stand-in must be installed before the modules of bin are imported
+from local_s3 import LocalS3  # noqa: E402
+
+S3_ROOT = tempfile.mkdtemp(prefix='bench_s3_')
+LocalS3(S3_ROOT).install()
+
+# Local imports
+from aggregate_dump_files import (aggregate_group, sort_data,  # noqa: E402
+                                  split_data)
+from alignment_arrays import dump_alg_arrays  # noqa: E402
+from analysis_utils import (check_log_files,  # noqa: E402
+                            check_output_files, extract_alignments,
+                            extract_calls_files, extract_main_files,
+                            extract_main_warnings,
+                            extract_variants_from_dump_file,
+                            extract_vcf_files)
+from colocated_clusters import (get_colocated_clusters,  # noqa: E402
+                                read_batches_indels)
+from common_utils import (INDELS, SAMPLE_TYPES, SNPS,  # noqa: E402
+                          VCFDumpRecord, get_alg_dump_file,
+                          get_amplicons_coords, get_vcf_dump_file)
+from extract_colocated_indels import read_dump_file  # noqa: E402
+from run_ledger import read_input_log_file  # noqa: E402
+from s3_utils import get_files_in_s3  # noqa: E402
+from synthetic_runs import SYNTHETIC_BUCKET, generate_runs  # noqa: E402
+from variants_graph_index import (VariantsGraphIndex,  # noqa: E402
+                                  build_variants_graph_index,
+                                  get_variants_graph_index_file)
+
+
+class Stage:
+    """
+    Timer of a stage, counting the items it processes
+    """
+    def __init__(self, name, unit):
+        self.name, self.unit = name, unit
+        self.nb_items, self.time = 0, 0.0
+
+    def run(self, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.time += time.perf_counter() - start
+        return result
+
+    def report(self):
+        throughput = self.nb_items / self.time if self.time > 0 else 0.0
+        return {
+            'stage': self.name,
+            'unit': self.unit,
+            'items': self.nb_items,
+            'time_s': round(self.time, 4),
+            'items_per_s': round(throughput, 1)
+        }
+
+
+def count_lines(file_path):
+    with open(file_path) as in_file:
+        return max(0, sum(1 for _ in in_file) - 1)
+
+
+def run_stages(sample_id_lists, output_dir, work_dir, amplicons_coords,
+               gap_len):
+    """
+    Runs the analysis stages on all runs
+    :return: list(Stage): timed stages
+    """
+    stages = {
+        name: Stage(name, unit)
+        for (name, unit) in [('listing', 'runs'), (
+            'log checking', 'samples'), ('warnings extraction', 'samples'), (
+                'VCF dumping', 'calls'), ('SNPs and indels dumping', 'calls'),
+                             ('alignments extraction', 'calls'),
+                             ('variants graphs indexing', 'runs'),
+                             ('alignments from index', 'calls'),
+                             ('alignments arrays', 'calls'),
+                             ('aggregation', 'calls'),
+                             ('colocated indels', 'calls'),
+                             ('colocated clusters', 'calls')]
+    }
+    log_file = open(os.path.join(work_dir, 'bench_output.log'), 'w')
+    run_id_list = []
+    for (run_id, _), sample_id_list in sample_id_lists.items():
+        s3_files = stages['listing'].run(get_files_in_s3, run_id,
+                                         SYNTHETIC_BUCKET)
+        stages['listing'].nb_items += 1
+        stages['log checking'].run(check_output_files, run_id,
+                                   sample_id_list, s3_files)
+        stages['log checking'].run(check_log_files, run_id, sample_id_list,
+                                   SYNTHETIC_BUCKET)
+        stages['log checking'].nb_items += len(sample_id_list)
+        os.makedirs(os.path.join(output_dir, run_id), exist_ok=True)
+        tmp_run_dir = os.path.join(work_dir, 'tmp', run_id)
+        os.makedirs(tmp_run_dir, exist_ok=True)
+        stages['warnings extraction'].run(extract_main_warnings,
+                                          run_id,
+                                          sample_id_list,
+                                          SYNTHETIC_BUCKET,
+                                          prefix=output_dir)
+        stages['warnings extraction'].nb_items += len(sample_id_list)
+        stages['VCF dumping'].run(extract_vcf_files,
+                                  run_id,
+                                  sample_id_list,
+                                  SYNTHETIC_BUCKET,
+                                  log_file,
+                                  tmp_run_dir,
+                                  v_type=INDELS,
+                                  prefix=output_dir)
+        indels_dump_file = get_vcf_dump_file(run_id,
+                                             output_dir,
+                                             INDELS,
+                                             init=False)
+        nb_calls = count_lines(indels_dump_file)
+        stages['VCF dumping'].nb_items += nb_calls
+        calls_dir = os.path.join(work_dir, 'calls')
+        os.makedirs(os.path.join(calls_dir, run_id), exist_ok=True)
+        stages['SNPs and indels dumping'].run(extract_calls_files,
+                                              run_id,
+                                              sample_id_list,
+                                              SYNTHETIC_BUCKET,
+                                              log_file,
+                                              tmp_run_dir,
+                                              v_types=(INDELS, SNPS),
+                                              prefix=calls_dir)
+        stages['SNPs and indels dumping'].nb_items += sum(
+            count_lines(get_vcf_dump_file(run_id, calls_dir, v_type,
+                                          init=False))
+            for v_type in [INDELS, SNPS])
+        stage = stages['alignments extraction']
+        stage.run(extract_main_files,
+                  run_id,
+                  sample_id_list,
+                  SYNTHETIC_BUCKET,
+                  tmp_run_dir,
+                  prefix=output_dir)
+        indels = stage.run(extract_variants_from_dump_file, indels_dump_file)
+        stage.run(extract_alignments, run_id, tmp_run_dir,
+                  get_alg_dump_file(run_id, output_dir, init=False), indels,
+                  amplicons_coords)
+        stage.nb_items += nb_calls
+        index_file = get_variants_graph_index_file(run_id, output_dir)
+        stages['variants graphs indexing'].run(build_variants_graph_index,
+                                               tmp_run_dir, index_file,
+                                               amplicons_coords)
+        stages['variants graphs indexing'].nb_items += 1
+        stage = stages['alignments from index']
+        v_graph_index = stage.run(VariantsGraphIndex, index_file)
+        stage.run(extract_alignments,
+                  run_id,
+                  tmp_run_dir,
+                  os.path.join(work_dir, 'index_alignments_dump.tsv'),
+                  indels,
+                  amplicons_coords,
+                  v_graph_index=v_graph_index)
+        v_graph_index.close()
+        stage.nb_items += nb_calls
+        stages['alignments arrays'].run(dump_alg_arrays, run_id, output_dir)
+        stages['alignments arrays'].nb_items += nb_calls
+        shutil.rmtree(tmp_run_dir)
+        run_id_list.append(run_id)
+    log_file.close()
+    stages['aggregation'].run(aggregate, run_id_list, output_dir)
+    stages['colocated indels'].run(detect_colocated_indels, run_id_list,
+                                   output_dir, gap_len)
+    stages['colocated clusters'].run(detect_colocated_clusters, output_dir,
+                                     gap_len)
+    nb_calls = stages['VCF dumping'].nb_items
+    stages['aggregation'].nb_items = nb_calls
+    stages['colocated indels'].nb_items = nb_calls
+    stages['colocated clusters'].nb_items = nb_calls
+    return list(stages.values())
+
+
+def aggregate(run_id_list, output_dir):
+    indels = {sample_type: [] for sample_type in SAMPLE_TYPES}
+    shared_strings = {}
+    for run_id in run_id_list:
+        split_data(get_vcf_dump_file(run_id, output_dir, INDELS, init=False),
+                   indels, VCFDumpRecord, shared_strings)
+    for indels_dump in indels.values():
+        sort_data(indels_dump)
+        for variant, group in groupby(indels_dump,
+                                      key=lambda x: (x[1], x[2], x[3], x[4])):
+            aggregate_group(variant, group)
+
+
+def detect_colocated_indels(run_id_list, output_dir, gap_len):
+    for run_id in run_id_list:
+        read_dump_file(get_vcf_dump_file(run_id,
+                                         output_dir,
+                                         INDELS,
+                                         init=False), gap_len)
+
+
+def detect_colocated_clusters(output_dir, gap_len):
+    get_colocated_clusters(read_batches_indels([output_dir]), gap_len)
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - nb_runs, nb_samples, nb_indels (optional): size of the synthetic set
+      of runs
+    - gap_len (optional): gap length for co-located indels; default = 5
+    - output_json (optional): file where to write the stages reports
+    """
+    ARGS_NB_RUNS = ['-r', '--nb_runs', 'Number of runs']
+    ARGS_NB_SAMPLES = ['-s', '--nb_samples', 'Number of samples per run']
+    ARGS_NB_INDELS = ['-i', '--nb_indels', 'Number of indels per sample']
+    ARGS_GAP_LEN = ['-g', '--gap_len', 'Gap length']
+    ARGS_OUTPUT_JSON = ['-o', '--output_json', 'Stages reports JSON file']
+    parser = argparse.ArgumentParser(description='Benchmark suite')
+    parser.add_argument(ARGS_NB_RUNS[0],
+                        ARGS_NB_RUNS[1],
+                        type=int,
+                        default=4,
+                        help=ARGS_NB_RUNS[2])
+    parser.add_argument(ARGS_NB_SAMPLES[0],
+                        ARGS_NB_SAMPLES[1],
+                        type=int,
+                        default=24,
+                        help=ARGS_NB_SAMPLES[2])
+    parser.add_argument(ARGS_NB_INDELS[0],
+                        ARGS_NB_INDELS[1],
+                        type=int,
+                        default=20,
+                        help=ARGS_NB_INDELS[2])
+    parser.add_argument(ARGS_GAP_LEN[0],
+                        ARGS_GAP_LEN[1],
+                        type=int,
+                        default=5,
+                        help=ARGS_GAP_LEN[2])
+    parser.add_argument(ARGS_OUTPUT_JSON[0],
+                        ARGS_OUTPUT_JSON[1],
+                        type=str,
+                        default=None,
+                        help=ARGS_OUTPUT_JSON[2])
+    args = parser.parse_args()
+
+    # Manifests are read relatively to the root of the repository
+    os.chdir(REPO_DIR)
+    amplicons_coords = get_amplicons_coords()
+    work_dir = tempfile.mkdtemp(prefix='bench_work_')
+    try:
+        input_log_file = os.path.join(work_dir, 'bench_input.log')
+        start = time.perf_counter()
+        nb_calls = generate_runs(S3_ROOT, input_log_file, args.nb_runs,
+                                 args.nb_samples, args.nb_indels)
+        print(f"INFO\tgenerated calls:\t{nb_calls}\ttime_s:"
+              f"{time.perf_counter() - start:.2f}")
+        sample_id_lists, _ = read_input_log_file(input_log_file)
+        output_dir = os.path.join(work_dir, 'results')
+        # aws s3 cp commands copy archives in the current directory
+        os.chdir(work_dir)
+        stages = run_stages(sample_id_lists, output_dir, work_dir,
+                            amplicons_coords, args.gap_len)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(work_dir)
+        shutil.rmtree(S3_ROOT)
+    reports = [stage.report() for stage in stages]
+    for report in reports:
+        print(f"INFO\t{report['stage']}\t{report['items']} {report['unit']}"
+              f"\ttime_s:{report['time_s']}"
+              f"\t{report['unit']}_per_s:{report['items_per_s']}")
+    if args.output_json is not None:
+        with open(args.output_json, 'w') as out_file:
+            json.dump(reports, out_file, indent=2)
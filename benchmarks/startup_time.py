@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: start-up time of the scripts of bin (python <script> --help) and
+third-party modules loaded when importing the modules of bin
+"""
+
+# Standard imports
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BIN_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'bin')
+
+# Scripts of bin with a command-line interface
+SCRIPTS = [
+    'aggregate_batches.py', 'aggregate_dump_files.py', 'alignment_arrays.py',
+    'annotation_catalog.py', 'artefact_store.py', 'colocated_clusters.py',
+    'count_samples.py', 'diff_batches.py', 'extract_colocated_indels.py',
+    'indels_pipeline.py', 'nextflow_traces.py', 'results_db.py',
+    'run_ledger.py', 'run_utils.py'
+]
+# Modules of bin imported by other modules
+MODULES = ['common_utils', 'run_ledger', 'analysis_utils']
+# Third-party modules that are slow to import
+HEAVY_MODULES = ['boto3', 'botocore', 'smart_open', 'vcf', 'numpy']
+
+# Prints the heavy modules loaded by importing a module
+IMPORT_CHECK = ("import sys; sys.path.insert(0, {bin_dir!r}); "
+                "import {module}; "
+                "print(' '.join(m for m in {heavy!r} if m in sys.modules))")
+
+
+def time_command(cmd, nb_runs):
+    """
+    :param: cmd (list(str)): command
+    :param: nb_runs (int): number of runs
+    :return: float: median time in seconds of the command
+    """
+    times = []
+    for _ in range(nb_runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def loaded_heavy_modules(module):
+    """
+    :param: module (str): module of bin
+    :return: list(str): heavy modules loaded by importing module
+    """
+    cmd = [
+        sys.executable, '-c',
+        IMPORT_CHECK.format(bin_dir=BIN_DIR,
+                            module=module,
+                            heavy=HEAVY_MODULES)
+    ]
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    return output.stdout.split()
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - nb_runs (optional): number of runs per script; default = 5
+    """
+    ARGS_NB_RUNS = ['-n', '--nb_runs', 'Number of runs per script']
+    parser = argparse.ArgumentParser(description='Benchmark: start-up time')
+    parser.add_argument(ARGS_NB_RUNS[0],
+                        ARGS_NB_RUNS[1],
+                        type=int,
+                        default=5,
+                        help=ARGS_NB_RUNS[2])
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, '-c', 'pass'], args.nb_runs)
+    print(f"INFO\tpython interpreter\ttime_s:{baseline:.3f}")
+    for script in SCRIPTS:
+        script_time = time_command(
+            [sys.executable,
+             os.path.join(BIN_DIR, script), '--help'], args.nb_runs)
+        print(f"INFO\t{script} --help\ttime_s:{script_time:.3f}")
+    for module in MODULES:
+        heavy_modules = loaded_heavy_modules(module)
+        print(f"INFO\timport {module}\theavy modules:"
+              f"{','.join(heavy_modules) if heavy_modules else 'none'}")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Generator of synthetic indels pipeline outputs, in the layout expected by
+analysis_utils.check_output_files, in a local S3 stand-in directory
+"""
+
+# Standard imports
+import argparse
+import io
+import os
+import random
+import sys
+import tarfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+
+# Local imports
+from analysis_utils import FEATURES_COV, FEATURES_SEQ  # noqa: E402
+from common_utils import (CALLS_FILE_SUFFIX,  # noqa: E402
+                          CALLS_FILE_SUFFIX_TGZ, ERROR_NONE,
+                          FASTQ_FILES_SUFFIX, FILTERS_LOG_FILE_SUFFIX, INDELS,
+                          INFO, MAIN_FILE_SUFFIX, MAIN_LOG_FILE_SUFFIX,
+                          PRE_LOG_FILE_SUFFIX, RUN_ID, RUN_SAMPLES, SNPS,
+                          V_GRAPH_SUFFIX, WARNINGS_OUTPUT_SUFFIX,
+                          get_amplicons_coords)
+from run_ledger import RunLog  # noqa: E402
+
+# Default bucket of the synthetic outputs
+SYNTHETIC_BUCKET = 'synthetic-orchestration'
+# Run names, defining the manifest
+SYNTHETIC_RUN_NAME = 'CG001Qv5Run{}'
+
+NUCLEOTIDES = 'ACGT'
+
+VCF_HEADER = '\n'.join(
+    ['##fileformat=VCFv4.2'] + [
+        f"##INFO=<ID={feature},Number=1,Type=String,Description=\"\">"
+        for feature in FEATURES_COV + FEATURES_SEQ + ['VAF']
+    ] + [
+        '##INFO=<ID=AMPLICONS,Number=.,Type=String,Description="">',
+        '##INFO=<ID=ANN,Number=.,Type=String,Description="">',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO'
+    ])
+
+
+def get_sample_ids(run_nb, nb_samples):
+    """
+    :return: list(str): sample IDs of a run, with patient (DNA) samples and a
+    few control samples
+    """
+    run_tag = SYNTHETIC_RUN_NAME.format(run_nb)
+    prefixes = ['Blank', 'NF', 'QMRS']
+    sample_ids = []
+    for i in range(1, nb_samples + 1):
+        if i <= len(prefixes) and nb_samples > len(prefixes):
+            prefix = prefixes[i - 1]
+        else:
+            prefix = f"DNA-{10000 + i}"
+        sample_ids.append(f"{prefix}-{run_tag}-{i}_S{i}")
+    return sample_ids
+
+
+def random_indel(rng):
+    """
+    :return: (int, str, str): offset in the amplicon, ref and alt sequences
+    """
+    offset = rng.randint(10, 90)
+    indel_len = rng.randint(1, 6)
+    sequence = ''.join(rng.choice(NUCLEOTIDES) for _ in range(indel_len + 1))
+    if rng.random() < 0.5:
+        return (offset, sequence, sequence[0])
+    else:
+        return (offset, sequence[0], sequence)
+
+
+def random_snp(rng):
+    """
+    :return: (int, str, str): offset in the amplicon, ref and alt bases
+    """
+    ref = rng.choice(NUCLEOTIDES)
+    return (rng.randint(10, 90), ref,
+            rng.choice([n for n in NUCLEOTIDES if n != ref]))
+
+
+def get_vcf_record(chrom, pos, ref, alt, amplicon_id, rng):
+    features = [
+        f"{feature}={rng.randint(0, 5000)}" for feature in FEATURES_COV
+    ]
+    features += [f"{feature}={rng.randint(0, 4)}" for feature in FEATURES_SEQ]
+    annotation = (f"{alt}|frameshift_variant|HIGH|GENE{pos % 50}|GENE"
+                  f"|transcript|NM_{pos % 9999}.1|protein_coding|1/2"
+                  f"|c.{pos % 999}del|p.Met{pos % 300}fs||||")
+    info = ';'.join(features + [
+        f"VAF={round(rng.random() / 2, 4)}", f"AMPLICONS={amplicon_id}",
+        f"ANN={annotation}"
+    ])
+    return f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t.\tPASS\t{info}"
+
+
+def add_tar_member(tar, name, content):
+    data = content.encode()
+    tar_info = tarfile.TarInfo(name)
+    tar_info.size = len(data)
+    tar.addfile(tar_info, io.BytesIO(data))
+
+
+def write_file(path, content):
+    with open(path, 'w') as out_file:
+        out_file.write(content)
+
+
+def generate_run(run_id, sample_ids, run_dir, amplicons, nb_indels, rng):
+    """
+    Writes the pipeline output files of a run
+    :param: run_id (str): run ID
+    :param: sample_ids (list(str)): sample IDs
+    :param: run_dir (str): output directory of the run
+    :param: amplicons (list((str, str, int))): amplicon ID, chr, start
+    :param: nb_indels (int): number of indels per sample
+    :param: rng (random.Random): random generator
+    :return: int: number of indels calls
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    write_file(os.path.join(run_dir, f"{run_id}.yaml"), f"run_id: {run_id}\n")
+    write_file(os.path.join(run_dir, f"{run_id}{FILTERS_LOG_FILE_SUFFIX}"),
+               'FILTERS\ttotal\t0\n')
+    calls = {
+        v_type: tarfile.open(
+            os.path.join(run_dir, f"{run_id}{CALLS_FILE_SUFFIX_TGZ[v_type]}"),
+            'w:gz')
+        for v_type in [INDELS, SNPS]
+    }
+    steps = list(WARNINGS_OUTPUT_SUFFIX.keys())
+    nb_calls = 0
+    for sample_id in sample_ids:
+        sample_amplicons = rng.sample(amplicons, min(nb_indels,
+                                                     len(amplicons)))
+        records, snp_records, main_tar_path = [], [], os.path.join(
+            run_dir, f"{sample_id}{MAIN_FILE_SUFFIX}")
+        with tarfile.open(main_tar_path, 'w:gz') as main_tar:
+            for i, (amplicon_id, chrom, start) in enumerate(sample_amplicons):
+                offset, ref, alt = random_indel(rng)
+                records.append(
+                    get_vcf_record(chrom, start + offset, ref, alt,
+                                   amplicon_id, rng))
+                snp_offset, snp_ref, snp_alt = random_snp(rng)
+                snp_records.append(
+                    get_vcf_record(chrom, start + snp_offset, snp_ref,
+                                   snp_alt, amplicon_id, rng))
+                alignments = '_'.join(f"{rng.randint(0, 500)}:"
+                                      f"{rng.randint(0, 3)}:"
+                                      f"{rng.randint(1, 100)}"
+                                      for _ in range(rng.randint(1, 8)))
+                v_graph = (f"v{i}\t{amplicon_id}:0:{offset}:{offset}:{ref}:"
+                           f"{alt}\t{alignments}\n")
+                add_tar_member(main_tar,
+                               f"{sample_id}_{amplicon_id}{V_GRAPH_SUFFIX}",
+                               v_graph)
+        for v_records in [records, snp_records]:
+            v_records.sort(
+                key=lambda x: (x.split('\t')[0], int(x.split('\t')[1])))
+        nb_calls += len(records)
+        add_tar_member(calls[INDELS],
+                       f"{sample_id}{CALLS_FILE_SUFFIX[INDELS]}",
+                       '\n'.join([VCF_HEADER] + records) + '\n')
+        add_tar_member(calls[SNPS], f"{sample_id}{CALLS_FILE_SUFFIX[SNPS]}",
+                       '\n'.join([VCF_HEADER] + snp_records) + '\n')
+        write_file(
+            os.path.join(run_dir,
+                         f"{run_id}_{sample_id}{PRE_LOG_FILE_SUFFIX}"),
+            'PREPROCESSING\ttotal\t0\n')
+        main_log = [
+            f"0\t[WARNING]\t{rng.choice(steps)} {sample_id}.{amplicon_id}"
+            f"\twarning {j}" for j, (amplicon_id, _, _) in enumerate(
+                sample_amplicons)
+        ]
+        write_file(
+            os.path.join(run_dir,
+                         f"{run_id}_{sample_id}{MAIN_LOG_FILE_SUFFIX}"),
+            '\n'.join(main_log + ['0\t[INFO]\tPIPELINE\ttotal_time\t0']) +
+            '\n')
+        write_file(os.path.join(run_dir, f"{sample_id}{FASTQ_FILES_SUFFIX}"),
+                   '')
+    for tar in calls.values():
+        tar.close()
+    return nb_calls
+
+
+def generate_runs(s3_root,
+                  log_file_path,
+                  nb_runs,
+                  nb_samples,
+                  nb_indels,
+                  bucket=SYNTHETIC_BUCKET,
+                  seed=0):
+    """
+    Generates the outputs of a set of runs in the S3 stand-in directory and
+    the corresponding input log file
+    :param: s3_root (str): root directory of the S3 stand-in
+    :param: log_file_path (str): path of the input log file to write
+    :param: nb_runs (int): number of runs
+    :param: nb_samples (int): number of samples per run
+    :param: nb_indels (int): number of indels per sample
+    :param: bucket (str): bucket of the outputs
+    :param: seed (int): random generator seed
+    :return: int: number of indels calls
+    """
+    rng = random.Random(seed)
+    # Amplicons on chromosomes handled by aggregate_dump_files.sort_chr
+    amplicons = [(amplicon_id, chrom, start) for amplicon_id, (
+        chrom, start) in sorted(get_amplicons_coords().items())
+                 if chrom != 'chrY']
+    nb_calls = 0
+    with RunLog(log_file_path) as log_file:
+        for run_nb in range(1, nb_runs + 1):
+            run_id = f"210101_M00000_{run_nb:04}_000000000-SYNTH"
+            run_name = SYNTHETIC_RUN_NAME.format(run_nb)
+            sample_ids = get_sample_ids(run_nb, nb_samples)
+            log_file.write(f"{RUN_ID}:{run_id}.{run_name}\n")
+            log_file.write(f"{RUN_SAMPLES}:{run_id}\t{' '.join(sample_ids)}\n")
+            log_file.write(f"{INFO}:{run_id}\t{ERROR_NONE}\n")
+            nb_calls += generate_run(run_id, sample_ids,
+                                     os.path.join(s3_root, bucket, run_id),
+                                     amplicons, nb_indels, rng)
+    return nb_calls
+
+
+if __name__ == "__main__":
+    """
+    Arguments:
+    - s3_root: root directory of the S3 stand-in
+    - log_file: path of the input log file to write (ending by _input.log)
+    - nb_runs, nb_samples, nb_indels (optional): number of runs, of samples
+      per run and of indels per sample
+    - seed (optional): random generator seed
+    Must be run from the root of the repository (amplicon manifests).
+    """
+    ARGS_S3_ROOT = ['s3_root', None, 'S3 stand-in directory']
+    ARGS_LOG_FILE = ['log_file', None, 'Input log file']
+    ARGS_NB_RUNS = ['-r', '--nb_runs', 'Number of runs']
+    ARGS_NB_SAMPLES = ['-s', '--nb_samples', 'Number of samples per run']
+    ARGS_NB_INDELS = ['-i', '--nb_indels', 'Number of indels per sample']
+    ARGS_SEED = ['--seed', None, 'Random generator seed']
+    parser = argparse.ArgumentParser(
+        description='Benchmark: synthetic indels pipeline outputs')
+    parser.add_argument(ARGS_S3_ROOT[0], type=str, help=ARGS_S3_ROOT[2])
+    parser.add_argument(ARGS_LOG_FILE[0], type=str, help=ARGS_LOG_FILE[2])
+    parser.add_argument(ARGS_NB_RUNS[0],
+                        ARGS_NB_RUNS[1],
+                        type=int,
+                        default=4,
+                        help=ARGS_NB_RUNS[2])
+    parser.add_argument(ARGS_NB_SAMPLES[0],
+                        ARGS_NB_SAMPLES[1],
+                        type=int,
+                        default=24,
+                        help=ARGS_NB_SAMPLES[2])
+    parser.add_argument(ARGS_NB_INDELS[0],
+                        ARGS_NB_INDELS[1],
+                        type=int,
+                        default=20,
+                        help=ARGS_NB_INDELS[2])
+    parser.add_argument(ARGS_SEED[0], type=int, default=0, help=ARGS_SEED[2])
+    args = parser.parse_args()
+
+    nb_calls = generate_runs(args.s3_root, args.log_file, args.nb_runs,
+                             args.nb_samples, args.nb_indels, seed=args.seed)
+    print(f"INFO\tindels calls:\t{nb_calls}")
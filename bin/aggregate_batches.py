@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Incremental aggregation of indels calls over several batches of runs
+"""
+
+# Standard imports
+import argparse
+import json
+import math
+import os
+
+# Local imports
+from aggregate_dump_files import (GROUPED_DUMP_HEADER, dump_data,
+                                  get_run_id_list, sample_sort_key, sort_chr,
+                                  split_data)
+from common_utils import (INDELS, SAMPLE_TYPES, WARNING, VCFDumpRecord,
+                          get_aggregated_vcf_dump_file, get_vcf_dump_file)
+
+# Aggregation database file name
+AGGREGATION_DB_FILE = 'aggregation_db.json'
+# Separator of the fields of a variant key
+VARIANT_KEY_SEP = ':'
+
+# Fields of a partial aggregate of a variant
+AGG_NB = 'nb'
+AGG_SUM = 'sum'
+AGG_SUM_SQ = 'sum_sq'
+AGG_SAMPLES = 'samples'
+AGG_INFO = 'info'
+# Sample of the call whose info is kept: as aggregate_dump_files, the info of
+# a variant is the one of its call with the greatest sample_sort_key
+AGG_INFO_SAMPLE = 'info_sample'
+
+
+def init_aggregation_db():
+    """
+    The database keeps every sample:vaf string of each variant and is
+    rewritten in full at each update, so its size and the update time grow
+    with the number of ingested calls
+    :return: dict: empty aggregation database
+    batches (list(str)): names of the ingested batches
+    runs (dict(str, str)): run ID -> name of the batch it was ingested from
+    variants (dict(str, dict(str, dict))): sample type -> variant key ->
+    partial aggregate
+    """
+    return {
+        'batches': [],
+        'runs': {},
+        'variants': {sample_type: {}
+                     for sample_type in SAMPLE_TYPES}
+    }
+
+
+def read_aggregation_db(db_dir):
+    """
+    Reads the aggregation database of db_dir, or an empty one if it does not
+    exist
+    :param: db_dir (str): directory of the aggregation database
+    :return: dict: aggregation database
+    """
+    db_file_path = os.path.join(db_dir, AGGREGATION_DB_FILE)
+    if not os.path.isfile(db_file_path):
+        return init_aggregation_db()
+    with open(db_file_path) as db_file:
+        return json.load(db_file)
+
+
+def write_aggregation_db(db, db_dir):
+    """
+    Writes the aggregation database, replacing the previous one only once
+    it is completely written
+    :param: db (dict): aggregation database
+    :param: db_dir (str): directory of the aggregation database
+    """
+    db_file_path = os.path.join(db_dir, AGGREGATION_DB_FILE)
+    tmp_file_path = f"{db_file_path}.tmp"
+    with open(tmp_file_path, 'w') as db_file:
+        json.dump(db, db_file)
+    os.replace(tmp_file_path, db_file_path)
+
+
+def variant_key(row):
+    return VARIANT_KEY_SEP.join([row.chr, row.pos, row.ref, row.alt])
+
+
+def keep_info(v_agg, sample, info):
+    """
+    Sets the info of a partial aggregate to the info of a call if its sample
+    is not before the sample of the current info (see AGG_INFO_SAMPLE)
+    :param: v_agg (dict): partial aggregate, updated
+    :param: sample (str): sample of the call
+    :param: info (list(str)): source, features and annotation of the call
+    """
+    info_sample = v_agg.get(AGG_INFO_SAMPLE)
+    if (info_sample is None
+            or sample_sort_key(sample) >= sample_sort_key(info_sample)):
+        v_agg[AGG_INFO] = info
+        v_agg[AGG_INFO_SAMPLE] = sample
+
+
+def variant_sort_key(v_key):
+    chrom, pos, ref, alt = v_key.split(VARIANT_KEY_SEP)
+    return (sort_chr(chrom), int(pos), ref, alt)
+
+
+def aggregate_batch_rows(rows):
+    """
+    Computes the partial aggregates of a list of indels calls
+    :param: rows (list(VCFDumpRecord)): indels calls
+    :return: dict(str, dict): variant key -> partial aggregate (number of
+    calls, sum and sum of squares of the VAF, list of sample:vaf, features
+    and annotation of the variant and the sample they are taken from)
+    """
+    partial = {}
+    for row in rows:
+        v_key = variant_key(row)
+        vaf = float(row.VAF)
+        if v_key not in partial:
+            partial[v_key] = {
+                AGG_NB: 0,
+                AGG_SUM: 0.0,
+                AGG_SUM_SQ: 0.0,
+                AGG_SAMPLES: []
+            }
+        v_agg = partial[v_key]
+        v_agg[AGG_NB] += 1
+        v_agg[AGG_SUM] += vaf
+        v_agg[AGG_SUM_SQ] += vaf * vaf
+        v_agg[AGG_SAMPLES].append(f"{row.sample}:{round(vaf, 4)}")
+        keep_info(v_agg, row.sample, [
+            row.source, row.features_cov, row.features_seq, row.annotation
+        ])
+    return partial
+
+
+def merge_partial_aggregates(db_variants, partial):
+    """
+    Merges partial aggregates into the aggregates of the database
+    :param: db_variants (dict(str, dict)): variant key -> aggregate, updated
+    :param: partial (dict(str, dict)): variant key -> partial aggregate
+    """
+    for v_key, v_agg in partial.items():
+        if v_key not in db_variants:
+            db_variants[v_key] = v_agg
+        else:
+            db_agg = db_variants[v_key]
+            db_agg[AGG_NB] += v_agg[AGG_NB]
+            db_agg[AGG_SUM] += v_agg[AGG_SUM]
+            db_agg[AGG_SUM_SQ] += v_agg[AGG_SUM_SQ]
+            db_agg[AGG_SAMPLES] += v_agg[AGG_SAMPLES]
+            keep_info(db_agg, v_agg[AGG_INFO_SAMPLE], v_agg[AGG_INFO])
+
+
+def ingest_batch(db, batch_dir):
+    """
+    Adds to the aggregation database the indels calls of all runs of a batch
+    that are not already in the database
+    :param: db (dict): aggregation database, updated
+    :param: batch_dir (str): directory containing the run directories of the
+    batch
+    :return: list(str), list(str): IDs of the ingested runs, IDs of the runs
+    skipped as already ingested from another batch
+    """
+    batch_name = os.path.basename(os.path.normpath(batch_dir))
+    ingested_runs, skipped_runs = [], []
+    indels = {sample_type: [] for sample_type in SAMPLE_TYPES}
+    shared_strings = {}
+    for run_id in sorted(get_run_id_list(batch_dir)):
+        if run_id in db['runs']:
+            skipped_runs.append(run_id)
+            continue
+        indels_dump_file = get_vcf_dump_file(run_id,
+                                             batch_dir,
+                                             INDELS,
+                                             init=False)
+        if not os.path.isfile(indels_dump_file):
+            print(f"{WARNING}\t{batch_dir}\t{run_id}\tmissing "
+                  f"{indels_dump_file}")
+            continue
+        split_data(indels_dump_file, indels, VCFDumpRecord, shared_strings)
+        db['runs'][run_id] = batch_name
+        ingested_runs.append(run_id)
+    for sample_type, rows in indels.items():
+        merge_partial_aggregates(db['variants'][sample_type],
+                                 aggregate_batch_rows(rows))
+    if batch_name not in db['batches']:
+        db['batches'].append(batch_name)
+    return ingested_runs, skipped_runs
+
+
+def export_grouped_variants(db_variants):
+    """
+    Computes the grouped indels table from the aggregates of the database
+    :param: db_variants (dict(str, dict)): variant key -> aggregate
+    :return: list(list): rows in the format of GROUPED_DUMP_HEADER, sorted by
+    decreasing number of samples then by position
+    """
+    aggregated_groups = []
+    for v_key in sorted(db_variants.keys(), key=variant_sort_key):
+        v_agg = db_variants[v_key]
+        nb = v_agg[AGG_NB]
+        mean_vaf = v_agg[AGG_SUM] / nb
+        var_vaf = max(0.0, v_agg[AGG_SUM_SQ] / nb - mean_vaf * mean_vaf)
+        samples = sorted(
+            v_agg[AGG_SAMPLES],
+            key=lambda x: sample_sort_key(x.rsplit(':', 1)[0]))
+        aggregated_groups.append([nb] + v_key.split(VARIANT_KEY_SEP) + [
+            round(mean_vaf, 4),
+            round(math.sqrt(var_vaf), 4)
+        ] + v_agg[AGG_INFO] + [','.join(samples)])
+    aggregated_groups.sort(key=lambda x: x[0], reverse=True)
+    return aggregated_groups
+
+
+if __name__ == "__main__":
+    """
+    Ingests one or several batches into an aggregation database and writes,
+    for each sample group (DNA, ctrl, misc), the grouped indels file over all
+    ingested batches <group>_all_batches_grouped_samples_indels_dump.tsv in
+    the database directory.
+    Runs already ingested, from any batch, are not ingested again and the
+    grouped statistics are updated from the partial aggregates of the new
+    runs only.
+
+    Arguments:
+    - db_dir: directory of the aggregation database
+    - batch_dirs: directories of the batches to ingest (results/<batch>)
+    """
+    # Database directory
+    ARGS_DB_DIR = ['db_dir', None, 'Aggregation database directory']
+    # Batches directories
+    ARGS_BATCH_DIRS = ['batch_dirs', None, 'Batches directories']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: aggregation over batches')
+    parser.add_argument(ARGS_DB_DIR[0], type=str, help=ARGS_DB_DIR[2])
+    parser.add_argument(ARGS_BATCH_DIRS[0],
+                        type=str,
+                        nargs='*',
+                        help=ARGS_BATCH_DIRS[2])
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    db = read_aggregation_db(args.db_dir)
+    for batch_dir in args.batch_dirs:
+        ingested_runs, skipped_runs = ingest_batch(db, batch_dir)
+        print(f"INFO\t{batch_dir}\tingested runs:\t{len(ingested_runs)}")
+        for run_id in skipped_runs:
+            print(f"INFO\t{batch_dir}\t{run_id}\talready ingested from "
+                  f"{db['runs'][run_id]}")
+    write_aggregation_db(db, args.db_dir)
+    for sample_type in SAMPLE_TYPES:
+        aggregated_groups = export_grouped_variants(
+            db['variants'][sample_type])
+        out_dump_file = get_aggregated_vcf_dump_file(
+            f"{sample_type}_all_batches_grouped_samples",
+            args.db_dir,
+            INDELS,
+            init=False)
+        nb_groups = len(aggregated_groups)
+        print(f"INFO\tindels groups in {sample_type} samples:\t{nb_groups}")
+        dump_data(out_dump_file, aggregated_groups, GROUPED_DUMP_HEADER)
@@ -6,16 +6,28 @@ then position, then sequence
 
 import argparse
 import csv
+import io
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from itertools import groupby
 from operator import itemgetter
 
-import numpy as np
-from analysis_utils import INDELS
-from common_utils import (ALG_DUMP_HEADER, DUMP_FIELDS_SEP, VCF_DUMP_HEADER,
-                          get_aggregated_alg_dump_file,
+from common_utils import (ALG_DUMP_HEADER, DUMP_FIELDS_SEP, INDELS,
+                          SAMPLE_TYPES, VCF_DUMP_HEADER, ALGDumpRecord,
+                          VCFDumpRecord, get_aggregated_alg_dump_file,
                           get_aggregated_vcf_dump_file, get_alg_dump_file,
-                          get_vcf_dump_file)
+                          get_sample_info, get_vcf_dump_file,
+                          read_dump_records)
+
+# Header of grouped indels dump files
+GROUPED_DUMP_HEADER = [
+    'nb', 'chr', 'pos', 'ref', 'alt', 'avg_vaf', 'std_vaf', 'source',
+    'features_cov', 'features_seq', 'annotation', 'sample:vaf'
+]
+# Kinds of dump rows of the shards of the partitioned aggregation
+SHARD_INDELS = 'indels'
+SHARD_ALIGNMENTS = 'alignments'
 
 
 def sort_chr(chrom):
@@ -25,7 +37,122 @@ def sort_chr(chrom):
         return int(chrom.replace('chr', ''))
 
 
+def sample_sort_key(sample_id):
+    return sample_id.replace('-CG001', ' ')
+
+
+def sort_data(in_dump):
+    """
+    Sorts dump rows by chromosome, position, ref, alt then sample
+    :param: in_dump (list(namedtuple)): dump rows, sorted in place
+    """
+    in_dump.sort(key=lambda x: sample_sort_key(x[0]))
+    in_dump.sort(key=itemgetter(3, 4))
+    in_dump.sort(key=lambda x: (sort_chr(x[1]), int(x[2])))
+
+
+def split_data(dump_file, out_dict, record_type, shared_strings):
+    """
+    Reads a dump file and splits its rows between patient (DNA), control
+    (ctrl) and other (misc) samples
+    :param: dump_file (str): path to a run dump file
+    :param: out_dict (dict(str, list)): rows lists indexed by sample type
+    :param: record_type (namedtuple): VCFDumpRecord or ALGDumpRecord
+    :param: shared_strings (dict(str, str)): pool of deduplicated strings
+    """
+    split_records(read_dump_records(dump_file, record_type, shared_strings),
+                  out_dict)
+
+
+def split_records(records, out_dict):
+    """
+    Splits dump rows between patient (DNA), control (ctrl) and other (misc)
+    samples
+    :param: records (iterable(namedtuple)): dump rows
+    :param: out_dict (dict(str, list)): rows lists indexed by sample type
+    """
+    for data_row in records:
+        sample_type = get_sample_info(data_row.sample).sample_type
+        out_dict[sample_type].append(data_row)
+
+
+def new_shards():
+    """
+    :return: dict(str, dict(str, dict(int, list))): empty shards of the
+    partitioned aggregation, rows lists indexed by kind of rows
+    (SHARD_INDELS, SHARD_ALIGNMENTS), sample type and chromosome (sort_chr)
+    """
+    return {
+        kind: {sample_type: defaultdict(list)
+               for sample_type in SAMPLE_TYPES}
+        for kind in [SHARD_INDELS, SHARD_ALIGNMENTS]
+    }
+
+
+def split_records_by_chr(records, out_dict):
+    """
+    Splits dump rows by sample type (see split_records) and chromosome
+    :param: records (iterable(namedtuple)): dump rows
+    :param: out_dict (dict(str, dict(int, list))): rows lists indexed by
+    sample type then chromosome (sort_chr)
+    """
+    for data_row in records:
+        sample_type = get_sample_info(data_row.sample).sample_type
+        out_dict[sample_type][sort_chr(data_row.chr)].append(data_row)
+
+
+def get_run_id_list(output_dir):
+    """
+    :param: output_dir (str): directory containing the results of runs
+    :return: list(str): IDs of the runs with a results directory
+    """
+    run_id_list = []
+    for x in os.listdir(output_dir):
+        if os.path.isdir(os.path.join(output_dir, x)):
+            run_id_list.append(x)
+    return run_id_list
+
+
+def read_runs_dumps(run_id_list, prefix, shards=None):
+    """
+    Reads the VCF and alignments dump files of a set of runs
+    :param: run_id_list (list(str)): run IDs
+    :param: prefix (str): directory containing the results of the runs
+    :param: shards (dict): if not None, shards of the partitioned aggregation
+    (see new_shards) the rows of each run are split into as soon as the run
+    is read
+    :return: dict(str, (list(VCFDumpRecord), list(ALGDumpRecord))): indels
+    and alignments rows indexed by run ID
+    """
+    runs_dumps = {}
+    shared_strings = {}
+    for run_id in run_id_list:
+        indels_dump, algs_dump = [], []
+        indels_dump_file = get_vcf_dump_file(run_id,
+                                             prefix,
+                                             INDELS,
+                                             init=False)
+        if os.path.isfile(indels_dump_file):
+            indels_dump = read_dump_records(indels_dump_file, VCFDumpRecord,
+                                            shared_strings)
+        else:
+            print(f"{indels_dump_file} missing")
+        algs_dump_file = get_alg_dump_file(run_id, prefix, init=False)
+        if os.path.isfile(algs_dump_file):
+            algs_dump = read_dump_records(algs_dump_file, ALGDumpRecord,
+                                          shared_strings)
+        else:
+            print(f"{algs_dump_file} missing")
+        runs_dumps[run_id] = (indels_dump, algs_dump)
+        if shards is not None:
+            split_records_by_chr(indels_dump, shards[SHARD_INDELS])
+            split_records_by_chr(algs_dump, shards[SHARD_ALIGNMENTS])
+    return runs_dumps
+
+
 def aggregate_group(variant, group):
+    import numpy as np
+
     sample_list, vaf_list = [], []
     for v_sample in group:
         vaf = float(v_sample[5])
@@ -44,6 +171,157 @@ def aggregate_group(variant, group):
     return out_group
 
 
+def group_data(indels_dump):
+    """
+    :param: indels_dump (list(VCFDumpRecord)): indels rows sorted by
+    sort_data
+    :return: list(list): grouped indels rows (GROUPED_DUMP_HEADER), in the
+    order of indels_dump
+    """
+    return [
+        aggregate_group(variant, group)
+        for variant, group in groupby(indels_dump,
+                                      key=lambda x: (x[1], x[2], x[3], x[4]))
+    ]
+
+
+def dump_data(dump_file, data, header):
+    with open(dump_file, 'w') as out_dump:
+        writer = csv.writer(out_dump, delimiter=DUMP_FIELDS_SEP)
+        writer.writerows([header] + data)
+
+
+def dump_chunks(dump_file, chunks, header):
+    """
+    Writes a dump file from rows already formatted as by dump_data
+    :param: dump_file (str): path to the dump file
+    :param: chunks (list(str)): formatted rows, see aggregate_shard
+    :param: header (list(str)): dump header
+    """
+    with open(dump_file, 'w') as out_dump:
+        csv.writer(out_dump, delimiter=DUMP_FIELDS_SEP).writerow(header)
+        out_dump.writelines(chunks)
+
+
+def aggregate_shard(kind, rows):
+    """
+    Sorts the rows of a shard, formats them as in the aggregated dump files
+    and groups them if they are indels
+    :param: kind (str): SHARD_INDELS or SHARD_ALIGNMENTS
+    :param: rows (list(namedtuple)): rows of the shard
+    :return: (int, str, list(list)): number of rows, formatted sorted rows
+    and grouped indels rows (None for alignments)
+    """
+    sort_data(rows)
+    out_rows = io.StringIO()
+    csv.writer(out_rows, delimiter=DUMP_FIELDS_SEP).writerows(rows)
+    if kind != SHARD_INDELS:
+        return len(rows), out_rows.getvalue(), None
+    return len(rows), out_rows.getvalue(), group_data(rows)
+
+
+def aggregate_shards(shards, nb_processes):
+    """
+    Partitioned aggregation: each shard filled by read_runs_dumps is sorted,
+    formatted and grouped in a pool of nb_processes processes (largest shards
+    first), and the shards are concatenated by increasing chromosome. Shards
+    hold the rows of a chromosome in reading order, so this gives the same
+    rows and groups as sorting and grouping all rows of a sample type
+    :param: shards (dict): see new_shards
+    :param: nb_processes (int): number of processes
+    :return: (dict(str, dict(str, (int, list(str)))), dict(str, list(list))):
+    number of rows and formatted rows chunks in chromosome order indexed by
+    kind of rows and sample type, and grouped indels rows (not sorted by
+    number of samples) indexed by sample type
+    """
+    shard_keys = [(kind, sample_type, chrom)
+                  for kind, kind_shards in shards.items()
+                  for sample_type, chr_shards in kind_shards.items()
+                  for chrom in sorted(chr_shards.keys())]
+    aggregated = {
+        kind: {sample_type: [0, []]
+               for sample_type in SAMPLE_TYPES}
+        for kind in shards.keys()
+    }
+    grouped_indels = {sample_type: [] for sample_type in SAMPLE_TYPES}
+    with ProcessPoolExecutor(max_workers=nb_processes) as executor:
+        futures = {
+            (kind, sample_type, chrom):
+            executor.submit(aggregate_shard, kind,
+                            shards[kind][sample_type][chrom])
+            for (kind, sample_type, chrom) in sorted(
+                shard_keys,
+                key=lambda x: len(shards[x[0]][x[1]][x[2]]),
+                reverse=True)
+        }
+        for (kind, sample_type, chrom) in shard_keys:
+            nb_rows, rows_chunk, groups = futures[(kind, sample_type,
+                                                   chrom)].result()
+            aggregated[kind][sample_type][0] += nb_rows
+            aggregated[kind][sample_type][1].append(rows_chunk)
+            if groups is not None:
+                grouped_indels[sample_type] += groups
+    return aggregated, grouped_indels
+
+
+def aggregate_runs_dumps(runs_dumps, prefix, shards=None, nb_processes=1):
+    """
+    Writes the aggregated and grouped dump files of a set of runs
+    :param: runs_dumps (dict): indels and alignments rows indexed by run ID,
+    see read_runs_dumps
+    :param: prefix (str): directory where the aggregated files are written
+    :param: shards (dict): if not None, shards filled by read_runs_dumps,
+    sorted and grouped in nb_processes processes (see aggregate_shards)
+    instead of runs_dumps; the files are identical
+    :param: nb_processes (int): number of processes of the partitioned
+    aggregation
+    :return: dict(str, list(list)): grouped indels rows (GROUPED_DUMP_HEADER)
+    indexed by sample type
+    """
+    if shards is None:
+        indels = {sample_type: [] for sample_type in SAMPLE_TYPES}
+        alignments = {sample_type: [] for sample_type in SAMPLE_TYPES}
+        for indels_dump, algs_dump in runs_dumps.values():
+            split_records(indels_dump, indels)
+            split_records(algs_dump, alignments)
+        for sample_type in SAMPLE_TYPES:
+            sort_data(indels[sample_type])
+            sort_data(alignments[sample_type])
+        grouped_indels = {
+            sample_type: group_data(indels_dump)
+            for sample_type, indels_dump in indels.items()
+        }
+    else:
+        aggregated, grouped_indels = aggregate_shards(shards, nb_processes)
+    # Aggregating indels and alignments
+    for sample_type in SAMPLE_TYPES:
+        indels_dump_file = get_aggregated_vcf_dump_file(
+            f"{sample_type}_samples", prefix, INDELS, init=False)
+        algs_dump_file = get_aggregated_alg_dump_file(
+            f"{sample_type}_samples", prefix, init=False)
+        if shards is None:
+            nb_indels = len(indels[sample_type])
+            dump_data(indels_dump_file, indels[sample_type], VCF_DUMP_HEADER)
+            dump_data(algs_dump_file, alignments[sample_type],
+                      ALG_DUMP_HEADER)
+        else:
+            nb_indels, indels_chunks = aggregated[SHARD_INDELS][sample_type]
+            dump_chunks(indels_dump_file, indels_chunks, VCF_DUMP_HEADER)
+            dump_chunks(algs_dump_file,
+                        aggregated[SHARD_ALIGNMENTS][sample_type][1],
+                        ALG_DUMP_HEADER)
+        print(f"INFO\tindels calls in {sample_type} samples:\t{nb_indels}")
+    # Grouping indels
+    for sample_type, aggregated_groups in grouped_indels.items():
+        aggregated_groups.sort(key=lambda x: x[0], reverse=True)
+        out_dump_file = get_aggregated_vcf_dump_file(
+            f"{sample_type}_grouped_samples", prefix, INDELS, init=False)
+        nb_groups = len(aggregated_groups)
+        print(f"INFO\tindels groups in {sample_type} samples:\t{nb_groups}")
+        dump_data(out_dump_file, aggregated_groups, GROUPED_DUMP_HEADER)
+    return grouped_indels
+
+
 if __name__ == "__main__":
     """
     Aggregate all VCF/alignments dump files for a set of runs in (2x) six
@@ -64,92 +342,25 @@ if __name__ == "__main__":
 
     Arguments:
     - output_dir: directory where the results are read and written
+    - nb_processes (optional): if larger than 1, the rows are split by
+      chromosome while the runs dump files are read and sorted and grouped
+      in nb_processes processes; default = 1 (no partitioning)
     """
-    def sort_data(in_dump):
-        in_dump.sort(key=lambda x: x[0].replace('-CG001', ' '))
-        in_dump.sort(key=itemgetter(3, 4))
-        in_dump.sort(key=lambda x: (sort_chr(x[1]), int(x[2])))
-
-    def split_data(dump_file, out_dict):
-        for data_row in csv.DictReader(open(dump_file),
-                                       delimiter=DUMP_FIELDS_SEP):
-            sample_id = data_row['sample'].lower()
-            if sample_id.startswith('dna-'):
-                out_dict['DNA'].append(list(data_row.values()))
-            elif sample_id.startswith('nf') or sample_id.startswith(
-                    'blank') or sample_id.startswith('qmrs'):
-                out_dict['ctrl'].append(list(data_row.values()))
-            else:
-                out_dict['misc'].append(list(data_row.values()))
-
-    def dump_data(dump_file, data, header):
-        with open(dump_file, 'w') as out_dump:
-            writer = csv.writer(out_dump, delimiter=DUMP_FIELDS_SEP)
-            writer.writerows([header] + data)
-
     # Results directory
     ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    # Number of processes
+    ARGS_NB_PROCESSES = ['-n', '--nb_processes', 'Number of processes']
     parser = argparse.ArgumentParser(
         description='Indels pipeline: analysis of results on AWS')
     parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_NB_PROCESSES[0],
+                        ARGS_NB_PROCESSES[1],
+                        type=int,
+                        default=1,
+                        help=ARGS_NB_PROCESSES[2])
     args = parser.parse_args()
 
-    # List of available runs
-    run_id_list = []
-    for x in os.listdir(args.output_dir):
-        if os.path.isdir(os.path.join(args.output_dir, x)):
-            run_id_list.append(x)
-
-    # Extracting indels and alignments
-    indels, alignments = {}, {}
-    indels['DNA'], indels['ctrl'], indels['misc'] = [], [], []
-    alignments['DNA'], alignments['ctrl'], alignments['misc'] = [], [], []
-    for run_id in run_id_list:
-        prefix = args.output_dir
-        indels_dump_file = get_vcf_dump_file(run_id,
-                                             prefix,
-                                             INDELS,
-                                             init=False)
-        if os.path.isfile(indels_dump_file):
-            split_data(indels_dump_file, indels)
-        else:
-            print(f"{indels_dump_file} missing")
-        algs_dump_file = get_alg_dump_file(run_id, prefix, init=False)
-        if os.path.isfile(algs_dump_file):
-            split_data(algs_dump_file, alignments)
-        else:
-            print(f"{algs_dump_file} missing")
-    # Aggregating indels
-    for sample_type, indels_dump in indels.items():
-        print(
-            f"INFO\tindels calls in {sample_type} samples:\t{len(indels_dump)}"
-        )
-        sort_data(indels_dump)
-        out_dump_file = get_aggregated_vcf_dump_file(f"{sample_type}_samples",
-                                                     prefix,
-                                                     INDELS,
-                                                     init=False)
-        dump_data(out_dump_file, indels_dump, VCF_DUMP_HEADER)
-    # Aggregating alignments
-    for sample_type, algs_dump in alignments.items():
-        sort_data(algs_dump)
-        out_dump_file = get_aggregated_alg_dump_file(f"{sample_type}_samples",
-                                                     prefix,
-                                                     init=False)
-        dump_data(out_dump_file, algs_dump, ALG_DUMP_HEADER)
-    # Grouping indels
-    for sample_type, indels_dump in indels.items():
-        aggregated_groups = []
-        for variant, group in groupby(indels_dump,
-                                      key=lambda x: (x[1], x[2], x[3], x[4])):
-            aggregated_groups.append(aggregate_group(variant, group))
-        aggregated_groups.sort(key=lambda x: x[0], reverse=True)
-        out_dump_file = get_aggregated_vcf_dump_file(
-            f"{sample_type}_grouped_samples", prefix, INDELS, init=False)
-        nb_groups = len(aggregated_groups)
-        print(f"INFO\tindels groups in {sample_type} samples:\t{nb_groups}")
-        header = [
-            'nb', 'chr', 'pos', 'ref', 'alt', 'avg_vaf', 'std_vaf', 'source',
-            'features_cov', 'features_seq', 'annotation', 'sample:vaf'
-        ]
-        dump_data(out_dump_file, aggregated_groups, header)
+    run_id_list = get_run_id_list(args.output_dir)
+    shards = new_shards() if args.nb_processes > 1 else None
+    aggregate_runs_dumps(read_runs_dumps(run_id_list, args.output_dir, shards),
+                         args.output_dir, shards, args.nb_processes)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Numeric arrays of the alignments supporting the indels of a run
+The alignments field of an alignments dump file is a list of
+<alignment ID>:<number of mismatches>:<number of reads> values separated by
+DUMP_VALUES_SEP; it is parsed once into three flat int32 arrays (alignment
+IDs, mismatches, reads) and an offsets array, the alignments of row i of the
+dump file being at indices offsets[i] to offsets[i + 1] - 1. The arrays and
+the labels of the rows are saved in <run_id>/<run_id>_alignments.npz, so the
+reads support of the indels of whole batches is computed with vectorized
+reductions instead of splitting strings.
+"""
+
+# Standard imports
+import argparse
+import csv
+import os
+
+# Local imports
+from aggregate_dump_files import get_run_id_list
+from common_utils import (DUMP_FIELDS_SEP, DUMP_VALUES_SEP, INFO, DumpWriter,
+                          get_alg_dump_file)
+
+# Arrays file suffix
+ALG_ARRAYS_EXT = '_alignments.npz'
+# Separator of the fields of an alignment
+ALG_FIELDS_SEP = ':'
+# Labels of the rows of the alignments dump file
+LABELS_SAMPLES = 'samples'
+LABELS_VARIANTS = 'variants'
+LABELS_SOURCES = 'sources'
+ALG_LABELS = [LABELS_SAMPLES, LABELS_VARIANTS, LABELS_SOURCES]
+# Alignments arrays, in the order of the fields of an alignment
+ALG_IDS = 'alg_ids'
+ALG_MISMATCHES = 'mismatches'
+ALG_READS = 'reads'
+ALG_DATA = [ALG_IDS, ALG_MISMATCHES, ALG_READS]
+# Offsets of the alignments of each row
+ALG_OFFSETS = 'offsets'
+# Run of each row of the arrays of a set of runs
+LABELS_RUNS = 'runs'
+# Default maximum number of mismatches of the alignments of filtered support
+MAX_MISMATCHES = 0
+# Header of the reads support file
+SUPPORT_HEADER = [
+    'run_id', 'sample', 'chr', 'pos', 'ref', 'alt', 'source', 'nb_alignments',
+    'reads', 'filtered_reads'
+]
+
+
+def get_alg_arrays_file(run_id, prefix):
+    """
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the path to output directory
+    :return: str: path to the alignments arrays file of the run
+    """
+    return os.path.join(prefix, run_id, f"{run_id}{ALG_ARRAYS_EXT}")
+
+
+def parse_alignments(alignments_list):
+    """
+    :param: alignments_list (list(str)): alignments fields of dump rows
+    :return: dict(str, numpy array): ALG_DATA arrays (int32) and ALG_OFFSETS
+    array (int64, one more entry than alignments_list)
+    :raise: ValueError if an alignment does not have 3 integer fields
+    """
+    import numpy as np
+
+    nb_alignments = [
+        alignments.count(DUMP_VALUES_SEP) + 1 if alignments else 0
+        for alignments in alignments_list
+    ]
+    offsets = np.zeros(len(alignments_list) + 1, dtype=np.int64)
+    np.cumsum(nb_alignments, out=offsets[1:])
+    values = DUMP_VALUES_SEP.join(
+        alignments for alignments in alignments_list
+        if alignments).replace(ALG_FIELDS_SEP, DUMP_VALUES_SEP)
+    fields = values.split(DUMP_VALUES_SEP) if values else []
+    if len(fields) != len(ALG_DATA) * offsets[-1]:
+        raise ValueError(f"{len(fields)} alignments fields for "
+                         f"{offsets[-1]} alignments")
+    data = np.fromiter(map(int, fields), dtype=np.int32,
+                       count=len(fields)).reshape(-1, len(ALG_DATA))
+    arrays = {
+        name: np.ascontiguousarray(data[:, i])
+        for i, name in enumerate(ALG_DATA)
+    }
+    arrays[ALG_OFFSETS] = offsets
+    return arrays
+
+
+def build_alg_arrays(alg_dump_file):
+    """
+    :param: alg_dump_file (str): path to an alignments dump file
+    :return: dict(str, numpy array): labels of the rows of the dump file
+    (ALG_LABELS, variants as chr:pos:ref:alt), alignments arrays (ALG_DATA)
+    and offsets (ALG_OFFSETS)
+    """
+    import numpy as np
+
+    with open(alg_dump_file) as in_dump:
+        dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+        next(dump_reader, None)
+        rows = [row for row in dump_reader if len(row) > 0]
+    arrays = parse_alignments([row[-1] for row in rows])
+    arrays[LABELS_SAMPLES] = np.array([row[0] for row in rows], dtype=str)
+    arrays[LABELS_VARIANTS] = np.array(
+        [ALG_FIELDS_SEP.join(row[1:5]) for row in rows], dtype=str)
+    arrays[LABELS_SOURCES] = np.array([row[5] for row in rows], dtype=str)
+    return arrays
+
+
+def save_alg_arrays(alg_arrays_file, arrays):
+    """
+    :param: alg_arrays_file (str): path to the .npz file
+    :param: arrays (dict): see build_alg_arrays
+    """
+    import numpy as np
+
+    np.savez_compressed(alg_arrays_file, **arrays)
+
+
+def load_alg_arrays(alg_arrays_file):
+    """
+    :param: alg_arrays_file (str): path to a .npz file written by
+    save_alg_arrays
+    :return: dict: see build_alg_arrays
+    """
+    import numpy as np
+
+    with np.load(alg_arrays_file) as arrays:
+        return {
+            name: arrays[name]
+            for name in ALG_LABELS + ALG_DATA + [ALG_OFFSETS]
+        }
+
+
+def dump_alg_arrays(run_id, prefix):
+    """
+    Builds the alignments arrays of a run from its alignments dump file and
+    saves them in prefix/run_id/run_id_alignments.npz
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the path to output directory
+    :return: int: number of rows of the alignments dump file
+    """
+    arrays = build_alg_arrays(get_alg_dump_file(run_id, prefix, init=False))
+    save_alg_arrays(get_alg_arrays_file(run_id, prefix), arrays)
+    return len(arrays[LABELS_SAMPLES])
+
+
+def update_runs_alg_arrays(output_dirs):
+    """
+    Builds the alignments arrays of the runs of a set of batches that do not
+    have them or whose alignments dump file is more recent
+    :param: output_dirs (list(str)): directories containing the results of
+    batches of runs
+    :return: list((str, str)): (output directory, run ID) of the runs with
+    alignments arrays
+    """
+    runs = []
+    for output_dir in output_dirs:
+        for run_id in sorted(get_run_id_list(output_dir)):
+            alg_dump_file = get_alg_dump_file(run_id, output_dir, init=False)
+            if not os.path.isfile(alg_dump_file):
+                continue
+            alg_arrays_file = get_alg_arrays_file(run_id, output_dir)
+            if (not os.path.isfile(alg_arrays_file)
+                    or os.path.getmtime(alg_arrays_file) <
+                    os.path.getmtime(alg_dump_file)):
+                dump_alg_arrays(run_id, output_dir)
+            runs.append((output_dir, run_id))
+    return runs
+
+
+def load_runs_alg_arrays(runs):
+    """
+    Concatenates the alignments arrays of a set of runs
+    :param: runs (list((str, str))): (output directory, run ID) of the runs
+    :return: dict: see build_alg_arrays, with offsets over the concatenated
+    arrays and the run ID of each row in LABELS_RUNS
+    """
+    import numpy as np
+
+    runs_arrays = [
+        load_alg_arrays(get_alg_arrays_file(run_id, output_dir))
+        for output_dir, run_id in runs
+    ]
+    arrays = {
+        name: np.concatenate([run_arrays[name] for run_arrays in runs_arrays])
+        if runs_arrays else np.array([], dtype=str)
+        for name in ALG_LABELS
+    }
+    for name in ALG_DATA:
+        arrays[name] = np.concatenate(
+            [run_arrays[name] for run_arrays in runs_arrays] +
+            [np.array([], dtype=np.int32)])
+    offsets, shift = [np.zeros(1, dtype=np.int64)], 0
+    for run_arrays in runs_arrays:
+        offsets.append(run_arrays[ALG_OFFSETS][1:] + shift)
+        shift += run_arrays[ALG_OFFSETS][-1]
+    arrays[ALG_OFFSETS] = np.concatenate(offsets)
+    arrays[LABELS_RUNS] = np.repeat(
+        np.array([run_id for _, run_id in runs], dtype=str),
+        [len(run_arrays[LABELS_SAMPLES]) for run_arrays in runs_arrays])
+    return arrays
+
+
+def get_reads_support(arrays, max_mismatches=None):
+    """
+    :param: arrays (dict): see build_alg_arrays
+    :param: max_mismatches (int): if not None, only alignments with at most
+    max_mismatches mismatches are counted
+    :return: numpy array (int64): number of reads supporting each row
+    """
+    import numpy as np
+
+    reads = arrays[ALG_READS].astype(np.int64)
+    if max_mismatches is not None:
+        reads[arrays[ALG_MISMATCHES] > max_mismatches] = 0
+    cumulated_reads = np.zeros(len(reads) + 1, dtype=np.int64)
+    np.cumsum(reads, out=cumulated_reads[1:])
+    offsets = arrays[ALG_OFFSETS]
+    return cumulated_reads[offsets[1:]] - cumulated_reads[offsets[:-1]]
+
+
+def write_reads_support(output_file_path, arrays,
+                        max_mismatches=MAX_MISMATCHES):
+    """
+    Writes the number of alignments, total reads support and reads support
+    by alignments with at most max_mismatches mismatches of each row of
+    arrays (SUPPORT_HEADER)
+    :param: output_file_path (str): path to the output file
+    :param: arrays (dict): see load_runs_alg_arrays
+    :param: max_mismatches (int): see get_reads_support
+    """
+    import numpy as np
+
+    nb_alignments = np.diff(arrays[ALG_OFFSETS])
+    reads = get_reads_support(arrays)
+    filtered_reads = get_reads_support(arrays, max_mismatches)
+    with DumpWriter(output_file_path, SUPPORT_HEADER) as out_support:
+        out_support.write_rows([[
+            run_id, sample, *variant.split(ALG_FIELDS_SEP), source,
+            str(nb), str(total),
+            str(filtered)
+        ] for run_id, sample, variant, source, nb, total, filtered in zip(
+            arrays[LABELS_RUNS], arrays[LABELS_SAMPLES], arrays[
+                LABELS_VARIANTS], arrays[LABELS_SOURCES], nb_alignments,
+            reads, filtered_reads)])
+
+
+if __name__ == "__main__":
+    """
+    Builds the alignments arrays <run_id>/<run_id>_alignments.npz of the runs
+    of one or several batches that do not have them, and, if output_file is
+    given, writes the reads support of the indels of all runs, with columns
+    run_id, sample, chr, pos, ref, alt, source, nb_alignments, reads
+    (total reads support) and filtered_reads (reads support by alignments
+    with at most max_mismatches mismatches)
+
+    Arguments:
+    - output_dirs: directories containing the results of the runs of each
+      batch (e.g. results/*)
+    - output_file (optional): path to the reads support file
+    - max_mismatches (optional): maximum number of mismatches of the
+      alignments of the filtered reads support; default = 0
+    """
+    ARGS_OUTPUT_DIRS = ['output_dirs', None, 'Batches output directories']
+    ARGS_OUTPUT_FILE = ['-o', '--output_file', 'Reads support file']
+    ARGS_MAX_MISMATCHES = [
+        '-m', '--max_mismatches', 'Maximum number of mismatches'
+    ]
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: alignments arrays')
+    parser.add_argument(ARGS_OUTPUT_DIRS[0],
+                        type=str,
+                        nargs='+',
+                        help=ARGS_OUTPUT_DIRS[2])
+    parser.add_argument(ARGS_OUTPUT_FILE[0],
+                        ARGS_OUTPUT_FILE[1],
+                        type=str,
+                        help=ARGS_OUTPUT_FILE[2])
+    parser.add_argument(ARGS_MAX_MISMATCHES[0],
+                        ARGS_MAX_MISMATCHES[1],
+                        type=int,
+                        default=MAX_MISMATCHES,
+                        help=ARGS_MAX_MISMATCHES[2])
+    args = parser.parse_args()
+
+    runs = update_runs_alg_arrays(args.output_dirs)
+    print(f"{INFO}\truns:\t{len(runs)}")
+    if args.output_file is not None:
+        arrays = load_runs_alg_arrays(runs)
+        write_reads_support(args.output_file, arrays, args.max_mismatches)
+        print(f"{INFO}\tindels alignments:\t{len(arrays[LABELS_SAMPLES])}")
+        print(f"{INFO}\talignments:\t{len(arrays[ALG_READS])}")
@@ -6,46 +6,46 @@ Functions to analyze the results of a run of the indels pipeline on AWS
 # Standard imports
 import argparse
 import csv
+import gzip
+import io
 import os
 import shutil
-import subprocess
 import tarfile
+import zlib
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-# Third-party imports
-import vcf
 # Local imports
-from common_utils import (ALG_DUMP_HEADER, DUMP_FIELDS_SEP, DUMP_VALUES_SEP,
-                          ERROR_NONE, INFO, VCF_DUMP_HEADER, WARNING,
-                          get_alg_dump_file, get_files_in_s3,
-                          get_vcf_dump_file, read_input_log_file)
-from smart_open import open
+# Third-party modules (PyVCF) are imported by the functions using them;
+# pipeline files constants are defined in common_utils, S3 accesses are in
+# s3_utils
+from alignment_arrays import dump_alg_arrays
+from artefact_store import ArtefactStore, annotate_run
+from common_utils import (ALG_DUMP_HEADER, CALLS_FILE_SUFFIX,
+                          CALLS_FILE_SUFFIX_TGZ, DUMP_FIELDS_SEP,
+                          DUMP_VALUES_SEP, ERROR_NONE, ERROR_RUN_UNPROCESSED,
+                          FASTQ_FILES_SUFFIX, FILTERS_LOG_FILE_SUFFIX, INDELS,
+                          INDELS_FILE_SUFFIX_TGZ, INFO, MAIN_FILE_SUFFIX,
+                          MAIN_LOG_FILE_SUFFIX, PRE_LOG_FILE_SUFFIX,
+                          SNPS, SNPS_FILE_SUFFIX_TGZ, V_GRAPH_SUFFIX,
+                          VCF_DUMP_HEADER, WARNING, WARNINGS_OUTPUT_SUFFIX,
+                          DumpWriter, get_alg_dump_file, get_amplicons_coords,
+                          get_vcf_dump_file)
+from run_ledger import RunLog, read_input_log_file
+from s3_utils import (S3Error, download_s3_file, get_files_in_s3,
+                      read_s3_lines)
+from variants_graph_index import (VariantsGraphIndex,
+                                  build_variants_graph_index,
+                                  get_variants_graph_index_file,
+                                  read_variants_graph_file)
 
 # Default S3 directory containing results
 CCHAUVE_S3_OUTPUT = 'cchauve-orchestration-ch'
 
-# Suffixes of files generated by the pipeline
-INDELS_FILE_SUFFIX = '_indels_filtered_snpeff.vcf'
-INDELS_FILE_SUFFIX_TGZ = f"{INDELS_FILE_SUFFIX}.tar.gz"
-SNPS_FILE_SUFFIX = '_snps_filtered_snpeff.vcf'
-SNPS_FILE_SUFFIX_TGZ = f"{SNPS_FILE_SUFFIX}.tar.gz"
-FILTERS_LOG_FILE_SUFFIX = '_samples_filters.log'
-MAIN_FILE_SUFFIX = '_main.tar.gz'
-MAIN_LOG_FILE_SUFFIX = '_main.log'
-PRE_LOG_FILE_SUFFIX = '_preprocessing.log'
-FASTQ_FILES_SUFFIX = '_L001_annotated.fq.tar.gz'
-V_GRAPH_SUFFIX = '_variants_graph.txt'
-
-# Keys to differentiate indels and SNPs
-INDELS, SNPS = 'indels', 'snps'
-CALLS_FILE_SUFFIX_TGZ = {
-    INDELS: INDELS_FILE_SUFFIX_TGZ,
-    SNPS: SNPS_FILE_SUFFIX_TGZ
-}
-CALLS_FILE_SUFFIX = {INDELS: INDELS_FILE_SUFFIX, SNPS: SNPS_FILE_SUFFIX}
-
-# AWS cp command
-AWS_CP = ['aws', 's3', 'cp']
+# Errors of a run that are reported in its output log, the run being written
+# in the CSV file of runs to reprocess, instead of stopping the analysis
+RUN_IO_ERRORS = (S3Error, tarfile.TarError, EOFError, zlib.error,
+                 gzip.BadGzipFile)
 
 # Variant features to print: taken from indesl-pipeline/bin/feature_utils.py
 SOURCE_COV = 'SCOV'
@@ -72,42 +72,11 @@ FEATURES_SEQ = [
     HP_RIGHT_BASE
 ]
 
-# Log steps
-WARNINGS_OUTPUT_SUFFIX = {
-    'bin.reads_utils': '_reads.tsv',
-    'bin.clusters_utils': '_clusters.tsv',
-    'bin.alignments_utils': '_alignments.tsv',
-    'bin.variants_utils': '_variants.tsv',
-    'bin.variants_graph_utils': '_variants_graph.tsv'
-}
-
-# Amplicons manifests
-MANIFESTS = [
-    'CG001.v3.4_Amplicon_Manifest_Panel3.4.4_20170921.tsv',
-    'CG001v4.0_Amplicon_Manifest_Panel4.0.3_20181101.tsv',
-    'CG001v5.1_Amplicon_Manifest_Panel5.1.12_20200911.tsv'
-]
-MANIFESTS_DIR = 'assets'
-
 # Prefix of directory where temporary files are unzipped
 TMP_DIR_PREFIX = 'tmp'
-
-
-def get_amplicons_coords(manifests=MANIFESTS):
-    """
-    :param: manifests (list(str)): list of manifests files to consider
-    :return: dict(str, (str, int)): amplicon ID -> chr, start for all amplicons
-    in all manifests
-    """
-    amplicons_coords = {}
-    for manifest_file in manifests:
-        manifest_path = os.path.join(MANIFESTS_DIR, manifest_file)
-        with open(manifest_path) as manifest:
-            manifest_reader = csv.DictReader(manifest, delimiter='\t')
-            for row in manifest_reader:
-                amplicons_coords[row['Amplicon_ID']] = (row['Chr'],
-                                                        int(row['Start']))
-    return amplicons_coords
+# Suffix of the directory where the results of a run are written before
+# replacing its output directory
+STAGING_DIR_EXT = '.staging'
 
 
 def out_dir(run_id, prefix):
@@ -170,6 +139,34 @@ def check_output_files(run_id, sample_id_list, s3_files):
 # VCF files dumping
 
 
+def read_sample_vcf_rows(sample_id, vcf_file):
+    """
+    Reads the VCF file of a sample into dump rows
+    :param: sample_id (str): sample ID
+    :param: vcf_file (opened file or iterable(str)): VCF file of the sample
+    or its lines
+    :return: list(list(str)): dump rows, fields of VCF_DUMP_HEADER
+    """
+    import vcf
+
+    rows = []
+    for record in vcf.Reader(vcf_file):
+        v_info = record.INFO
+        features_cov = DUMP_VALUES_SEP.join(
+            [f"{feature}:{v_info[feature]}" for feature in FEATURES_COV])
+        features_seq = DUMP_VALUES_SEP.join(
+            [f"{feature}:{v_info[feature]}" for feature in FEATURES_SEQ])
+        rows.append([
+            sample_id, record.CHROM,
+            str(record.POS), record.REF,
+            str(record.ALT[0]),
+            str(v_info['VAF']),
+            DUMP_VALUES_SEP.join(v_info[SOURCE]), features_cov, features_seq,
+            DUMP_VALUES_SEP.join(v_info['ANN'])
+        ])
+    return rows
+
+
 def dump_sample_vcf_file(run_id,
                          sample_id,
                          in_file,
@@ -181,40 +178,28 @@ def dump_sample_vcf_file(run_id,
     :param: run_id (str): run ID
     :param: sample_id (str): sample ID
     :param: in_file (str): path to input VCF file
-    :param: out_file (str): path to output TSV file
+    :param: out_file (str or DumpWriter): path to output TSV file or writer of
+    the run dump file
     :param: log_file (opened file): log file
     :param: append (bool): if True, dump is appended otherwise new file created
+    (ignored for a DumpWriter)
     """
-    if not append:
-        out_file = open(out_file, 'w')
-        out_file.write(DUMP_FIELDS_SEP.join(VCF_DUMP_HEADER))
-    else:
-        out_file = open(out_file, 'a')
     if os.stat(in_file).st_size == 0:
         log_file.write(
             f"{WARNING}:{run_id}.{sample_id}\t{in_file} empty VCF file\n")
+        rows = []
     else:
-        sample_vcf_reader = vcf.Reader(open(in_file, 'r'))
-        for record in sample_vcf_reader:
-            record_str = [record.CHROM, record.POS, record.REF, record.ALT[0]]
-            v_info = record.INFO
-            features_cov = [
-                f"{feature}:{v_info[feature]}" for feature in FEATURES_COV
-            ]
-            features_seq = [
-                f"{feature}:{v_info[feature]}" for feature in FEATURES_SEQ
-            ]
-            source = DUMP_VALUES_SEP.join(v_info[SOURCE])
-            annotation = DUMP_VALUES_SEP.join(v_info['ANN'])
-            v_info_str = [
-                v_info['VAF'], source,
-                DUMP_VALUES_SEP.join(features_cov),
-                DUMP_VALUES_SEP.join(features_seq), annotation
-            ]
-            out_str = [sample_id] + record_str + v_info_str
-            out_file.write('\n')
-            out_file.write(DUMP_FIELDS_SEP.join([str(x) for x in out_str]))
-    out_file.close()
+        with open(in_file, 'r') as sample_vcf_file:
+            rows = read_sample_vcf_rows(sample_id, sample_vcf_file)
+    if isinstance(out_file, DumpWriter):
+        out_file.write_rows(rows)
+    elif append:
+        with open(out_file, 'a') as out_dump:
+            out_dump.write(''.join(f"\n{DUMP_FIELDS_SEP.join(row)}"
+                                   for row in rows))
+    else:
+        with DumpWriter(out_file, VCF_DUMP_HEADER) as out_dump:
+            out_dump.write_rows(rows)
 
 
 def get_sample_vcf_file(sample_id, prefix, v_type):
@@ -238,6 +223,11 @@ def extract_vcf_files(run_id,
                       prefix='.'):
     """
     Reads and optionally dump indels VCF files of run run_id.
+    The run dump file is opened once and the rows of each sample are written
+    in a single batch.
+    Reference implementation extracting the calls archive in tmp_run_dir,
+    timed by benchmarks/run_benchmarks.py; the analysis streams the archive
+    instead (see dump_calls_archive).
     :param: run_id (str): ID of the run
     :param: sample_id_list (list(str)): list of sample ID
     :param: s3_bucket (str): s3 bucket where to fetch the results
@@ -248,19 +238,118 @@ def extract_vcf_files(run_id,
     """
     vcf_file_name = f"{run_id}{CALLS_FILE_SUFFIX_TGZ[v_type]}"
     vcf_file_path = os.path.join('s3://', s3_bucket, run_id, vcf_file_name)
-    subprocess.call(AWS_CP + [vcf_file_path, '.'])
+    download_s3_file(vcf_file_path)
     tarfile.open(vcf_file_name, 'r:gz').extractall(path=tmp_run_dir)
-    out_dump_file = get_vcf_dump_file(run_id, prefix, v_type, init=True)
+    out_dump_file = get_vcf_dump_file(run_id, prefix, v_type, init=False)
+    with DumpWriter(out_dump_file, VCF_DUMP_HEADER) as out_dump:
+        for sample_id in sample_id_list:
+            in_vcf = get_sample_vcf_file(sample_id, tmp_run_dir, v_type)
+            dump_sample_vcf_file(run_id, sample_id, in_vcf, out_dump,
+                                 log_file)
+            os.remove(in_vcf)
+    os.remove(vcf_file_name)
+
+
+def read_calls_archive(run_id, sample_id_list, vcf_file_name, v_type,
+                       tmp_run_dir):
+    """
+    Reads the VCF files of the samples of a run from a calls archive, each
+    archive member being streamed line by line to the VCF parser without
+    being extracted
+    :param: run_id (str): ID of the run
+    :param: sample_id_list (list(str)): list of sample ID
+    :param: vcf_file_name (str): path to the calls archive
+    :param: v_type (str): SNPS or INDELS
+    :param: tmp_run_dir (str): directory where extract_vcf_files would
+    extract the VCF files, used to name them in warnings
+    :return: (list(list(list(str))), list(str)): dump rows of each sample of
+    sample_id_list and warnings
+    """
+    vcf_suffix = CALLS_FILE_SUFFIX[v_type]
+    samples_rows = {}
+    with tarfile.open(vcf_file_name, 'r|gz') as calls_archive:
+        for member in calls_archive:
+            member_name = os.path.basename(member.name)
+            if not member.isfile() or not member_name.endswith(vcf_suffix):
+                continue
+            sample_id = member_name[:-len(vcf_suffix)]
+            if member.size == 0:
+                samples_rows[sample_id] = None
+                continue
+            # Decoded lines rather than a text file: the members of a
+            # streamed archive are not seekable, as io.TextIOWrapper
+            # requires, and are named after the archive, which the VCF
+            # parser would read as gzip-compressed
+            vcf_lines = (line.decode()
+                         for line in calls_archive.extractfile(member))
+            samples_rows[sample_id] = read_sample_vcf_rows(
+                sample_id, vcf_lines)
+    rows, warnings = [], []
     for sample_id in sample_id_list:
         in_vcf = get_sample_vcf_file(sample_id, tmp_run_dir, v_type)
-        dump_sample_vcf_file(run_id,
-                             sample_id,
-                             in_vcf,
-                             out_dump_file,
-                             log_file,
-                             append=True)
-        os.remove(in_vcf)
+        if sample_id not in samples_rows:
+            warnings.append(
+                f"{WARNING}:{run_id}.{sample_id}\t{in_vcf} missing VCF file\n")
+            rows.append([])
+        elif samples_rows[sample_id] is None:
+            warnings.append(
+                f"{WARNING}:{run_id}.{sample_id}\t{in_vcf} empty VCF file\n")
+            rows.append([])
+        else:
+            rows.append(samples_rows[sample_id])
+    return rows, warnings
+
+
+def dump_calls_archive(run_id, sample_id_list, s3_bucket, v_type, tmp_run_dir,
+                       prefix):
+    """
+    Downloads the calls archive of a run and writes its dump file
+    :return: list(str): warnings
+    """
+    vcf_file_name = f"{run_id}{CALLS_FILE_SUFFIX_TGZ[v_type]}"
+    vcf_file_path = os.path.join('s3://', s3_bucket, run_id, vcf_file_name)
+    download_s3_file(vcf_file_path)
+    samples_rows, warnings = read_calls_archive(run_id, sample_id_list,
+                                                vcf_file_name, v_type,
+                                                tmp_run_dir)
+    out_dump_file = get_vcf_dump_file(run_id, prefix, v_type, init=False)
+    with DumpWriter(out_dump_file, VCF_DUMP_HEADER) as out_dump:
+        for rows in samples_rows:
+            out_dump.write_rows(rows)
     os.remove(vcf_file_name)
+    return warnings
+
+
+def extract_calls_files(run_id,
+                        sample_id_list,
+                        s3_bucket,
+                        log_file,
+                        tmp_run_dir,
+                        v_types=(INDELS, SNPS),
+                        prefix='.'):
+    """
+    Dumps the VCF files of several variant types of run run_id in a single
+    pass: the calls archives are downloaded and dumped concurrently, one
+    thread per variant type, and read without extracting them.
+    Dump files are identical to the ones written by extract_vcf_files.
+    :param: run_id (str): ID of the run
+    :param: sample_id_list (list(str)): list of sample ID
+    :param: s3_bucket (str): s3 bucket where to fetch the results
+    :param: log_file (opened file): log file
+    :param: tmp_run_dir (str): prefix of tmp dir, used in warnings
+    :param: v_types (list(str)): variant types, among SNPS and INDELS
+    :param: prefix (str): prefix of the output directory
+    """
+    with ThreadPoolExecutor(max_workers=len(v_types)) as executor:
+        futures = [
+            executor.submit(dump_calls_archive, run_id, sample_id_list,
+                            s3_bucket, v_type, tmp_run_dir, prefix)
+            for v_type in v_types
+        ]
+        # Warnings are logged in the order of v_types
+        for future in futures:
+            for warning in future.result():
+                log_file.write(warning)
 
 
 def extract_variants_from_dump_file(dump_file):
@@ -302,7 +391,7 @@ def extract_main_files(run_id,
         main_file_name = f"{sample_id}{MAIN_FILE_SUFFIX}"
         main_file_path = os.path.join('s3://', s3_bucket, run_id,
                                       main_file_name)
-        subprocess.call(AWS_CP + [main_file_path, '.'])
+        download_s3_file(main_file_path)
         tarfile.open(main_file_name, 'r:gz').extractall(path=tmp_run_dir)
         os.remove(main_file_name)
 
@@ -310,11 +399,17 @@ def extract_main_files(run_id,
 # Alignments
 
 
-def extract_alignments(run_id, tmp_run_dir, dump_file, variants,
-                       amplicons_coords):
+def extract_alignments(run_id,
+                       tmp_run_dir,
+                       dump_file,
+                       variants,
+                       amplicons_coords,
+                       v_graph_index=None):
     """
     Associate to every variant in variants the alignments supporting it in all
     amplicons it occurs into and write this into dump_file.
+    If v_graph_index (VariantsGraphIndex) is not None, alignments are read
+    from it instead of from the variants graph files in tmp_run_dir.
     """
     variants_split = defaultdict(list)
     for (sample_id, v_str, source) in variants:
@@ -323,21 +418,22 @@ def extract_alignments(run_id, tmp_run_dir, dump_file, variants,
     out_dump = open(dump_file, 'w')
     out_dump.write(DUMP_FIELDS_SEP.join(ALG_DUMP_HEADER))
     for (sample_id, amplicon_id), v_str_list in variants_split.items():
-        amplicon_chr = amplicons_coords[amplicon_id][0]
-        amplicon_start = amplicons_coords[amplicon_id][1]
-        # Reading variants graph
-        v_graph_file = os.path.join(
-            tmp_run_dir, f"{sample_id}_{amplicon_id}{V_GRAPH_SUFFIX}")
-        v_graph_data = {}
-        v_graph = open(v_graph_file, 'r').readlines()
-        for variant in v_graph:
-            variant_data = variant.rstrip().split('\t')
-            v_str1 = variant_data[1].split(':')
-            v_start = amplicon_start + int(v_str1[2])
-            v_str = f"{amplicon_chr}:{v_start}:{v_str1[4]}:{v_str1[5]}"
-            alignments = variant_data[2]
-            v_graph_data[v_str] = alignments.replace('_', DUMP_VALUES_SEP)
+        if v_graph_index is None:
+            amplicon_chr = amplicons_coords[amplicon_id][0]
+            amplicon_start = amplicons_coords[amplicon_id][1]
+            # Reading variants graph
+            v_graph_file = os.path.join(
+                tmp_run_dir, f"{sample_id}_{amplicon_id}{V_GRAPH_SUFFIX}")
+            v_graph_data = read_variants_graph_file(v_graph_file,
+                                                    amplicon_chr,
+                                                    amplicon_start)
         for v_str in v_str_list:
+            if v_graph_index is None:
+                alignments = v_graph_data[v_str]
+            else:
+                alignments = v_graph_index.get(sample_id, amplicon_id, v_str)
+                if alignments is None:
+                    raise KeyError(v_str)
             v_str_split = v_str.split(':')
             chr = v_str_split[0]
             pos = v_str_split[1]
@@ -347,7 +443,7 @@ def extract_alignments(run_id, tmp_run_dir, dump_file, variants,
                 f"\n{sample_id}{DUMP_FIELDS_SEP}{chr}{DUMP_FIELDS_SEP}{pos}"
                 f"{DUMP_FIELDS_SEP}{ref}{DUMP_FIELDS_SEP}{alt}"
                 f"{DUMP_FIELDS_SEP}{amplicon_id}"
-                f"{DUMP_FIELDS_SEP}{v_graph_data[v_str]}")
+                f"{DUMP_FIELDS_SEP}{alignments}")
             out_dump.write(out_str)
     out_dump.close()
 
@@ -365,7 +461,7 @@ def check_log_files(run_id, sample_id_list, s3_bucket):
     :return: bool: True if all log files are complete
     """
     def get_last_line(file):
-        return open(file).readlines()[-1].rstrip()
+        return read_s3_lines(file)[-1].rstrip()
 
     filters_log_name = f"{run_id}{FILTERS_LOG_FILE_SUFFIX}"
     filters_log_path = os.path.join('s3://', s3_bucket, run_id,
@@ -388,6 +484,29 @@ def check_log_files(run_id, sample_id_list, s3_bucket):
     return True
 
 
+def check_run_outputs(run_id, sample_id_list, s3_bucket):
+    """
+    Checks that the outputs of a run are complete: output directory present,
+    expected files (see check_output_files) and complete log files (see
+    check_log_files)
+    :param: run_id (str): run ID
+    :param: sample_id_list (list(str)): list of samples ID
+    :param: s3_bucket (str): S3 bucket containing the output results, possibly
+    followed by a directory (<bucket>/<directory>)
+    :return: str: ERROR_NONE if the outputs are complete, the error otherwise
+    :raise: RUN_IO_ERRORS if the files of the run can not be read
+    """
+    bucket, _, s3_dir = s3_bucket.partition('/')
+    s3_files = get_files_in_s3(os.path.join(s3_dir, run_id), bucket)
+    if s3_files is None:
+        return 'no output'
+    elif not check_output_files(run_id, sample_id_list, s3_files):
+        return 'missing output files'
+    elif not check_log_files(run_id, sample_id_list, s3_bucket):
+        return 'incomplete log file'
+    return ERROR_NONE
+
+
 def extract_main_warnings(run_id, sample_id_list, s3_bucket, prefix='.'):
     """
     Reads main_log files of run run_id and extracts warnings
@@ -412,7 +531,7 @@ def extract_main_warnings(run_id, sample_id_list, s3_bucket, prefix='.'):
             warning_out_file[warning_key] = open(warning_out_path, 'a')
         main_log_name = f"{run_id}_{sample_id}{MAIN_LOG_FILE_SUFFIX}"
         main_log_path = os.path.join('s3://', s3_bucket, run_id, main_log_name)
-        main_log_file = open(main_log_path, 'r').readlines()
+        main_log_file = read_s3_lines(main_log_path)
         for line in main_log_file:
             line_split = line.rstrip().split('\t')
             if line_split[1] == '[WARNING]':
@@ -424,6 +543,295 @@ def extract_main_warnings(run_id, sample_id_list, s3_bucket, prefix='.'):
             warning_out.close()
 
 
+def get_output_log_file_path(input_log_file_path):
+    """
+    :param: input_log_file_path (str): path to the input log file of a set of
+    runs
+    :return: str: path to the output log file of the set of runs
+    """
+    return input_log_file_path.replace('_input.log', '_output.log')
+
+
+def get_failed_runs_file_path(output_log_file_path):
+    """
+    :param: output_log_file_path (str): path to the output log file of a set of
+    runs
+    :return: str: path to the CSV file of the runs to reprocess, in data
+    """
+    _, log_file_name = os.path.split(output_log_file_path)
+    return os.path.join('data',
+                        log_file_name.replace('_output.log', '_failed.csv'))
+
+
+def extract_run_results(run_id,
+                        sample_id_list,
+                        s3_bucket,
+                        log_file,
+                        tmp_run_dir,
+                        amplicons_coords,
+                        v_types,
+                        prefix,
+                        artefact_store=None,
+                        index_v_graphs=False):
+    """
+    Extracts the warnings, variants calls and indels alignments (dump file
+    and numeric arrays) of a successful run in prefix/run_id, and annotates
+    its patient indels calls with control samples artefacts as soon as they
+    are dumped if an artefact store is given
+    :param: run_id (str): ID of the run
+    :param: sample_id_list (list(str)): list of sample ID
+    :param: s3_bucket (str): s3 bucket where to fetch the results
+    :param: log_file (opened file): log file
+    :param: tmp_run_dir (str): directory where archives are extracted
+    :param: amplicons_coords (dict(str, (str, int))): amplicons coordinates
+    :param: v_types (list(str)): types of variants calls to dump
+    :param: prefix (str): prefix of the output directory
+    :param: artefact_store (ArtefactStore): if not None, store annotating the
+    patient indels calls (see artefact_store.annotate_run)
+    :param: index_v_graphs (bool): if True, the variants graph files of the
+    (sample, amplicon) pairs of the indels calls are compiled in the index
+    <run_id>_variants_graphs.idx and the alignments are read from it,
+    otherwise they are read from the variants graph files
+    :raise: RUN_IO_ERRORS if the files of the run can not be read
+    """
+    os.makedirs(out_dir(run_id, prefix), exist_ok=True)
+    os.makedirs(tmp_run_dir, exist_ok=True)
+    # Extracting warnings
+    extract_main_warnings(run_id, sample_id_list, s3_bucket, prefix=prefix)
+    # Extracting variants calls
+    extract_calls_files(run_id,
+                        sample_id_list,
+                        s3_bucket,
+                        log_file,
+                        tmp_run_dir,
+                        v_types=v_types,
+                        prefix=prefix)
+    # Annotating patient indels calls with control samples artefacts
+    if artefact_store is not None:
+        annotate_run(artefact_store, run_id, prefix)
+    # Extracting main files
+    extract_main_files(run_id,
+                       sample_id_list,
+                       s3_bucket,
+                       tmp_run_dir,
+                       prefix=prefix)
+    # Collecting variants
+    indels_dump_file = get_vcf_dump_file(run_id, prefix, INDELS, init=False)
+    indels = extract_variants_from_dump_file(indels_dump_file)
+    # Extracting alignments
+    alg_dump_file = get_alg_dump_file(run_id, prefix, init=False)
+    if index_v_graphs:
+        # Compiling the variants graphs of the indels calls
+        v_graph_index_file = get_variants_graph_index_file(run_id, prefix)
+        v_graph_pairs = {(sample_id, amplicon_id)
+                         for (sample_id, _, source) in indels
+                         for amplicon_id in source}
+        build_variants_graph_index(tmp_run_dir,
+                                   v_graph_index_file,
+                                   amplicons_coords,
+                                   v_graph_pairs=v_graph_pairs)
+        with VariantsGraphIndex(v_graph_index_file) as v_graph_index:
+            extract_alignments(run_id,
+                               tmp_run_dir,
+                               alg_dump_file,
+                               indels,
+                               amplicons_coords,
+                               v_graph_index=v_graph_index)
+    else:
+        extract_alignments(run_id, tmp_run_dir, alg_dump_file, indels,
+                           amplicons_coords)
+    dump_alg_arrays(run_id, prefix)
+    # Cleaning temporary directory
+    shutil.rmtree(tmp_run_dir)
+
+
+def write_failed_runs_file(failed_runs_file_path, failed_runs):
+    """
+    Writes a CSV file of runs to reprocess, with 2 fields <run_name>,<run_id>
+    :param: failed_runs_file_path (str): path to the CSV file
+    :param: failed_runs (list((str, str))): (run ID, run name) of the runs
+    """
+    unprocessed_file = open(failed_runs_file_path, 'w')
+    unprocessed_run_first = True
+    for (run_id, run_name) in failed_runs:
+        if unprocessed_run_first:
+            unprocessed_file.write(f"{run_name},{run_id}")
+            unprocessed_run_first = False
+        else:
+            unprocessed_file.write(f"\n{run_name},{run_id}")
+    unprocessed_file.close()
+
+
+def analyze_run(run_id,
+                sample_id_list,
+                s3_bucket,
+                log_file,
+                amplicons_coords,
+                v_types,
+                prefix,
+                artefact_store=None,
+                index_v_graphs=False):
+    """
+    Checks the outputs of a run and extracts its results if it is successful;
+    the results are written in a staging directory that replaces the output
+    directory of the run only once they are all extracted, so a run whose
+    files can not be read after retries is logged as unprocessed and keeps
+    the results of its previous analysis, if any
+    :param: run_id (str): ID of the run
+    :param: sample_id_list (list(str)): list of sample ID
+    :param: s3_bucket (str): s3 bucket where to fetch the results
+    :param: log_file (opened file): log file
+    :param: amplicons_coords (dict(str, (str, int))): amplicons coordinates
+    :param: v_types (list(str)): types of variants calls to dump
+    :param: prefix (str): prefix of the output directory
+    :param: artefact_store, index_v_graphs: see extract_run_results
+    :return: bool: True if the run is successful
+    """
+    tmp_run_dir = os.path.join(TMP_DIR_PREFIX, run_id)
+    staging_prefix = os.path.join(prefix, f".{run_id}{STAGING_DIR_EXT}")
+    shutil.rmtree(staging_prefix, ignore_errors=True)
+    try:
+        run_error = check_run_outputs(run_id, sample_id_list, s3_bucket)
+        if run_error == ERROR_NONE:
+            # Warnings of the extraction are logged once it succeeded
+            run_log = io.StringIO()
+            extract_run_results(run_id, sample_id_list, s3_bucket, run_log,
+                                tmp_run_dir, amplicons_coords, v_types,
+                                staging_prefix, artefact_store,
+                                index_v_graphs)
+            run_out_dir = out_dir(run_id, prefix)
+            old_out_dir = f"{run_out_dir}{STAGING_DIR_EXT}"
+            shutil.rmtree(old_out_dir, ignore_errors=True)
+            if os.path.isdir(run_out_dir):
+                os.replace(run_out_dir, old_out_dir)
+            os.replace(out_dir(run_id, staging_prefix), run_out_dir)
+            shutil.rmtree(old_out_dir, ignore_errors=True)
+            shutil.rmtree(staging_prefix)
+            log_file.write(f"{INFO}:{run_id}\t{ERROR_NONE}\n")
+            log_file.write(run_log.getvalue())
+            return True
+    except RUN_IO_ERRORS as error:
+        run_error = ' '.join(str(error).split())
+        shutil.rmtree(staging_prefix, ignore_errors=True)
+        shutil.rmtree(tmp_run_dir, ignore_errors=True)
+    log_file.write(f"{WARNING}:{run_id}\t{run_error}\n")
+    log_file.write(f"{WARNING}:{run_id}\t{ERROR_RUN_UNPROCESSED}\n")
+    return False
+
+
+def analyze_runs_list(sample_id_lists,
+                      output_dir,
+                      s3_bucket,
+                      log_file,
+                      amplicons_coords,
+                      v_types=(INDELS, ),
+                      max_workers=1,
+                      artefact_store=None,
+                      index_v_graphs=False):
+    """
+    Analyzes a set of runs, max_workers runs at a time; the logs of each run
+    are written in the order of sample_id_lists
+    :param: sample_id_lists (dict((str, str), list(str))): sample IDs indexed
+    by (run ID, run name)
+    :param: output_dir, s3_bucket, amplicons_coords, v_types, artefact_store,
+    index_v_graphs: see analyze_runs
+    :param: log_file (opened file): log file
+    :param: max_workers (int): maximum number of runs analyzed concurrently
+    :return: (list(str), list((str, str))): IDs of the successful runs and
+    (run ID, run name) of the unprocessed runs
+    """
+    os.makedirs(TMP_DIR_PREFIX, exist_ok=True)
+    runs = list(sample_id_lists.items())
+    if max_workers == 1:
+        runs_ok = [
+            analyze_run(run_id, sample_id_list, s3_bucket, log_file,
+                        amplicons_coords, v_types, output_dir,
+                        artefact_store, index_v_graphs)
+            for (run_id, _), sample_id_list in runs
+        ]
+    else:
+        runs_logs = [io.StringIO() for _ in runs]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(analyze_run, run_id, sample_id_list,
+                                s3_bucket, run_log, amplicons_coords, v_types,
+                                output_dir, artefact_store, index_v_graphs)
+                for ((run_id, _), sample_id_list), run_log in zip(
+                    runs, runs_logs)
+            ]
+            runs_ok = []
+            for future, run_log in zip(futures, runs_logs):
+                runs_ok.append(future.result())
+                log_file.write(run_log.getvalue())
+    ok_run_id_list, unprocessed_runs = [], []
+    for ((run_id, run_name), _), run_ok in zip(runs, runs_ok):
+        if run_ok:
+            ok_run_id_list.append(run_id)
+        else:
+            unprocessed_runs.append((run_id, run_name))
+    return ok_run_id_list, unprocessed_runs
+
+
+def analyze_runs(input_log_file_path,
+                 output_dir,
+                 s3_bucket=CCHAUVE_S3_OUTPUT,
+                 amplicons_coords=None,
+                 sample_id_lists=None,
+                 unprocessed_runs=None,
+                 v_types=(INDELS, ),
+                 max_workers=1,
+                 artefact_store=None,
+                 index_v_graphs=False):
+    """
+    Checks the outputs of a set of runs, extracts the warnings, variants calls
+    and indels alignments of the successful runs and writes the list of runs
+    to reprocess; a run whose files can not be read after retries is logged
+    and written in the list of runs to reprocess
+    :param: input_log_file_path (str): path to the input log file of the runs
+    :param: output_dir (str): directory where the results are written
+    :param: s3_bucket (str): bucket where to fetch the pipeline output files
+    :param: amplicons_coords (dict(str, (str, int))): amplicons coordinates,
+    read from the manifests if None
+    :param: sample_id_lists, unprocessed_runs: content of the input log file
+    (see run_ledger.read_input_log_file), read from it if None
+    :param: v_types (list(str)): types of variants calls to dump, among
+    INDELS and SNPS
+    :param: max_workers (int): maximum number of runs analyzed concurrently
+    :param: artefact_store (ArtefactStore): if not None, store annotating the
+    patient indels calls of the successful runs with control samples artefacts
+    :param: index_v_graphs (bool): if True, the alignments are read from a
+    compiled index of the variants graphs (see extract_run_results)
+    :return: list(str): IDs of the successful runs
+    """
+    log_file_path = get_output_log_file_path(input_log_file_path)
+    log_file = RunLog(log_file_path)
+
+    if amplicons_coords is None:
+        amplicons_coords = get_amplicons_coords()
+    if sample_id_lists is None:
+        (sample_id_lists,
+         unprocessed_runs) = read_input_log_file(input_log_file_path)
+    unprocessed_runs = list(unprocessed_runs)
+
+    ok_run_id_list, failed_runs = analyze_runs_list(
+        sample_id_lists,
+        output_dir,
+        s3_bucket,
+        log_file,
+        amplicons_coords,
+        v_types=v_types,
+        max_workers=max_workers,
+        artefact_store=artefact_store,
+        index_v_graphs=index_v_graphs)
+    unprocessed_runs += failed_runs
+
+    # Exporting the list of runs to reprocess
+    write_failed_runs_file(get_failed_runs_file_path(log_file_path),
+                           unprocessed_runs)
+    log_file.close()
+    return ok_run_id_list
+
+
 if __name__ == "__main__":
     """
     Reads the input log from a set of runs and checks for each run that was
@@ -458,6 +866,14 @@ if __name__ == "__main__":
     - output_dir: directory where the results are written
     - s3_bucket (optional, default cchauve-orchestration-ch): bucket where to
       fetch indels pipeline output files.
+    - snps (optional): if present, SNPs calls are also dumped, in
+      <run_id>_snps_dump.tsv
+    - artefact_store (optional): directory of an artefact store (see
+      artefact_store.py); if present, the patient indels calls are annotated
+      in <run_id>_indels_artefacts_dump.tsv
+    - index_variants_graphs (optional): if present, the variants graph files
+      of the indels calls are compiled in <run_id>_variants_graphs.idx and
+      the alignments are read from it
     """
     # Input file
     ARGS_RUNS_FILE = ['input_log_file', None, 'Input log file']
@@ -465,6 +881,14 @@ if __name__ == "__main__":
     ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
     # S3 bucket containing the reuslts
     ARGS_S3_BUCKET = ['-s3', '--s3_bucket', 'S3 bucket containing the results']
+    # Dumping SNPs calls
+    ARGS_SNPS = ['--snps', None, 'Dump SNPs calls']
+    # Annotating patient calls with control samples artefacts
+    ARGS_ARTEFACT_STORE = ['-a', '--artefact_store', 'Artefact store']
+    # Reading the alignments from a variants graphs index
+    ARGS_INDEX_V_GRAPHS = [
+        '--index_variants_graphs', None, 'Index the variants graphs'
+    ]
     parser = argparse.ArgumentParser(
         description='Indels pipeline: analysis of results on AWS')
     parser.add_argument(ARGS_RUNS_FILE[0], type=str, help=ARGS_RUNS_FILE[2])
@@ -474,77 +898,23 @@ if __name__ == "__main__":
                         default=CCHAUVE_S3_OUTPUT,
                         type=str,
                         help=ARGS_S3_BUCKET[2])
+    parser.add_argument(ARGS_SNPS[0], action='store_true', help=ARGS_SNPS[2])
+    parser.add_argument(ARGS_ARTEFACT_STORE[0],
+                        ARGS_ARTEFACT_STORE[1],
+                        type=str,
+                        help=ARGS_ARTEFACT_STORE[2])
+    parser.add_argument(ARGS_INDEX_V_GRAPHS[0],
+                        action='store_true',
+                        help=ARGS_INDEX_V_GRAPHS[2])
     args = parser.parse_args()
 
-    log_file_path = args.input_log_file.replace('_input.log', '_output.log')
-    log_file = open(log_file_path, 'w')
-
-    amplicons_coords = get_amplicons_coords()
-
-    (sample_id_lists,
-     unprocessed_runs) = read_input_log_file(args.input_log_file)
-
-    os.makedirs(TMP_DIR_PREFIX, exist_ok=True)
-    for (run_id, run_name), sample_id_list in sample_id_lists.items():
-        prefix = args.output_dir
-        s3_files = get_files_in_s3(run_id, args.s3_bucket)
-        if s3_files is None:
-            log_file.write(f"{WARNING}:{run_id}\tno output\n")
-            unprocessed_runs.append((run_id, run_name))
-        elif not check_output_files(run_id, sample_id_list, s3_files):
-            log_file.write(f"{WARNING}:{run_id}\tmissing output files\n")
-            unprocessed_runs.append((run_id, run_name))
-        elif not check_log_files(run_id, sample_id_list, args.s3_bucket):
-            log_file.write(f"{WARNING}:{run_id}\tincomplete log file\n")
-            unprocessed_runs.append((run_id, run_name))
-        else:
-            log_file.write(f"{INFO}:{run_id}\t{ERROR_NONE}\n")
-            os.makedirs(out_dir(run_id, prefix), exist_ok=True)
-            tmp_run_dir = os.path.join(TMP_DIR_PREFIX, run_id)
-            os.makedirs(tmp_run_dir, exist_ok=True)
-            # Extracting warnings
-            extract_main_warnings(run_id,
-                                  sample_id_list,
-                                  args.s3_bucket,
-                                  prefix=prefix)
-            # Extracting indels calls
-            extract_vcf_files(run_id,
-                              sample_id_list,
-                              args.s3_bucket,
-                              log_file,
-                              tmp_run_dir,
-                              v_type=INDELS,
-                              prefix=prefix)
-            # Extracting main files
-            extract_main_files(run_id,
-                               sample_id_list,
-                               args.s3_bucket,
-                               tmp_run_dir,
-                               prefix=prefix)
-            # Collecting variants
-            indels_dump_file = get_vcf_dump_file(run_id,
-                                                 prefix,
-                                                 INDELS,
-                                                 init=False)
-            indels = extract_variants_from_dump_file(indels_dump_file)
-            # Extracting alignments
-            alg_dump_file = get_alg_dump_file(run_id, prefix, init=False)
-            extract_alignments(run_id, tmp_run_dir, alg_dump_file, indels,
-                               amplicons_coords)
-            # Cleaning temporary directory
-            shutil.rmtree(tmp_run_dir)
-
-    # Exporting the list of runs to reprocess
-    _, log_file_name = os.path.split(log_file_path)
-    unprocessed_file_path = os.path.join(
-        'data', log_file_name.replace('_output.log', '_failed.csv'))
-    unprocessed_file = open(unprocessed_file_path, 'w')
-    unprocessed_run_first = True
-    for (run_id, run_name) in unprocessed_runs:
-        if unprocessed_run_first:
-            unprocessed_file.write(f"{run_name},{run_id}")
-            unprocessed_run_first = False
-        else:
-            unprocessed_file.write(f"\n{run_name},{run_id}")
-    unprocessed_file.close()
-    log_file.close()
+    v_types = (INDELS, SNPS) if args.snps else (INDELS, )
+    artefact_store = None
+    if args.artefact_store is not None:
+        artefact_store = ArtefactStore(args.artefact_store)
+    analyze_runs(args.input_log_file,
+                 args.output_dir,
+                 args.s3_bucket,
+                 v_types=v_types,
+                 artefact_store=artefact_store,
+                 index_v_graphs=args.index_variants_graphs)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Catalog of the snpEff annotations of a set of runs
+The annotation field of the VCF dump files (ANN field of the VCF files) is
+replaced by a compact annotation ID, ANN:<hash of the annotation>, and the
+catalog <output_dir>/annotation_catalog.tsv maps each ID to the full
+annotation and to the gene, effect and impact of its first (most severe)
+snpEff entry. IDs only depend on the annotation, so that dump files of
+different runs or batches encoded separately share the same IDs.
+"""
+
+# Standard imports
+import argparse
+import csv
+import hashlib
+import os
+from collections import defaultdict
+
+# Local imports
+from aggregate_dump_files import get_run_id_list
+from common_utils import (DUMP_FIELDS_SEP, DUMP_VALUES_SEP, INDELS, INFO,
+                          SAMPLE_TYPES, SNPS, VCF_DUMP_HEADER, DumpWriter,
+                          get_aggregated_vcf_dump_file, get_vcf_dump_file)
+
+# Catalog file name and header
+ANN_CATALOG_FILE = 'annotation_catalog.tsv'
+ANN_CATALOG_HEADER = ['ann_id', 'gene', 'effect', 'impact', 'annotation']
+# Annotation IDs: prefix followed by a hash of ANN_ID_SIZE bytes
+ANN_ID_PREFIX = 'ANN:'
+ANN_ID_SIZE = 8
+# Fields of a snpEff annotation entry
+# Allele|Annotation|Annotation_Impact|Gene_Name|Gene_ID|...
+ANN_ENTRY_SEP = '|'
+ANN_EFFECT = 1
+ANN_IMPACT = 2
+ANN_GENE = 3
+# Index of the annotation field in VCF dump rows
+DUMP_ANNOTATION = VCF_DUMP_HEADER.index('annotation')
+
+
+def get_catalog_file(prefix):
+    """
+    :param: prefix (str): directory containing the results of the runs
+    :return: str: path to the annotation catalog of the runs
+    """
+    return os.path.join(prefix, ANN_CATALOG_FILE)
+
+
+def get_annotation_id(annotation):
+    ann_hash = hashlib.blake2b(annotation.encode(), digest_size=ANN_ID_SIZE)
+    return f"{ANN_ID_PREFIX}{ann_hash.hexdigest()}"
+
+
+def is_annotation_id(value):
+    return value.startswith(ANN_ID_PREFIX)
+
+
+def get_row_annotation_id(annotation):
+    """
+    :param: annotation (str): annotation or annotation ID
+    :return: str: ID of the annotation
+    """
+    if is_annotation_id(annotation):
+        return annotation
+    return get_annotation_id(annotation)
+
+
+def parse_annotation(annotation):
+    """
+    :param: annotation (str): snpEff annotation entries separated by
+    DUMP_VALUES_SEP, ordered by decreasing impact
+    :return: (str, str, str): gene, effect and impact of the first entry,
+    empty strings if the annotation is empty
+    """
+    entry = annotation.split(DUMP_VALUES_SEP, 1)[0].split(ANN_ENTRY_SEP)
+    if len(entry) <= ANN_GENE:
+        return '', '', ''
+    return entry[ANN_GENE], entry[ANN_EFFECT], entry[ANN_IMPACT]
+
+
+class AnnotationCatalog:
+    """
+    Annotation catalog of a set of runs, indexed by annotation ID and by
+    gene, effect and impact
+    """
+    def __init__(self, catalog_file):
+        """
+        :param: catalog_file (str): path to the catalog file, read if it
+        exists
+        """
+        self.catalog_file = catalog_file
+        self.annotations = {}
+        self.entries = {}
+        self.index = {
+            field: defaultdict(set)
+            for field in ANN_CATALOG_HEADER[1:-1]
+        }
+        if os.path.isfile(catalog_file):
+            with open(catalog_file) as in_catalog:
+                catalog_reader = csv.reader(in_catalog,
+                                            delimiter=DUMP_FIELDS_SEP)
+                next(catalog_reader, None)
+                for row in catalog_reader:
+                    if len(row) > 0:
+                        self._add_entry(row[0], row[1:-1], row[-1])
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def _add_entry(self, ann_id, ann_fields, annotation):
+        self.annotations[ann_id] = annotation
+        self.entries[ann_id] = ann_fields
+        for field, value in zip(self.index.keys(), ann_fields):
+            self.index[field][value].add(ann_id)
+
+    def add(self, annotation):
+        """
+        :param: annotation (str): annotation or annotation ID
+        :return: str: ID of the annotation, added to the catalog if needed
+        """
+        if is_annotation_id(annotation):
+            return annotation
+        ann_id = get_annotation_id(annotation)
+        if ann_id not in self.annotations:
+            self._add_entry(ann_id, list(parse_annotation(annotation)),
+                            annotation)
+        return ann_id
+
+    def get(self, ann_id):
+        """
+        :return: str: annotation of ann_id, ann_id itself if it is not an
+        annotation ID
+        :raise: KeyError if ann_id is not in the catalog
+        """
+        if not is_annotation_id(ann_id):
+            return ann_id
+        return self.annotations[ann_id]
+
+    def find(self, gene=None, effect=None, impact=None):
+        """
+        :param: gene, effect, impact (str): values of the first entry of the
+        annotations, None for any value
+        :return: set(str): IDs of the matching annotations
+        """
+        ann_ids = set(self.annotations.keys())
+        for field, value in zip(self.index.keys(), [gene, effect, impact]):
+            if value is not None:
+                ann_ids &= self.index[field].get(value, set())
+        return ann_ids
+
+    def save(self):
+        with DumpWriter(self.catalog_file, ANN_CATALOG_HEADER) as out_catalog:
+            out_catalog.write_rows([
+                [ann_id] + self.entries[ann_id] + [annotation]
+                for ann_id, annotation in sorted(self.annotations.items())
+            ])
+
+
+def encode_dump_file(dump_file, catalog):
+    """
+    Replaces the annotations of a VCF dump file by their ID, added to catalog
+    :param: dump_file (str): path to the VCF dump file
+    :param: catalog (AnnotationCatalog): annotation catalog
+    :return: int: number of rows of the dump file
+    """
+    with open(dump_file) as in_dump:
+        dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+        next(dump_reader, None)
+        rows = [row for row in dump_reader if len(row) > 0]
+    for row in rows:
+        row[DUMP_ANNOTATION] = catalog.add(row[DUMP_ANNOTATION])
+    tmp_dump_file = f"{dump_file}.tmp"
+    with DumpWriter(tmp_dump_file, VCF_DUMP_HEADER) as out_dump:
+        out_dump.write_rows(rows)
+    os.replace(tmp_dump_file, dump_file)
+    return len(rows)
+
+
+def encode_runs_dumps(run_id_list, prefix, v_types=(INDELS, )):
+    """
+    Encodes the VCF dump files of a set of runs with the annotation catalog
+    of the runs, updated and saved in <prefix>/annotation_catalog.tsv
+    Rows already encoded keep their annotation ID.
+    :param: run_id_list (list(str)): run IDs
+    :param: prefix (str): directory containing the results of the runs
+    :param: v_types (list(str)): types of variants dump files to encode
+    :return: AnnotationCatalog: annotation catalog of the runs
+    """
+    catalog = AnnotationCatalog(get_catalog_file(prefix))
+    for run_id in run_id_list:
+        for v_type in v_types:
+            dump_file = get_vcf_dump_file(run_id, prefix, v_type, init=False)
+            if os.path.isfile(dump_file):
+                encode_dump_file(dump_file, catalog)
+    catalog.save()
+    return catalog
+
+
+def find_grouped_indels(prefix, catalog, gene=None, effect=None,
+                        impact=None):
+    """
+    :param: prefix (str): directory containing the grouped indels dump files
+    :param: catalog (AnnotationCatalog): annotation catalog
+    :param: gene, effect, impact: see AnnotationCatalog.find
+    :return: dict(str, list(list(str))): grouped indels rows whose annotation
+    matches, indexed by sample type
+    Grouped dump files aggregated before the run dump files were encoded
+    carry full annotations, matched through their annotation ID.
+    """
+    ann_ids = catalog.find(gene, effect, impact)
+    grouped_indels = {}
+    for sample_type in SAMPLE_TYPES:
+        dump_file = get_aggregated_vcf_dump_file(
+            f"{sample_type}_grouped_samples", prefix, INDELS, init=False)
+        with open(dump_file) as in_dump:
+            dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+            header = next(dump_reader)
+            ann_index = header.index('annotation')
+            grouped_indels[sample_type] = [
+                row for row in dump_reader
+                if len(row) > 0 and get_row_annotation_id(row[ann_index])
+                in ann_ids
+            ]
+    return grouped_indels
+
+
+if __name__ == "__main__":
+    """
+    Encodes the VCF dump files of the runs of output_dir with the annotation
+    catalog output_dir/annotation_catalog.tsv, or, if gene, effect or impact
+    is given, prints the grouped indels whose annotation matches
+
+    Arguments:
+    - output_dir: directory containing the results of the runs
+    - snps (optional): if present, SNPs dump files are also encoded
+    - gene, effect, impact (optional): annotation to search, e.g.
+      -g NTRK1 -i HIGH
+    """
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    ARGS_SNPS = ['--snps', None, 'Encode SNPs dump files']
+    ARGS_GENE = ['-g', '--gene', 'Gene']
+    ARGS_EFFECT = ['-e', '--effect', 'Effect']
+    ARGS_IMPACT = ['-i', '--impact', 'Impact']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: annotation catalog')
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_SNPS[0], action='store_true', help=ARGS_SNPS[2])
+    parser.add_argument(ARGS_GENE[0],
+                        ARGS_GENE[1],
+                        type=str,
+                        help=ARGS_GENE[2])
+    parser.add_argument(ARGS_EFFECT[0],
+                        ARGS_EFFECT[1],
+                        type=str,
+                        help=ARGS_EFFECT[2])
+    parser.add_argument(ARGS_IMPACT[0],
+                        ARGS_IMPACT[1],
+                        type=str,
+                        help=ARGS_IMPACT[2])
+    args = parser.parse_args()
+
+    if args.gene is None and args.effect is None and args.impact is None:
+        v_types = (INDELS, SNPS) if args.snps else (INDELS, )
+        catalog = encode_runs_dumps(get_run_id_list(args.output_dir),
+                                    args.output_dir, v_types)
+        print(f"{INFO}\tannotations:\t{len(catalog)}")
+    else:
+        catalog = AnnotationCatalog(get_catalog_file(args.output_dir))
+        grouped_indels = find_grouped_indels(args.output_dir, catalog,
+                                             args.gene, args.effect,
+                                             args.impact)
+        for sample_type, groups in grouped_indels.items():
+            print(f"{INFO}\t{sample_type} grouped indels:\t{len(groups)}")
+            for group in groups:
+                print(DUMP_FIELDS_SEP.join(group))
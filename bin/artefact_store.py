@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Persistent store of the indels called in control samples (nf, blank, qmrs)
+over all ingested batches of runs, to flag artefacts in patient samples
+Each control indel (chr, pos, ref, alt) is stored under a 64 bits hash of
+its key with its number of control calls and the sum, sum of squares and
+maximum of their VAF. The store is saved in a single compressed file
+<store_dir>/artefact_store.npz (sorted hashes and statistics arrays, and
+metadata: format, version incremented at each update, ingested batches and
+runs, number of control samples of the ingested runs, read from the runs
+ledger). Runs are ingested once, so the store is updated incrementally;
+patient calls are annotated by streaming their dump files with a hash table
+lookup per call.
+"""
+
+# Standard imports
+import argparse
+import csv
+import hashlib
+import json
+import os
+
+# Local imports
+from aggregate_dump_files import get_run_id_list
+from common_utils import (DUMP_FIELDS_SEP, INDELS, INFO, SAMPLE_TYPE_CTRL,
+                          SAMPLE_TYPE_DNA, DumpWriter, get_sample_info,
+                          get_vcf_dump_file)
+from control_artefacts import count_ctrl_samples
+from run_ledger import read_runs_samples
+
+# Store file name and format
+ARTEFACT_STORE_FILE = 'artefact_store.npz'
+ARTEFACT_STORE_FORMAT = 1
+# Size in bytes of the hash of a variant key
+VARIANT_HASH_SIZE = 8
+# Statistics of a control indel: number of calls, sum, sum of squares and
+# maximum of the VAF
+STAT_NB = 0
+STAT_SUM = 1
+STAT_SUM_SQ = 2
+STAT_MAX = 3
+# Fields of the dump files rows of a call
+CALL_FIELDS = ['sample', 'chr', 'pos', 'ref', 'alt', 'VAF']
+# Columns added to annotated patient calls
+ARTEFACT_HEADER = [
+    'artefact_nb', 'artefact_freq', 'artefact_avg_vaf', 'artefact_max_vaf'
+]
+# Annotated patient calls file suffix
+ARTEFACT_DUMP_EXT = '_artefacts_dump.tsv'
+# Number of rows written at once by the annotator
+ARTEFACT_BATCH_SIZE = 10000
+
+
+def get_store_file(store_dir):
+    """
+    :param: store_dir (str): directory of the artefact store
+    :return: str: path to the store file
+    """
+    return os.path.join(store_dir, ARTEFACT_STORE_FILE)
+
+
+def get_artefact_dump_file(run_id, prefix):
+    """
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the path to output directory
+    :return: str: path to the annotated patient indels of the run
+    """
+    return os.path.join(prefix, run_id,
+                        f"{run_id}_{INDELS}{ARTEFACT_DUMP_EXT}")
+
+
+def get_variant_hash(chrom, pos, ref, alt):
+    """
+    :return: int: 64 bits hash of the variant key chr:pos:ref:alt
+    """
+    v_hash = hashlib.blake2b(f"{chrom}:{pos}:{ref}:{alt}".encode(),
+                             digest_size=VARIANT_HASH_SIZE)
+    return int.from_bytes(v_hash.digest(), 'little')
+
+
+def read_calls(dump_file_path):
+    """
+    :param: dump_file_path (str): path to a VCF dump file
+    :return: generator((list(str), list(str))): row and CALL_FIELDS fields
+    of each call of the dump file
+    """
+    with open(dump_file_path) as in_dump:
+        dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+        header = next(dump_reader, None)
+        if header is None:
+            return
+        fields = [header.index(field) for field in CALL_FIELDS]
+        for row in dump_reader:
+            if len(row) > 0:
+                yield row, [row[i] for i in fields]
+
+
+class ArtefactStore:
+    """
+    Artefact store: control indels statistics indexed by variant hash
+    """
+    def __init__(self, store_dir):
+        """
+        :param: store_dir (str): directory of the store, read if it exists
+        """
+        import numpy as np
+
+        self.store_file = get_store_file(store_dir)
+        self.version = 0
+        self.batches, self.runs = [], {}
+        self.nb_samples = 0
+        self.variants = {}
+        if os.path.isfile(self.store_file):
+            with np.load(self.store_file) as arrays:
+                metadata = json.loads(str(arrays['metadata']))
+                if metadata['format'] != ARTEFACT_STORE_FORMAT:
+                    raise ValueError(f"{self.store_file}: format "
+                                     f"{metadata['format']} not supported")
+                self.version = metadata['version']
+                self.batches = metadata['batches']
+                self.runs = metadata['runs']
+                self.nb_samples = metadata['nb_samples']
+                self.variants = dict(
+                    zip(arrays['keys'].tolist(), arrays['stats'].tolist()))
+
+    def __len__(self):
+        return len(self.variants)
+
+    def add_call(self, chrom, pos, ref, alt, vaf):
+        """
+        :param: chrom, pos, ref, alt (str): control indel
+        :param: vaf (float): VAF of the call
+        """
+        v_hash = get_variant_hash(chrom, pos, ref, alt)
+        stats = self.variants.get(v_hash)
+        if stats is None:
+            self.variants[v_hash] = [1, vaf, vaf * vaf, vaf]
+        else:
+            stats[STAT_NB] += 1
+            stats[STAT_SUM] += vaf
+            stats[STAT_SUM_SQ] += vaf * vaf
+            stats[STAT_MAX] = max(stats[STAT_MAX], vaf)
+
+    def ingest_batch(self, batch_dir, runs_samples):
+        """
+        Adds the control indels calls of the runs of a batch that are not
+        already in the store
+        :param: batch_dir (str): directory containing the results of the runs
+        of the batch
+        :param: runs_samples (dict(str, list(str))): run ID -> sample IDs (see
+        run_ledger.read_runs_samples), to count the control samples of the
+        runs, including control samples without indels calls
+        :return: list(str), list(str): IDs of the ingested runs, IDs of the
+        runs skipped as already ingested from another batch
+        """
+        batch_name = os.path.basename(os.path.normpath(batch_dir))
+        ingested_runs, skipped_runs = [], []
+        for run_id in sorted(get_run_id_list(batch_dir)):
+            if run_id in self.runs:
+                skipped_runs.append(run_id)
+                continue
+            dump_file = get_vcf_dump_file(run_id,
+                                          batch_dir,
+                                          INDELS,
+                                          init=False)
+            if not os.path.isfile(dump_file):
+                continue
+            ctrl_samples = set()
+            for _, (sample, chrom, pos, ref, alt,
+                    vaf) in read_calls(dump_file):
+                if get_sample_info(sample).sample_type == SAMPLE_TYPE_CTRL:
+                    ctrl_samples.add(sample)
+                    self.add_call(chrom, pos, ref, alt, float(vaf))
+            # Control samples of a run missing from the ledger are still
+            # counted
+            self.nb_samples += max(
+                count_ctrl_samples(runs_samples, [run_id]),
+                len(ctrl_samples))
+            self.runs[run_id] = batch_name
+            ingested_runs.append(run_id)
+        if batch_name not in self.batches:
+            self.batches.append(batch_name)
+        return ingested_runs, skipped_runs
+
+    def get(self, chrom, pos, ref, alt):
+        """
+        :param: chrom, pos, ref, alt (str): indel
+        :return: list(str): ARTEFACT_HEADER fields of the indel (number of
+        control calls, frequency in control samples, mean and maximum VAF)
+        """
+        stats = self.variants.get(get_variant_hash(chrom, pos, ref, alt))
+        if stats is None:
+            return ['0', '0.0', '0.0', '0.0']
+        nb = int(stats[STAT_NB])
+        return [
+            str(nb),
+            str(round(nb / self.nb_samples, 4)),
+            str(round(stats[STAT_SUM] / nb, 4)),
+            str(round(stats[STAT_MAX], 4))
+        ]
+
+    def save(self):
+        """
+        Writes the store with an incremented version, replacing the previous
+        one only once it is completely written
+        """
+        import numpy as np
+
+        self.version += 1
+        metadata = {
+            'format': ARTEFACT_STORE_FORMAT,
+            'version': self.version,
+            'batches': self.batches,
+            'runs': self.runs,
+            'nb_samples': self.nb_samples
+        }
+        keys = np.fromiter(self.variants.keys(),
+                           dtype=np.uint64,
+                           count=len(self.variants))
+        stats = np.array(list(self.variants.values()),
+                         dtype=np.float64).reshape(-1, len(ARTEFACT_HEADER))
+        order = np.argsort(keys)
+        tmp_store_file = f"{self.store_file}.tmp"
+        with open(tmp_store_file, 'wb') as out_store:
+            np.savez_compressed(out_store,
+                                keys=keys[order],
+                                stats=stats[order],
+                                metadata=np.array(json.dumps(metadata)))
+        os.replace(tmp_store_file, self.store_file)
+
+
+def annotate_dump_file(store, dump_file_path, out_file_path):
+    """
+    Streams the calls of a VCF dump file and writes the calls of patient
+    samples followed by their ARTEFACT_HEADER fields
+    :param: store (ArtefactStore): artefact store
+    :param: dump_file_path (str): path to the VCF dump file
+    :param: out_file_path (str): path to the annotated calls file
+    :return: int: number of annotated calls
+    """
+    nb_calls = 0
+    with open(dump_file_path) as in_dump:
+        header = next(csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP), [])
+    with DumpWriter(out_file_path, header + ARTEFACT_HEADER) as out_dump:
+        rows = []
+        for row, (sample, chrom, pos, ref, alt,
+                  _) in read_calls(dump_file_path):
+            if get_sample_info(sample).sample_type != SAMPLE_TYPE_DNA:
+                continue
+            rows.append(row + store.get(chrom, pos, ref, alt))
+            if len(rows) == ARTEFACT_BATCH_SIZE:
+                out_dump.write_rows(rows)
+                nb_calls += len(rows)
+                rows = []
+        out_dump.write_rows(rows)
+        nb_calls += len(rows)
+    return nb_calls
+
+
+def annotate_run(store, run_id, prefix):
+    """
+    Annotates the patient indels calls of a run, written in
+    prefix/run_id/run_id_indels_artefacts_dump.tsv
+    :param: store (ArtefactStore): artefact store
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the path to output directory
+    :return: int: number of annotated calls
+    """
+    return annotate_dump_file(
+        store, get_vcf_dump_file(run_id, prefix, INDELS, init=False),
+        get_artefact_dump_file(run_id, prefix))
+
+
+if __name__ == "__main__":
+    """
+    Ingests the control samples indels calls of the runs of one or several
+    batches in the artefact store of store_dir (created if needed), runs
+    already ingested from any batch being skipped, and annotates the
+    patient indels calls of the runs of the batches to annotate in
+    <run_id>/<run_id>_indels_artefacts_dump.tsv, with columns
+    - artefact_nb: number of control calls of the indel in the store
+    - artefact_freq: artefact_nb / number of control samples of the runs
+      ingested in the store
+    - artefact_avg_vaf, artefact_max_vaf: mean and maximum VAF of these calls
+
+    Arguments:
+    - store_dir: directory of the artefact store
+    - batch_dirs: directories containing the results of the batches to ingest
+    - input_log_files (required to ingest batches): input log files of the
+      runs of the batches to ingest
+    - annotate_dirs (optional): directories containing the results of the
+      batches to annotate
+    """
+    ARGS_STORE_DIR = ['store_dir', None, 'Artefact store directory']
+    ARGS_BATCH_DIRS = ['batch_dirs', None, 'Batches directories to ingest']
+    ARGS_INPUT_LOG_FILES = ['-l', '--input_log_files', 'Input log files']
+    ARGS_ANNOTATE_DIRS = [
+        '-a', '--annotate_dirs', 'Batches directories to annotate'
+    ]
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: control samples artefact store')
+    parser.add_argument(ARGS_STORE_DIR[0], type=str, help=ARGS_STORE_DIR[2])
+    parser.add_argument(ARGS_BATCH_DIRS[0],
+                        type=str,
+                        nargs='*',
+                        help=ARGS_BATCH_DIRS[2])
+    parser.add_argument(ARGS_INPUT_LOG_FILES[0],
+                        ARGS_INPUT_LOG_FILES[1],
+                        type=str,
+                        nargs='+',
+                        default=[],
+                        help=ARGS_INPUT_LOG_FILES[2])
+    parser.add_argument(ARGS_ANNOTATE_DIRS[0],
+                        ARGS_ANNOTATE_DIRS[1],
+                        type=str,
+                        nargs='+',
+                        default=[],
+                        help=ARGS_ANNOTATE_DIRS[2])
+    args = parser.parse_args()
+    if len(args.batch_dirs) > 0 and len(args.input_log_files) == 0:
+        parser.error('input_log_files are required to ingest batches')
+
+    os.makedirs(args.store_dir, exist_ok=True)
+    store = ArtefactStore(args.store_dir)
+    if len(args.batch_dirs) > 0:
+        runs_samples = read_runs_samples(args.input_log_files)
+        for batch_dir in args.batch_dirs:
+            ingested_runs, skipped_runs = store.ingest_batch(
+                batch_dir, runs_samples)
+            print(f"{INFO}\t{batch_dir}\tingested runs:\t{len(ingested_runs)}")
+            for run_id in skipped_runs:
+                print(f"{INFO}\t{batch_dir}\t{run_id}\talready ingested from "
+                      f"{store.runs[run_id]}")
+        store.save()
+    print(f"{INFO}\tartefact store version:\t{store.version}")
+    print(f"{INFO}\tcontrol samples:\t{store.nb_samples}")
+    print(f"{INFO}\tcontrol indels:\t{len(store)}")
+    for annotate_dir in args.annotate_dirs:
+        nb_calls = sum(
+            annotate_run(store, run_id, annotate_dir)
+            for run_id in get_run_id_list(annotate_dir))
+        print(f"{INFO}\t{annotate_dir}\tannotated calls:\t{nb_calls}")
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Clusters of co-located indels across the samples of one or several batches
+of runs
+The distinct indels of all samples are encoded as integer arrays (chromosome
+index, position) and sorted, and a sweep over the sorted positions starts a
+new cluster at each chromosome change or gap larger than gap_len between
+consecutive positions; the calls of all samples are then mapped to their
+cluster, in O(n log n) time for n distinct indels.
+"""
+
+# Standard imports
+import argparse
+import csv
+import os
+from array import array
+
+# Local imports
+from aggregate_dump_files import get_run_id_list, sort_chr
+from common_utils import (DUMP_FIELDS_SEP, DUMP_VALUES_SEP, INDELS, INFO,
+                          DumpWriter, get_vcf_dump_file)
+
+# Default maximum gap between consecutive indels of a cluster
+GAP_LEN = 5
+# Default minimum numbers of distinct indels and of samples of a cluster
+MIN_INDELS = 2
+MIN_SAMPLES = 2
+# Header of the clusters file
+CLUSTERS_HEADER = [
+    'cluster', 'chr', 'start', 'end', 'nb_indels', 'nb_samples', 'indels',
+    'samples'
+]
+
+
+class EncodedIndels:
+    """
+    Indels calls of a set of samples encoded as integers: each distinct indel
+    (chr, pos, ref, alt) and each sample (<run_id>.<sample_id>) has an index,
+    and the calls are pairs (indel index, sample index)
+    """
+    def __init__(self):
+        self.chromosomes, self.chr_index = [], {}
+        self.indels, self.indel_index = [], {}
+        self.samples, self.sample_index = [], {}
+        self.indel_chr, self.indel_pos = array('q'), array('q')
+        self.call_indel, self.call_sample = array('q'), array('q')
+
+    def add_call(self, sample, chrom, pos, ref, alt):
+        """
+        :param: sample (str): sample label
+        :param: chrom, pos, ref, alt (str): indel
+        """
+        indel = (chrom, pos, ref, alt)
+        indel_idx = self.indel_index.get(indel)
+        if indel_idx is None:
+            indel_idx = len(self.indels)
+            self.indel_index[indel] = indel_idx
+            self.indels.append(':'.join(indel))
+            chr_idx = self.chr_index.setdefault(chrom, len(self.chromosomes))
+            if chr_idx == len(self.chromosomes):
+                self.chromosomes.append(chrom)
+            self.indel_chr.append(chr_idx)
+            self.indel_pos.append(int(pos))
+        sample_idx = self.sample_index.setdefault(sample, len(self.samples))
+        if sample_idx == len(self.samples):
+            self.samples.append(sample)
+        self.call_indel.append(indel_idx)
+        self.call_sample.append(sample_idx)
+
+    def add_dump_file(self, dump_file_path, run_id):
+        """
+        Adds the calls of a VCF dump file of a run
+        :param: dump_file_path (str): path to the dump file
+        :param: run_id (str): run ID, prefix of the samples labels
+        """
+        with open(dump_file_path) as in_dump:
+            dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+            header = next(dump_reader, None)
+            if header is None:
+                return
+            fields = [
+                header.index(field)
+                for field in ['sample', 'chr', 'pos', 'ref', 'alt']
+            ]
+            for row in dump_reader:
+                if len(row) > 0:
+                    sample, chrom, pos, ref, alt = [row[i] for i in fields]
+                    self.add_call(f"{run_id}.{sample}", chrom, pos, ref, alt)
+
+
+def read_batches_indels(output_dirs):
+    """
+    :param: output_dirs (list(str)): directories containing the results of
+    batches of runs
+    :return: EncodedIndels: indels calls of all runs of all batches
+    """
+    encoded_indels = EncodedIndels()
+    for output_dir in output_dirs:
+        for run_id in sorted(get_run_id_list(output_dir)):
+            dump_file = get_vcf_dump_file(run_id,
+                                          output_dir,
+                                          INDELS,
+                                          init=False)
+            if os.path.isfile(dump_file):
+                encoded_indels.add_dump_file(dump_file, run_id)
+    return encoded_indels
+
+
+def get_colocated_clusters(encoded_indels,
+                           gap_len=GAP_LEN,
+                           min_indels=MIN_INDELS,
+                           min_samples=MIN_SAMPLES):
+    """
+    Sweep-line clustering of the distinct indels of a set of samples: two
+    consecutive indels (by position) are in the same cluster if they are on
+    the same chromosome at most gap_len bases apart
+    :param: encoded_indels (EncodedIndels): indels calls
+    :param: gap_len (int): maximum gap between consecutive indels of a
+    cluster
+    :param: min_indels (int): minimum number of distinct indels of a cluster
+    :param: min_samples (int): minimum number of samples carrying an indel of
+    a cluster
+    :return: list((str, int, int, list(str), list(str))): chromosome, start,
+    end, indels (chr:pos:ref:alt, by position) and samples of the clusters,
+    ordered by chromosome and start
+    """
+    import numpy as np
+
+    nb_indels = len(encoded_indels.indels)
+    if nb_indels == 0:
+        return []
+    indel_chr = np.frombuffer(encoded_indels.indel_chr, dtype=np.int64)
+    indel_pos = np.frombuffer(encoded_indels.indel_pos, dtype=np.int64)
+    call_indel = np.frombuffer(encoded_indels.call_indel, dtype=np.int64)
+    call_sample = np.frombuffer(encoded_indels.call_sample, dtype=np.int64)
+    # Sweep over the indels sorted by chromosome and position
+    order = np.lexsort((indel_pos, indel_chr))
+    sorted_chr, sorted_pos = indel_chr[order], indel_pos[order]
+    cluster_start = np.ones(nb_indels, dtype=bool)
+    cluster_start[1:] = ((sorted_chr[1:] != sorted_chr[:-1]) |
+                         (np.diff(sorted_pos) > gap_len))
+    starts = np.flatnonzero(cluster_start)
+    ends = np.append(starts[1:], nb_indels)
+    indel_cluster = np.empty(nb_indels, dtype=np.int64)
+    indel_cluster[order] = np.cumsum(cluster_start) - 1
+    # Distinct samples of each cluster
+    call_cluster = indel_cluster[call_indel]
+    nb_samples = len(encoded_indels.samples)
+    cluster_samples = np.unique(call_cluster * nb_samples + call_sample)
+    samples_cluster = cluster_samples // nb_samples
+    clusters_nb_samples = np.bincount(samples_cluster, minlength=len(starts))
+    selected = np.flatnonzero((ends - starts >= min_indels)
+                              & (clusters_nb_samples >= min_samples))
+    # Samples of the selected clusters, from the sorted (cluster, sample) keys
+    samples_bounds = np.searchsorted(samples_cluster,
+                                     [selected, selected + 1])
+    clusters = []
+    for i, cluster in enumerate(selected):
+        start, end = starts[cluster], ends[cluster]
+        indels = sorted(order[start:end],
+                        key=lambda x: (indel_pos[x], encoded_indels.indels[x]))
+        samples = cluster_samples[samples_bounds[0][i]:samples_bounds[1][i]]
+        clusters.append(
+            (encoded_indels.chromosomes[sorted_chr[start]],
+             int(sorted_pos[start]), int(sorted_pos[end - 1]),
+             [encoded_indels.indels[x] for x in indels],
+             sorted(encoded_indels.samples[x % nb_samples] for x in samples)))
+    clusters.sort(key=lambda x: (sort_chr(x[0]), x[1]))
+    return clusters
+
+
+def write_colocated_clusters(output_file_path, clusters):
+    """
+    Writes clusters of co-located indels, one per line (CLUSTERS_HEADER)
+    :param: output_file_path (str): path to the output file
+    :param: clusters (list): see get_colocated_clusters
+    """
+    with DumpWriter(output_file_path, CLUSTERS_HEADER) as out_clusters:
+        out_clusters.write_rows([[
+            str(cluster_id), chrom,
+            str(start),
+            str(end),
+            str(len(indels)),
+            str(len(samples)),
+            DUMP_VALUES_SEP.join(indels),
+            DUMP_VALUES_SEP.join(samples)
+        ] for cluster_id, (chrom, start, end, indels,
+                           samples) in enumerate(clusters, start=1)])
+
+
+if __name__ == "__main__":
+    """
+    Reads the indels dump files of the runs of one or several batches and
+    writes the clusters of co-located indels across all samples, with
+    columns cluster (number), chr, start and end (positions of the first and
+    last indels), nb_indels, nb_samples, indels (chr:pos:ref:alt) and samples
+    (<run_id>.<sample_id>)
+
+    Arguments:
+    - output_file: path to the clusters file
+    - output_dirs: directories containing the results of the runs of each
+      batch (e.g. results/*)
+    - gap_len (optional): maximum gap between consecutive indels of a
+      cluster; default = 5
+    - min_indels (optional): minimum number of distinct indels of a cluster;
+      default = 2
+    - min_samples (optional): minimum number of samples carrying an indel of
+      a cluster; default = 2
+    """
+    ARGS_OUTPUT_FILE = ['output_file', None, 'Clusters file']
+    ARGS_OUTPUT_DIRS = ['output_dirs', None, 'Batches output directories']
+    ARGS_GAP_LEN = ['-g', '--gap_len', 'Gap length']
+    ARGS_MIN_INDELS = ['-i', '--min_indels', 'Minimum number of indels']
+    ARGS_MIN_SAMPLES = ['-s', '--min_samples', 'Minimum number of samples']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: clusters of co-located indels')
+    parser.add_argument(ARGS_OUTPUT_FILE[0],
+                        type=str,
+                        help=ARGS_OUTPUT_FILE[2])
+    parser.add_argument(ARGS_OUTPUT_DIRS[0],
+                        type=str,
+                        nargs='+',
+                        help=ARGS_OUTPUT_DIRS[2])
+    parser.add_argument(ARGS_GAP_LEN[0],
+                        ARGS_GAP_LEN[1],
+                        type=int,
+                        default=GAP_LEN,
+                        help=ARGS_GAP_LEN[2])
+    parser.add_argument(ARGS_MIN_INDELS[0],
+                        ARGS_MIN_INDELS[1],
+                        type=int,
+                        default=MIN_INDELS,
+                        help=ARGS_MIN_INDELS[2])
+    parser.add_argument(ARGS_MIN_SAMPLES[0],
+                        ARGS_MIN_SAMPLES[1],
+                        type=int,
+                        default=MIN_SAMPLES,
+                        help=ARGS_MIN_SAMPLES[2])
+    args = parser.parse_args()
+
+    encoded_indels = read_batches_indels(args.output_dirs)
+    clusters = get_colocated_clusters(encoded_indels, args.gap_len,
+                                      args.min_indels, args.min_samples)
+    write_colocated_clusters(args.output_file, clusters)
+    print(f"{INFO}\tindels calls:\t{len(encoded_indels.call_indel)}")
+    print(f"{INFO}\tdistinct indels:\t{len(encoded_indels.indels)}")
+    print(f"{INFO}\tclusters:\t{len(clusters)}")
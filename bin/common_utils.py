@@ -1,22 +1,69 @@
 """
 Constants and functions common to several modules
+Only standard modules are imported at load time; S3 accesses are in s3_utils
 """
 
+import csv
+import gzip
 import os
-
-import boto3
+import re
+import sys
+from collections import namedtuple
+from functools import lru_cache
 
 ERROR_RUN_NO_DATA = 'no data'
 ERROR_RUN_NO_SAMPLE = 'no sample'
 ERROR_RUN_NO_CORRECT_SAMPLE = 'no correct sample'
 ERROR_RUN_UNPROCESSED = 'unprocessed'
+ERROR_RUN_DONE = 'already processed'
 ERROR_FASTQ = 'error FASTQ files'
+ERROR_FASTQ_READS = 'different numbers of R1 and R2 reads'
 ERROR_NONE = 'OK'
 WARNING = 'WARNING'
 INFO = 'INFO'
 RUN_ID = 'RUN.ID'
 AWS_CMD = 'AWS'
+AWS_JOB = 'AWS.JOB'
 RUN_SAMPLES = 'RUN.SAMPLES'
+RUN_READS = 'RUN.READS'
+ROUND = 'ROUND'
+
+# Suffixes of files generated by the pipeline
+INDELS_FILE_SUFFIX = '_indels_filtered_snpeff.vcf'
+INDELS_FILE_SUFFIX_TGZ = f"{INDELS_FILE_SUFFIX}.tar.gz"
+SNPS_FILE_SUFFIX = '_snps_filtered_snpeff.vcf'
+SNPS_FILE_SUFFIX_TGZ = f"{SNPS_FILE_SUFFIX}.tar.gz"
+FILTERS_LOG_FILE_SUFFIX = '_samples_filters.log'
+MAIN_FILE_SUFFIX = '_main.tar.gz'
+MAIN_LOG_FILE_SUFFIX = '_main.log'
+PRE_LOG_FILE_SUFFIX = '_preprocessing.log'
+FASTQ_FILES_SUFFIX = '_L001_annotated.fq.tar.gz'
+V_GRAPH_SUFFIX = '_variants_graph.txt'
+
+# Keys to differentiate indels and SNPs
+INDELS, SNPS = 'indels', 'snps'
+CALLS_FILE_SUFFIX_TGZ = {
+    INDELS: INDELS_FILE_SUFFIX_TGZ,
+    SNPS: SNPS_FILE_SUFFIX_TGZ
+}
+CALLS_FILE_SUFFIX = {INDELS: INDELS_FILE_SUFFIX, SNPS: SNPS_FILE_SUFFIX}
+
+# Log steps
+WARNINGS_OUTPUT_SUFFIX = {
+    'bin.reads_utils': '_reads.tsv',
+    'bin.clusters_utils': '_clusters.tsv',
+    'bin.alignments_utils': '_alignments.tsv',
+    'bin.variants_utils': '_variants.tsv',
+    'bin.variants_graph_utils': '_variants_graph.tsv'
+}
+
+# Amplicons manifests
+MANIFESTS = [
+    'CG001.v3.4_Amplicon_Manifest_Panel3.4.4_20170921.tsv',
+    'CG001v4.0_Amplicon_Manifest_Panel4.0.3_20181101.tsv',
+    'CG001v5.1_Amplicon_Manifest_Panel5.1.12_20200911.tsv'
+]
+MANIFESTS_DIR = 'assets'
 
 # Dump files separators
 DUMP_FIELDS_SEP = '\t'
@@ -32,25 +79,79 @@ ALG_DUMP_EXT = '_alignments_dump.tsv'
 ALG_DUMP_HEADER = [
     'sample', 'chr', 'pos', 'ref', 'alt', 'source', 'alignments'
 ]
+# Extension of gzip-compressed dump files
+DUMP_GZ_EXT = '.gz'
+# Buffer size of dump files writers
+DUMP_BUFFER_SIZE = 1 << 20
 
+# Compact records for dump files rows
+VCFDumpRecord = namedtuple('VCFDumpRecord', VCF_DUMP_HEADER)
+ALGDumpRecord = namedtuple('ALGDumpRecord', ALG_DUMP_HEADER)
+# Dump fields with few distinct values, interned
+DUMP_INTERNED_FIELDS = ['sample', 'chr', 'pos', 'ref', 'alt', 'source']
+# Dump fields with long values shared by all samples carrying a variant
+DUMP_SHARED_FIELDS = ['features_seq', 'annotation']
 
-def get_files_in_s3(prefix, s3_bucket):
-    """
-    Get a list of files from the indels pipeline output of a run.
-    :param: prefix (str): path to run data, e.g.
-    input/201014_M03829_0366_000000000-JBV6Y
-    :param: s3_bucket (str): S3 bucket containing files to read,
-    e.g. 'cchauve-orchestration-ch', 'ch-testdata'
+# Sample types
+SAMPLE_TYPE_DNA = 'DNA'  # patient samples, name starting by DNA-
+SAMPLE_TYPE_CTRL = 'ctrl'  # control samples, name starting by NF/BLANK/QMRS
+SAMPLE_TYPE_MISC = 'misc'  # all other samples
+SAMPLE_TYPES = [SAMPLE_TYPE_DNA, SAMPLE_TYPE_CTRL, SAMPLE_TYPE_MISC]
+# Sample type from the start of the sample ID
+SAMPLE_TYPE_PATTERN = re.compile(r'(?P<DNA>dna-)|(?P<ctrl>nf|blank|qmrs)',
+                                 re.IGNORECASE)
+# Sample ID: <prefix>-<run tag>-<well>_S<number>, where prefix is
+# DNA-<patient ID> for patient samples and run tag starts by CG001
+SAMPLE_ID_PATTERN = re.compile(
+    r'(?P<prefix>.*?)-(?P<run_tag>CG001.*)-(?P<well>\d+)_S(?P<s_nb>\d+)',
+    re.IGNORECASE)
+# Parsed sample ID; fields other than sample_type are None if the sample ID
+# does not follow SAMPLE_ID_PATTERN
+SampleInfo = namedtuple(
+    'SampleInfo', ['sample_type', 'patient_id', 'run_tag', 'well', 's_nb'])
+# Maximum number of memoized sample ID
+SAMPLE_CACHE_SIZE = 65536
 
-    :return: list(str): file paths of files in directory prefix;
-    None if the directory is empty or does not exist
+
+@lru_cache(maxsize=SAMPLE_CACHE_SIZE)
+def get_sample_info(sample_id):
+    """
+    Classifies a sample as patient (DNA), control (ctrl) or other (misc)
+    sample and parses its ID
+    :param: sample_id (str): sample ID, e.g. DNA-17209-CG001Qv51Next002-11_S11
+    :return: SampleInfo: sample type, patient ID (patient samples only), run
+    tag, well number and sample number
     """
-    s3_client = boto3.client('s3')
-    s3_objects = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix=prefix)
-    if s3_objects['KeyCount'] == 0:
-        return None
+    type_match = SAMPLE_TYPE_PATTERN.match(sample_id)
+    if type_match is None:
+        sample_type = SAMPLE_TYPE_MISC
     else:
-        return [obj['Key'] for obj in s3_objects['Contents']]
+        sample_type = type_match.lastgroup
+    id_match = SAMPLE_ID_PATTERN.fullmatch(sample_id)
+    if id_match is None:
+        return SampleInfo(sample_type, None, None, None, None)
+    patient_id = None
+    if sample_type == SAMPLE_TYPE_DNA:
+        patient_id = id_match.group('prefix')[len('DNA-'):]
+    return SampleInfo(sample_type, patient_id, id_match.group('run_tag'),
+                      int(id_match.group('well')), int(id_match.group('s_nb')))
+
+
+def get_amplicons_coords(manifests=MANIFESTS):
+    """
+    :param: manifests (list(str)): list of manifests files to consider
+    :return: dict(str, (str, int)): amplicon ID -> chr, start for all amplicons
+    in all manifests
+    """
+    amplicons_coords = {}
+    for manifest_file in manifests:
+        manifest_path = os.path.join(MANIFESTS_DIR, manifest_file)
+        with open(manifest_path) as manifest:
+            manifest_reader = csv.DictReader(manifest, delimiter='\t')
+            for row in manifest_reader:
+                amplicons_coords[row['Amplicon_ID']] = (row['Chr'],
+                                                        int(row['Start']))
+    return amplicons_coords
 
 
 def init_dump_file(dump_file, header):
@@ -63,6 +164,39 @@ def init_dump_file(dump_file, header):
     out_dump.close()
 
 
+class DumpWriter:
+    """
+    Dump file of a run, opened once and written by batches of rows
+    """
+    def __init__(self, dump_file, header, buffer_size=DUMP_BUFFER_SIZE):
+        """
+        :param: dump_file (str): path to the dump file
+        :param: header (list(str)): dump header
+        :param: buffer_size (int): size of the write buffer
+        """
+        self.dump_file = dump_file
+        self.out_dump = open(dump_file, 'w', buffering=buffer_size)
+        self.out_dump.write(DUMP_FIELDS_SEP.join(header))
+
+    def write_rows(self, rows):
+        """
+        Writes a batch of rows, each preceded by a newline
+        :param: rows (list(list(str))): rows fields
+        """
+        if len(rows) > 0:
+            self.out_dump.write(''.join(f"\n{DUMP_FIELDS_SEP.join(row)}"
+                                        for row in rows))
+
+    def close(self):
+        self.out_dump.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 def get_vcf_dump_file(run_id, prefix, v_type, init=True):
     """
     Returns the path to a variant dump file for a run
@@ -122,29 +256,40 @@ def get_aggregated_alg_dump_file(file_name, prefix, init=True):
     return dump_file
 
 
-def read_input_log_file(log_file_path):
-    """
-    Reads an input log file to extract the run IDs and the sample IDs  list for
-    each run.
-    Writes a CSV file
-    :param: log_file_path (str): path to input log file
-    :return: dict(str,list(str)), list((str,str)):
-    dictionary, indexed by pairs (run_id, run_name), of sample lists
-    list (run_id, run_name) of unprocessed runs
-    """
-    log_file = open(log_file_path, 'r').readlines()
-    unprocessed_runs, sample_id_lists, run_names = [], {}, {}
-    for log in log_file:
-        log_split = log.rstrip().split('\t')
-        log_header = log_split[0].split(':')
-        log_type = log_header[0]
-        if log_type == RUN_ID:
-            (run_id, run_name) = log_header[1].split('.')
-            run_names[run_id] = run_name
-        elif log_type == WARNING and log_split[1] == ERROR_RUN_UNPROCESSED:
-            run_id = log_header[1]
-            unprocessed_runs.append((run_id, run_names[run_id]))
-        elif log_type == RUN_SAMPLES:
-            run_id = log_header[1]
-            sample_id_lists[(run_id, run_names[run_id])] = log_split[1].split()
-    return (sample_id_lists, unprocessed_runs)
+def read_dump_records(dump_file_path, record_type, shared_strings=None):
+    """
+    Reads a dump file into compact records
+    Fields of DUMP_INTERNED_FIELDS are interned and fields of
+    DUMP_SHARED_FIELDS are deduplicated through shared_strings, so that rows
+    of different samples carrying the same variant share a single copy
+    :param: dump_file_path (str): path to a VCF or alignments dump file,
+    gzip-compressed if it ends by .gz
+    :param: record_type (namedtuple): VCFDumpRecord or ALGDumpRecord
+    :param: shared_strings (dict(str, str)): pool of deduplicated strings,
+    can be shared between several dump files; if None a new one is used
+
+    :return: list(record_type): records of the dump file
+    """
+    if shared_strings is None:
+        shared_strings = {}
+    fields = record_type._fields
+    interned = [i for i, f in enumerate(fields) if f in DUMP_INTERNED_FIELDS]
+    shared = [i for i, f in enumerate(fields) if f in DUMP_SHARED_FIELDS]
+    records = []
+    if dump_file_path.endswith(DUMP_GZ_EXT):
+        dump_file = gzip.open(dump_file_path, 'rt', newline='')
+    else:
+        dump_file = open(dump_file_path)
+    with dump_file:
+        dump_reader = csv.reader(dump_file, delimiter=DUMP_FIELDS_SEP)
+        next(dump_reader, None)
+        for row in dump_reader:
+            if len(row) == 0:
+                continue
+            for i in interned:
+                row[i] = sys.intern(row[i])
+            for i in shared:
+                row[i] = shared_strings.setdefault(row[i], row[i])
+            records.append(record_type._make(row))
+    return records
+
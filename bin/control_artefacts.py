@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Annotation of the indels of patient samples with their occurrences in control
+samples (nf, blank, qmrs), to flag artefacts
+Each grouped patient indel is annotated with
+- the number and frequency of control samples carrying the same indel and its
+  mean VAF in these samples (hash join on chr, pos, ref, alt); the frequency
+  is relative to all control samples of the runs, read from the runs ledger,
+  including control samples without indels calls,
+- the number of control indels calls within window bases of its position
+  (binary search in the sorted positions of the control indels)
+"""
+
+# Standard imports
+import argparse
+import csv
+from collections import defaultdict
+
+# Local imports
+from aggregate_dump_files import (GROUPED_DUMP_HEADER, dump_data,
+                                  get_run_id_list)
+from common_utils import (DUMP_FIELDS_SEP, DUMP_VALUES_SEP, INDELS,
+                          SAMPLE_TYPE_CTRL, SAMPLE_TYPE_DNA,
+                          get_aggregated_vcf_dump_file, get_sample_info)
+from run_ledger import read_runs_samples
+
+# Header of annotated grouped indels dump files
+CTRL_ANNOTATION_HEADER = [
+    'ctrl_nb', 'ctrl_freq', 'ctrl_avg_vaf', 'ctrl_window_nb'
+]
+# File name prefix of annotated patient indels
+CTRL_ANNOTATED_PREFIX = f"{SAMPLE_TYPE_DNA}_grouped_samples_ctrl_annotated"
+# Default window around a patient indel to count control indels
+WINDOW = 5
+
+# Indexes of the fields of grouped indels rows
+GROUP_NB = GROUPED_DUMP_HEADER.index('nb')
+GROUP_CHR = GROUPED_DUMP_HEADER.index('chr')
+GROUP_POS = GROUPED_DUMP_HEADER.index('pos')
+GROUP_REF = GROUPED_DUMP_HEADER.index('ref')
+GROUP_ALT = GROUPED_DUMP_HEADER.index('alt')
+GROUP_AVG_VAF = GROUPED_DUMP_HEADER.index('avg_vaf')
+GROUP_SAMPLES = GROUPED_DUMP_HEADER.index('sample:vaf')
+
+
+def read_grouped_dump_file(dump_file):
+    """
+    :param: dump_file (str): path to a grouped indels dump file
+    :return: list(list(str)): grouped indels rows
+    """
+    with open(dump_file) as in_dump:
+        dump_reader = csv.reader(in_dump, delimiter=DUMP_FIELDS_SEP)
+        next(dump_reader, None)
+        return [row for row in dump_reader if len(row) > 0]
+
+
+def get_group_key(group):
+    return (group[GROUP_CHR], int(group[GROUP_POS]), group[GROUP_REF],
+            group[GROUP_ALT])
+
+
+def get_group_samples(group):
+    """
+    :return: list(str): samples of a grouped indel
+    """
+    return [
+        sample_vaf.rsplit(':', 1)[0]
+        for sample_vaf in group[GROUP_SAMPLES].split(DUMP_VALUES_SEP)
+    ]
+
+
+def count_ctrl_samples(runs_samples, run_id_list):
+    """
+    :param: runs_samples (dict(str, list(str))): run ID -> sample IDs, see
+    run_ledger.read_runs_samples
+    :param: run_id_list (list(str)): IDs of the runs whose samples are counted
+    :return: int: number of control samples of the runs
+    """
+    return sum(
+        get_sample_info(sample_id).sample_type == SAMPLE_TYPE_CTRL
+        for run_id in run_id_list
+        for sample_id in runs_samples.get(run_id, []))
+
+
+def annotate_control_artefacts(dna_groups,
+                               ctrl_groups,
+                               nb_ctrl_samples,
+                               window=WINDOW):
+    """
+    Annotates grouped patient indels with their occurrences in control samples
+    :param: dna_groups (list(list)): grouped patient indels rows
+    :param: ctrl_groups (list(list)): grouped control indels rows
+    :param: nb_ctrl_samples (int): number of control samples of the runs (see
+    count_ctrl_samples), at least the number of control samples with calls
+    :param: window (int): maximum distance to a patient indel of the control
+    indels counted in ctrl_window_nb
+    :return: list(list): rows of dna_groups followed by the fields of
+    CTRL_ANNOTATION_HEADER
+    """
+    import numpy as np
+
+    # Control samples of runs missing from the ledger are still counted
+    nb_ctrl_samples = max(
+        nb_ctrl_samples,
+        len({
+            sample
+            for group in ctrl_groups for sample in get_group_samples(group)
+        }))
+    # Hash table of the control indels
+    ctrl_index = {get_group_key(group): group for group in ctrl_groups}
+    # Sorted positions of the control indels of each chromosome and cumulated
+    # number of calls
+    ctrl_calls = defaultdict(list)
+    for group in ctrl_groups:
+        ctrl_calls[group[GROUP_CHR]].append(
+            (int(group[GROUP_POS]), int(group[GROUP_NB])))
+    ctrl_positions, ctrl_cumul_nb = {}, {}
+    for chrom, calls in ctrl_calls.items():
+        calls_array = np.array(sorted(calls), dtype=np.int64).reshape(-1, 2)
+        ctrl_positions[chrom] = calls_array[:, 0]
+        ctrl_cumul_nb[chrom] = np.concatenate(
+            ([0], np.cumsum(calls_array[:, 1])))
+    # Control calls in the window of each patient indel, by chromosome
+    dna_rows = defaultdict(list)
+    for i, group in enumerate(dna_groups):
+        dna_rows[group[GROUP_CHR]].append(i)
+    window_nb = np.zeros(len(dna_groups), dtype=np.int64)
+    for chrom, rows in dna_rows.items():
+        if chrom not in ctrl_positions:
+            continue
+        positions = np.array([int(dna_groups[i][GROUP_POS]) for i in rows],
+                             dtype=np.int64)
+        left = np.searchsorted(ctrl_positions[chrom],
+                               positions - window,
+                               side='left')
+        right = np.searchsorted(ctrl_positions[chrom],
+                                positions + window,
+                                side='right')
+        cumul_nb = ctrl_cumul_nb[chrom]
+        window_nb[rows] = cumul_nb[right] - cumul_nb[left]
+
+    annotated_groups = []
+    for i, group in enumerate(dna_groups):
+        ctrl_group = ctrl_index.get(get_group_key(group))
+        if ctrl_group is None:
+            ctrl_nb, ctrl_freq, ctrl_avg_vaf = 0, 0.0, 0.0
+        else:
+            ctrl_nb = int(ctrl_group[GROUP_NB])
+            ctrl_freq = round(ctrl_nb / nb_ctrl_samples, 4)
+            ctrl_avg_vaf = round(float(ctrl_group[GROUP_AVG_VAF]), 4)
+        annotated_groups.append(
+            list(group) + [ctrl_nb, ctrl_freq, ctrl_avg_vaf,
+                           int(window_nb[i])])
+    return annotated_groups
+
+
+def dump_control_artefacts(prefix,
+                           dna_groups,
+                           ctrl_groups,
+                           nb_ctrl_samples,
+                           window=WINDOW):
+    """
+    Writes the annotated patient indels in
+    <prefix>/DNA_grouped_samples_ctrl_annotated_indels_dump.tsv
+    :param: prefix (str): directory where the file is written
+    :param: dna_groups, ctrl_groups, nb_ctrl_samples, window: see
+    annotate_control_artefacts
+    :return: list(list): annotated patient indels rows
+    """
+    annotated_groups = annotate_control_artefacts(dna_groups, ctrl_groups,
+                                                  nb_ctrl_samples, window)
+    out_dump_file = get_aggregated_vcf_dump_file(CTRL_ANNOTATED_PREFIX,
+                                                 prefix,
+                                                 INDELS,
+                                                 init=False)
+    dump_data(out_dump_file, annotated_groups,
+              GROUPED_DUMP_HEADER + CTRL_ANNOTATION_HEADER)
+    return annotated_groups
+
+
+if __name__ == "__main__":
+    """
+    Reads the grouped indels of patient and control samples written by
+    aggregate_dump_files.py and writes the patient indels annotated with their
+    occurrences in control samples in
+    DNA_grouped_samples_ctrl_annotated_indels_dump.tsv, with columns
+    - ctrl_nb: number of control samples carrying the indel
+    - ctrl_freq: ctrl_nb / number of control samples of the runs of
+      output_dir, read from the input log files
+    - ctrl_avg_vaf: mean VAF of the indel in control samples
+    - ctrl_window_nb: number of control indels calls within window bases
+
+    Arguments:
+    - output_dir: directory where the grouped indels are read and written
+    - input_log_files: input log files of the runs of output_dir
+    - window (optional): window size in bases; default = 5
+    """
+    # Results directory
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    # Input log files
+    ARGS_INPUT_LOG_FILES = ['input_log_files', None, 'Input log files']
+    # Window size
+    ARGS_WINDOW = ['-w', '--window', 'Window size']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: control samples artefacts')
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_INPUT_LOG_FILES[0],
+                        type=str,
+                        nargs='+',
+                        help=ARGS_INPUT_LOG_FILES[2])
+    parser.add_argument(ARGS_WINDOW[0],
+                        ARGS_WINDOW[1],
+                        type=int,
+                        default=WINDOW,
+                        help=ARGS_WINDOW[2])
+    args = parser.parse_args()
+
+    groups = {
+        sample_type: read_grouped_dump_file(
+            get_aggregated_vcf_dump_file(f"{sample_type}_grouped_samples",
+                                         args.output_dir,
+                                         INDELS,
+                                         init=False))
+        for sample_type in [SAMPLE_TYPE_DNA, SAMPLE_TYPE_CTRL]
+    }
+    nb_ctrl_samples = count_ctrl_samples(
+        read_runs_samples(args.input_log_files),
+        get_run_id_list(args.output_dir))
+    annotated_groups = dump_control_artefacts(args.output_dir,
+                                              groups[SAMPLE_TYPE_DNA],
+                                              groups[SAMPLE_TYPE_CTRL],
+                                              nb_ctrl_samples, args.window)
+    nb_in_ctrl = sum(1 for group in annotated_groups if group[-4] > 0)
+    print(f"INFO\tpatient indels:\t{len(annotated_groups)}")
+    print(f"INFO\tpatient indels in control samples:\t{nb_in_ctrl}")
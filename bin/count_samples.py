@@ -5,15 +5,38 @@ Count number of samples of different types
 
 # Standard imports
 import argparse
+from collections import Counter
 
 # Local imports
-from common_utils import RUN_SAMPLES
+from common_utils import (SAMPLE_TYPE_CTRL, SAMPLE_TYPE_DNA, SAMPLE_TYPE_MISC,
+                          get_sample_info)
+from run_ledger import get_run_samples, read_ledger
 
 # Default S3 directory containing results
 CCHAUVE_S3_OUTPUT = 'cchauve-orchestration-ch'
 # AWS cp command
 AWS_CP = ['aws', 's3', 'cp']
 
+
+def count_samples(sample_id_lists):
+    """
+    :param: sample_id_lists (dict((str, str), list(str))): sample IDs indexed
+    by (run ID, run name)
+    :return: Counter: number of samples of each sample type
+    """
+    samples_nb = Counter()
+    for sample_id_list in sample_id_lists.values():
+        for sample_id in sample_id_list:
+            samples_nb[get_sample_info(sample_id).sample_type] += 1
+    return samples_nb
+
+
+def print_samples_counts(samples_nb):
+    print(f"INFO\tpatient samples:\t{samples_nb[SAMPLE_TYPE_DNA]}")
+    print(f"INFO\tcontrol samples:\t{samples_nb[SAMPLE_TYPE_CTRL]}")
+    print(f"INFO\tmisc. samples:\t{samples_nb[SAMPLE_TYPE_MISC]}")
+
+
 if __name__ == "__main__":
     """
     Arguments:
@@ -26,25 +49,5 @@ if __name__ == "__main__":
     parser.add_argument(ARGS_RUNS_FILE[0], type=str, help=ARGS_RUNS_FILE[2])
     args = parser.parse_args()
 
-    log_file = open(args.input_log_file, 'r').readlines()
-    DNA_samples_nb, ctrl_samples_nb, misc_samples_nb = 0, 0, 0
-    for log in log_file:
-        log_split = log.rstrip().split('\t')
-        log_header = log_split[0].split(':')
-        log_type = log_header[0]
-        if log_type == RUN_SAMPLES:
-            samples_id_list = log_split[1].split()
-            for sample_id in samples_id_list:
-                test_dna = sample_id.lower().startswith('dna-')
-                test_blank = sample_id.lower().startswith('blank')
-                test_nf = sample_id.lower().startswith('nf')
-                test_qmrs = sample_id.lower().startswith('qmrs')
-                if test_dna:
-                    DNA_samples_nb += 1
-                elif test_blank or test_nf or test_qmrs:
-                    ctrl_samples_nb += 1
-                else:
-                    misc_samples_nb += 1
-    print(f"INFO\tpatient samples:\t{DNA_samples_nb}")
-    print(f"INFO\tcontrol samples:\t{ctrl_samples_nb}")
-    print(f"INFO\tmisc. samples:\t{misc_samples_nb}")
+    sample_id_lists = get_run_samples(read_ledger(args.input_log_file))
+    print_samples_counts(count_samples(sample_id_lists))
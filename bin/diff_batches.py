@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Differences between the indels calls of two batches of runs, e.g. the
+results of two branches of the indels pipeline on the same runs
+The aggregated dump files <sample_type>_samples_indels_dump.tsv of both
+batches are sorted by chromosome, position, ref, alt and sample (see
+aggregate_dump_files.sort_data); they are read in a single merge pass on the
+key (chr, pos, ref, alt, sample), in linear time and keeping in memory only
+the current calls and the counts of each amplicon.
+"""
+
+# Standard imports
+import argparse
+import csv
+import gzip
+import os
+from itertools import groupby
+from operator import itemgetter
+
+# Local imports
+from aggregate_dump_files import sample_sort_key, sort_chr
+from common_utils import (DUMP_FIELDS_SEP, DUMP_GZ_EXT, DUMP_VALUES_SEP,
+                          INDELS, INFO, SAMPLE_TYPE_DNA, SAMPLE_TYPES,
+                          DumpWriter, get_aggregated_vcf_dump_file)
+
+# Status of a call in the differences file
+DIFF_ADDED = 'added'
+DIFF_REMOVED = 'removed'
+DIFF_VAF_CHANGED = 'vaf_changed'
+DIFF_UNCHANGED = 'unchanged'
+DIFF_STATUS = [DIFF_ADDED, DIFF_REMOVED, DIFF_VAF_CHANGED, DIFF_UNCHANGED]
+# Header of the differences file; fields of the first (second) batch end by
+# _1 (_2) and are empty for calls added (removed)
+DIFF_HEADER = [
+    'status', 'sample', 'chr', 'pos', 'ref', 'alt', 'VAF_1', 'VAF_2',
+    'source_1', 'source_2'
+]
+# Header of the amplicons summary file
+SUMMARY_HEADER = ['amplicon'] + DIFF_STATUS
+# Default maximum VAF difference of an unchanged call
+VAF_TOLERANCE = 0.0
+# Fields of the dump files read for each call
+CALL_FIELDS = ['sample', 'chr', 'pos', 'ref', 'alt', 'VAF', 'source']
+CALL_VAF = CALL_FIELDS.index('VAF')
+CALL_SOURCE = CALL_FIELDS.index('source')
+
+
+def get_batch_dump_file(path, sample_type=SAMPLE_TYPE_DNA):
+    """
+    :param: path (str): path to an aggregated dump file or to a directory
+    containing the results of a batch
+    :param: sample_type (str): sample type of the dump file of a directory
+    :return: str: path to the aggregated indels dump file
+    """
+    if os.path.isdir(path):
+        return get_aggregated_vcf_dump_file(f"{sample_type}_samples", path,
+                                            INDELS, init=False)
+    return path
+
+
+def read_sorted_calls(dump_file_path):
+    """
+    Reads the calls of an aggregated dump file, checking they are sorted
+    :param: dump_file_path (str): path to the dump file, gzip-compressed if
+    it ends by .gz
+    :return: generator((tuple, tuple(str))): merge key and CALL_FIELDS
+    fields of each call
+    :raise: ValueError if the calls are not sorted
+    """
+    if dump_file_path.endswith(DUMP_GZ_EXT):
+        dump_file = gzip.open(dump_file_path, 'rt', newline='')
+    else:
+        dump_file = open(dump_file_path)
+    with dump_file:
+        dump_reader = csv.reader(dump_file, delimiter=DUMP_FIELDS_SEP)
+        header = next(dump_reader, None)
+        if header is None:
+            return
+        get_call = itemgetter(*[header.index(field) for field in CALL_FIELDS])
+        chr_keys = {}
+        last_key = None
+        for row in dump_reader:
+            if len(row) == 0:
+                continue
+            call = get_call(row)
+            sample, chrom, pos, ref, alt = call[:5]
+            chr_key = chr_keys.get(chrom)
+            if chr_key is None:
+                chr_key = chr_keys.setdefault(chrom, sort_chr(chrom))
+            key = (chr_key, int(pos), ref, alt, sample_sort_key(sample))
+            if last_key is not None and key < last_key:
+                raise ValueError(f"{dump_file_path}: line "
+                                 f"{dump_reader.line_num}: calls not sorted")
+            last_key = key
+            yield key, call
+
+
+def merge_calls(calls_1, calls_2):
+    """
+    Merges two sorted calls streams
+    :param: calls_1, calls_2 (generator): see read_sorted_calls
+    :return: generator((tuple, tuple)): pairs of calls with the same key, None
+    for the missing call of a key present in a single stream; calls of a key
+    present several times in a stream are paired in order
+    """
+    groups_1 = groupby(calls_1, key=lambda x: x[0])
+    groups_2 = groupby(calls_2, key=lambda x: x[0])
+    group_1, group_2 = next(groups_1, None), next(groups_2, None)
+    while group_1 is not None or group_2 is not None:
+        if group_2 is None or (group_1 is not None
+                               and group_1[0] < group_2[0]):
+            for _, call_1 in group_1[1]:
+                yield call_1, None
+            group_1 = next(groups_1, None)
+        elif group_1 is None or group_2[0] < group_1[0]:
+            for _, call_2 in group_2[1]:
+                yield None, call_2
+            group_2 = next(groups_2, None)
+        else:
+            calls_1 = [call for _, call in group_1[1]]
+            calls_2 = [call for _, call in group_2[1]]
+            for i in range(max(len(calls_1), len(calls_2))):
+                yield (calls_1[i] if i < len(calls_1) else None,
+                       calls_2[i] if i < len(calls_2) else None)
+            group_1, group_2 = next(groups_1, None), next(groups_2, None)
+
+
+def get_diff_status(call_1, call_2, vaf_tolerance=VAF_TOLERANCE):
+    """
+    :param: call_1, call_2 (tuple): calls of the same key (CALL_FIELDS), or
+    None
+    :param: vaf_tolerance (float): maximum VAF difference of an unchanged call
+    :return: str: status of the call (DIFF_STATUS)
+    """
+    if call_1 is None:
+        return DIFF_ADDED
+    if call_2 is None:
+        return DIFF_REMOVED
+    if abs(float(call_1[CALL_VAF]) - float(call_2[CALL_VAF])) > vaf_tolerance:
+        return DIFF_VAF_CHANGED
+    return DIFF_UNCHANGED
+
+
+def get_diff_row(status, call_1, call_2):
+    """
+    :param: status (str): status of the call
+    :param: call_1, call_2 (tuple): calls of the same key, or None
+    :return: list(str): row of the differences file (DIFF_HEADER)
+    """
+    call = call_1 if call_1 is not None else call_2
+    row = [status] + list(call[:5])
+    for field in [CALL_VAF, CALL_SOURCE]:
+        row += [
+            call_i[field] if call_i is not None else ''
+            for call_i in [call_1, call_2]
+        ]
+    return row
+
+
+def diff_dump_files(dump_file_1,
+                    dump_file_2,
+                    diff_file_path,
+                    vaf_tolerance=VAF_TOLERANCE):
+    """
+    Writes the calls added, removed and whose VAF changed between two sorted
+    aggregated dump files (DIFF_HEADER)
+    :param: dump_file_1, dump_file_2 (str): paths to the dump files
+    :param: diff_file_path (str): path to the differences file
+    :param: vaf_tolerance (float): see get_diff_status
+    :return: (dict(str, int), dict(str, dict(str, int))): number of calls of
+    each status, and for each amplicon number of calls of each status whose
+    source in one of the batches contains the amplicon
+    """
+    nb_calls = dict.fromkeys(DIFF_STATUS, 0)
+    amplicons_nb_calls = {}
+    with DumpWriter(diff_file_path, DIFF_HEADER) as out_diff:
+        for call_1, call_2 in merge_calls(read_sorted_calls(dump_file_1),
+                                          read_sorted_calls(dump_file_2)):
+            status = get_diff_status(call_1, call_2, vaf_tolerance)
+            nb_calls[status] += 1
+            amplicons = set()
+            for call in [call_1, call_2]:
+                if call is not None:
+                    amplicons.update(call[CALL_SOURCE].split(DUMP_VALUES_SEP))
+            for amplicon in amplicons:
+                amplicon_nb_calls = amplicons_nb_calls.setdefault(
+                    amplicon, dict.fromkeys(DIFF_STATUS, 0))
+                amplicon_nb_calls[status] += 1
+            if status != DIFF_UNCHANGED:
+                out_diff.write_rows([get_diff_row(status, call_1, call_2)])
+    return nb_calls, amplicons_nb_calls
+
+
+def write_amplicons_summary(summary_file_path, amplicons_nb_calls):
+    """
+    :param: summary_file_path (str): path to the summary file
+    :param: amplicons_nb_calls (dict): see diff_dump_files
+    """
+    with DumpWriter(summary_file_path, SUMMARY_HEADER) as out_summary:
+        out_summary.write_rows([
+            [amplicon] + [str(nb_calls[status]) for status in DIFF_STATUS]
+            for amplicon, nb_calls in sorted(amplicons_nb_calls.items())
+        ])
+
+
+if __name__ == "__main__":
+    """
+    Compares the aggregated indels dump files of two batches of runs and
+    writes the calls added in the second batch, removed from it and whose
+    VAF changed, with columns status (added, removed or vaf_changed), sample,
+    chr, pos, ref, alt, VAF_1, VAF_2, source_1 and source_2 (fields of the
+    call in each batch, empty if it is absent)
+
+    Arguments:
+    - batch_1, batch_2: aggregated dump files, or directories containing the
+      results of the batches (e.g. results/BOVERI-555_v4)
+    - output_file: path to the differences file
+    - sample_type (optional): sample type of the dump files of directories;
+      default = DNA
+    - summary_file (optional): path to the amplicons summary file, with
+      columns amplicon, added, removed, vaf_changed and unchanged
+    - vaf_tolerance (optional): maximum VAF difference of an unchanged call;
+      default = 0.0
+    """
+    ARGS_BATCH_1 = ['batch_1', None, 'First batch dump file or directory']
+    ARGS_BATCH_2 = ['batch_2', None, 'Second batch dump file or directory']
+    ARGS_OUTPUT_FILE = ['output_file', None, 'Differences file']
+    ARGS_SAMPLE_TYPE = ['-t', '--sample_type', 'Sample type']
+    ARGS_SUMMARY_FILE = ['-s', '--summary_file', 'Amplicons summary file']
+    ARGS_VAF_TOLERANCE = ['-v', '--vaf_tolerance', 'VAF tolerance']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: differences between two batches')
+    parser.add_argument(ARGS_BATCH_1[0], type=str, help=ARGS_BATCH_1[2])
+    parser.add_argument(ARGS_BATCH_2[0], type=str, help=ARGS_BATCH_2[2])
+    parser.add_argument(ARGS_OUTPUT_FILE[0],
+                        type=str,
+                        help=ARGS_OUTPUT_FILE[2])
+    parser.add_argument(ARGS_SAMPLE_TYPE[0],
+                        ARGS_SAMPLE_TYPE[1],
+                        type=str,
+                        choices=SAMPLE_TYPES,
+                        default=SAMPLE_TYPE_DNA,
+                        help=ARGS_SAMPLE_TYPE[2])
+    parser.add_argument(ARGS_SUMMARY_FILE[0],
+                        ARGS_SUMMARY_FILE[1],
+                        type=str,
+                        help=ARGS_SUMMARY_FILE[2])
+    parser.add_argument(ARGS_VAF_TOLERANCE[0],
+                        ARGS_VAF_TOLERANCE[1],
+                        type=float,
+                        default=VAF_TOLERANCE,
+                        help=ARGS_VAF_TOLERANCE[2])
+    args = parser.parse_args()
+
+    nb_calls, amplicons_nb_calls = diff_dump_files(
+        get_batch_dump_file(args.batch_1, args.sample_type),
+        get_batch_dump_file(args.batch_2, args.sample_type), args.output_file,
+        args.vaf_tolerance)
+    if args.summary_file is not None:
+        write_amplicons_summary(args.summary_file, amplicons_nb_calls)
+    for status in DIFF_STATUS:
+        print(f"{INFO}\t{status} calls:\t{nb_calls[status]}")
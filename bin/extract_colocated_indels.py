@@ -4,29 +4,11 @@ Script to extract runs of co-located indels in  a set of runs results
 """
 
 import argparse
-import csv
 import os
 from collections import defaultdict
 
-from common_utils import INFO
-
-
-def read_output_log_file(log_file_path):
-    """
-    Reads an output log file to extract the run ID for runs that went OK.
-    :param: log_file_path (str): path to output log file
-    :return: list(str): lst of run IDs
-    """
-    log_file = open(log_file_path, 'r').readlines()
-    run_id_list = []
-    for log in log_file:
-        log_split = log.rstrip().split('\t')
-        log_header = log_split[0].split(':')
-        log_type = log_header[0]
-        if log_type == INFO:
-            run_id = log_header[1]
-            run_id_list.append(run_id)
-    return run_id_list
+from common_utils import VCFDumpRecord, read_dump_records
+from run_ledger import read_output_log_file
 
 
 def read_dump_file(dump_file_path, gap_len):
@@ -41,13 +23,25 @@ def read_dump_file(dump_file_path, gap_len):
     :return: dict(str, list(str)): dictionary indexed by sample_id to a list of
     str, each representing a group of co-located indels
     """
+    return get_colocated_indels(
+        read_dump_records(dump_file_path, VCFDumpRecord), gap_len)
+
+
+def get_colocated_indels(records, gap_len):
+    """
+    Returns a list of groups of co-located indels where any two consecutive
+    indel in a group are separated by at most gap_len bases.
+    :param: records (iterable(VCFDumpRecord)): indels calls of a run
+    :param: gap_len (int): maximum number of bases between consecutive indels
+    in a group
+
+    :return: dict(str, list(str)): see read_dump_file
+    """
     indels_data = defaultdict(list)
     colocated_indels = {}
-    with open(dump_file_path) as dump_file:
-        indels_reader = csv.DictReader(dump_file, delimiter='\t')
-        for row in indels_reader:
-            indel = (row['chr'], int(row['pos']), row['ref'], row['alt'])
-            indels_data[row['sample']].append(indel)
+    for row in records:
+        indel = (row.chr, int(row.pos), row.ref, row.alt)
+        indels_data[row.sample].append(indel)
     for sample_id, sample_indels in indels_data.items():
         sample_indels.sort(key=lambda x: (x[0], x[1]))
         prev_chr, prev_pos, current_list, colocated_indels_list = '', 0, [], []
@@ -68,6 +62,50 @@ def read_dump_file(dump_file_path, gap_len):
     return colocated_indels
 
 
+def write_colocated_indels(output_file_path, runs_colocated_indels):
+    """
+    Writes the groups of co-located indels of a set of runs and the samples
+    where each group was detected
+    :param: output_file_path (str): path to the output file
+    :param: runs_colocated_indels (dict(str, dict(str, list(str)))): groups of
+    co-located indels of each sample (see read_dump_file) indexed by run ID
+    """
+    indel_groups_to_sample = defaultdict(list)
+    nb_runs, nb_samples, nb_group_occurrences, samples_with_group = 0, 0, 0, []
+    for run_id, colocated_indels in runs_colocated_indels.items():
+        nb_runs += 1
+        for sample_id, indel_groups_list in colocated_indels.items():
+            nb_samples += 1
+            if len(indel_groups_list) > 0:
+                for indel_group in indel_groups_list:
+                    indel_groups_to_sample[indel_group].append(
+                        f"{run_id}.{sample_id}")
+                    nb_group_occurrences += 1
+                    if (run_id, sample_id) not in samples_with_group:
+                        samples_with_group.append((run_id, sample_id))
+    indel_groups_list = list(indel_groups_to_sample.keys())
+    indel_groups_list.sort()
+    output_file = open(output_file_path, 'w')
+    output_file.write(
+        f"#nb_runs:<{nb_runs}>\tnb_samples_with_indels:<{nb_samples}>\n")
+    output_file.write(f"#nb_indel_groups:<{len(indel_groups_list)}>\n")
+    output_file.write(
+        f"#nb_indels_group_occurrences:<{nb_group_occurrences}>\n")
+    output_file.write(
+        f"#nb_samples_with_indels_group:<{len(samples_with_group)}>\n")
+    output_file.write('#colocated_indels_group\tnumber_of_occuring_samples\n')
+    output_file.write('#list_of_(run_id.sample_id)')
+    indel_group_id = 1
+    for indel_group in indel_groups_list:
+        sample_id_list = indel_groups_to_sample[indel_group]
+        line_1 = f"\n>{indel_group_id}\t{len(sample_id_list):5}\t{indel_group}"
+        line_2 = f"\n{' '.join(sample_id_list)}"
+        output_file.write(line_1)
+        output_file.write(line_2)
+        indel_group_id += 1
+    output_file.close()
+
+
 if __name__ == "__main__":
     """
     Reads the output log file for a set of runs, reads the dump file for each
@@ -107,39 +145,10 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     run_id_list = read_output_log_file(args.output_log_file)
-    indel_groups_to_sample = defaultdict(list)
-    nb_runs, nb_samples, nb_group_occurrences, samples_with_group = 0, 0, 0, []
+    runs_colocated_indels = {}
     for run_id in run_id_list:
-        nb_runs += 1
         dump_file_name = f"{run_id}_indels_dump.tsv"
         dump_file_path = os.path.join(args.output_dir, run_id, dump_file_name)
-        colocated_indels = read_dump_file(dump_file_path, args.gap_len)
-        for sample_id, indel_groups_list in colocated_indels.items():
-            nb_samples += 1
-            if len(indel_groups_list) > 0:
-                for indel_group in indel_groups_list:
-                    indel_groups_to_sample[indel_group].append(
-                        f"{run_id}.{sample_id}")
-                    nb_group_occurrences += 1
-                    if (run_id, sample_id) not in samples_with_group:
-                        samples_with_group.append((run_id, sample_id))
-    indel_groups_list = list(indel_groups_to_sample.keys())
-    indel_groups_list.sort()
-    output_file = open(args.output_file, 'w')
-    output_file.write(
-        f"#nb_runs:<{nb_runs}>\tnb_samples_with_indels:<{nb_samples}>\n")
-    output_file.write(f"#nb_indel_groups:<{len(indel_groups_list)}>\n")
-    output_file.write(
-        f"#nb_indels_group_occurrences:<{nb_group_occurrences}>\n")
-    output_file.write(
-        f"#nb_samples_with_indels_group:<{len(samples_with_group)}>\n")
-    output_file.write('#colocated_indels_group\tnumber_of_occuring_samples\n')
-    output_file.write('#list_of_(run_id.sample_id)')
-    indel_group_id = 1
-    for indel_group in indel_groups_list:
-        sample_id_list = indel_groups_to_sample[indel_group]
-        line_1 = f"\n>{indel_group_id}\t{len(sample_id_list):5}\t{indel_group}"
-        line_2 = f"\n{' '.join(sample_id_list)}"
-        output_file.write(line_1)
-        output_file.write(line_2)
-        indel_group_id += 1
+        runs_colocated_indels[run_id] = read_dump_file(dump_file_path,
+                                                       args.gap_len)
+    write_colocated_indels(args.output_file, runs_colocated_indels)
@@ -0,0 +1,663 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the analysis of a set of runs of the indels pipeline
+Each script of bin is a subcommand; the pipeline subcommand chains the
+analysis of the runs outputs, the aggregation of the dump files, the
+detection of co-located indels and the samples count in a single process,
+sharing the amplicons coordinates, the samples of the runs and the dump files
+rows between stages
+"""
+
+# Standard imports
+import argparse
+import os
+
+# Local imports
+from aggregate_dump_files import (aggregate_runs_dumps, get_run_id_list,
+                                  new_shards, read_runs_dumps)
+from alignment_arrays import (MAX_MISMATCHES, load_runs_alg_arrays,
+                              update_runs_alg_arrays, write_reads_support)
+from analysis_utils import CCHAUVE_S3_OUTPUT, analyze_runs
+from artefact_store import ArtefactStore, annotate_run
+from annotation_catalog import encode_runs_dumps
+from colocated_clusters import (MIN_INDELS, MIN_SAMPLES,
+                                get_colocated_clusters, read_batches_indels,
+                                write_colocated_clusters)
+from common_utils import (INDELS, INFO, SAMPLE_TYPE_CTRL, SAMPLE_TYPE_DNA,
+                          SAMPLE_TYPES, SNPS, get_aggregated_vcf_dump_file,
+                          get_amplicons_coords, get_vcf_dump_file)
+from control_artefacts import (WINDOW, count_ctrl_samples,
+                               dump_control_artefacts, read_grouped_dump_file)
+from count_samples import count_samples, print_samples_counts
+from diff_batches import (VAF_TOLERANCE, diff_dump_files, get_batch_dump_file,
+                          write_amplicons_summary)
+from extract_colocated_indels import (get_colocated_indels, read_dump_file,
+                                      write_colocated_indels)
+from nextflow_traces import (TRACE_PATH, TRACE_READ_THREADS,
+                             read_runs_traces, write_traces_reports)
+from resubmit_runs import (MAX_WORKERS, NB_ROUNDS, POLL_DELAY,
+                           resubmit_runs)
+from run_ledger import (get_run_samples, read_input_log_file, read_ledger,
+                        read_output_log_file, read_runs_samples)
+from run_utils import (AWS_DEF, AWS_QUEUE, FASTQ_CHECK_THREADS, JOB_CAPACITY,
+                       OUTPUT_PROBE_THREADS, submit_runs)
+
+# Default gap length for co-located indels
+GAP_LEN = 5
+
+
+def cmd_submit(args):
+    submit_runs(args.runs_csv_file, args.s3_input, args.branch,
+                args.s3_output, args.aws_def, args.aws_queue,
+                args.deep_check, args.nb_threads, args.job_capacity,
+                args.skip_done, args.nb_probes)
+
+
+def get_v_types(args):
+    return (INDELS, SNPS) if args.snps else (INDELS, )
+
+
+def get_artefact_store(args):
+    if args.artefact_store is None:
+        return None
+    return ArtefactStore(args.artefact_store)
+
+
+def cmd_analyze(args):
+    analyze_runs(args.input_log_file,
+                 args.output_dir,
+                 args.s3_bucket,
+                 v_types=get_v_types(args),
+                 artefact_store=get_artefact_store(args),
+                 index_v_graphs=args.index_variants_graphs)
+
+
+def cmd_resubmit(args):
+    resubmit_runs(args.runs_csv_file, args.s3_input, args.branch,
+                  args.output_dir, args.s3_output, args.aws_def,
+                  args.aws_queue, args.s3_bucket, args.nb_rounds,
+                  args.nb_workers, args.poll_delay, get_v_types(args),
+                  args.job_capacity)
+
+
+def cmd_aggregate(args):
+    run_id_list = get_run_id_list(args.output_dir)
+    shards = new_shards() if args.nb_processes > 1 else None
+    aggregate_runs_dumps(read_runs_dumps(run_id_list, args.output_dir, shards),
+                         args.output_dir, shards, args.nb_processes)
+
+
+def cmd_catalog(args):
+    catalog = encode_runs_dumps(get_run_id_list(args.output_dir),
+                                args.output_dir, get_v_types(args))
+    print(f"{INFO}\tannotations:\t{len(catalog)}")
+
+
+def cmd_artefacts(args):
+    groups = [
+        read_grouped_dump_file(
+            get_aggregated_vcf_dump_file(f"{sample_type}_grouped_samples",
+                                         args.output_dir,
+                                         INDELS,
+                                         init=False))
+        for sample_type in [SAMPLE_TYPE_DNA, SAMPLE_TYPE_CTRL]
+    ]
+    nb_ctrl_samples = count_ctrl_samples(
+        read_runs_samples(args.input_log_files),
+        get_run_id_list(args.output_dir))
+    dump_control_artefacts(args.output_dir, groups[0], groups[1],
+                           nb_ctrl_samples, args.window)
+
+
+def cmd_colocated(args):
+    runs_colocated_indels = {
+        run_id: read_dump_file(
+            get_vcf_dump_file(run_id, args.output_dir, INDELS, init=False),
+            args.gap_len)
+        for run_id in read_output_log_file(args.output_log_file)
+    }
+    write_colocated_indels(args.output_file, runs_colocated_indels)
+
+
+def cmd_clusters(args):
+    clusters = get_colocated_clusters(read_batches_indels(args.output_dirs),
+                                      args.gap_len, args.min_indels,
+                                      args.min_samples)
+    write_colocated_clusters(args.output_file, clusters)
+
+
+def cmd_support(args):
+    arrays = load_runs_alg_arrays(update_runs_alg_arrays(args.output_dirs))
+    write_reads_support(args.output_file, arrays, args.max_mismatches)
+
+
+def cmd_diff(args):
+    _, amplicons_nb_calls = diff_dump_files(
+        get_batch_dump_file(args.batch_1, args.sample_type),
+        get_batch_dump_file(args.batch_2, args.sample_type), args.output_file,
+        args.vaf_tolerance)
+    if args.summary_file is not None:
+        write_amplicons_summary(args.summary_file, amplicons_nb_calls)
+
+
+def cmd_store(args):
+    os.makedirs(args.store_dir, exist_ok=True)
+    store = ArtefactStore(args.store_dir)
+    if len(args.batch_dirs) > 0:
+        runs_samples = read_runs_samples(args.input_log_files)
+        for batch_dir in args.batch_dirs:
+            store.ingest_batch(batch_dir, runs_samples)
+        store.save()
+    for annotate_dir in args.annotate_dirs:
+        for run_id in get_run_id_list(annotate_dir):
+            annotate_run(store, run_id, annotate_dir)
+
+
+def cmd_traces(args):
+    tasks, _ = read_runs_traces(args.input_log_file, args.trace_path,
+                                args.nb_threads)
+    write_traces_reports(args.output_prefix, tasks)
+
+
+def cmd_count(args):
+    sample_id_lists = get_run_samples(read_ledger(args.input_log_file))
+    print_samples_counts(count_samples(sample_id_lists))
+
+
+def run_pipeline(input_log_file_path,
+                 output_dir,
+                 colocated_file_path,
+                 s3_bucket=CCHAUVE_S3_OUTPUT,
+                 gap_len=GAP_LEN,
+                 v_types=(INDELS, ),
+                 window=WINDOW,
+                 nb_processes=1,
+                 catalog=False):
+    """
+    Analyzes a set of runs end to end: outputs analysis, aggregation of the
+    dump files, control samples artefacts, co-located indels and samples
+    count
+    The input log file and the manifests are read once, the dump files of the
+    runs are read once and shared by the aggregation and the detection of
+    co-located indels; the grouped indels are annotated with control samples
+    artefacts without being read again.
+    :param: input_log_file_path (str): path to the input log file of the runs
+    :param: output_dir (str): directory where the results are written
+    :param: colocated_file_path (str): path to the co-located indels file
+    :param: s3_bucket (str): bucket where to fetch the pipeline output files
+    :param: gap_len (int): gap length for co-located indels
+    :param: v_types (list(str)): types of variants calls to dump, among
+    INDELS and SNPS
+    :param: window (int): window size for control samples artefacts
+    :param: nb_processes (int): number of processes of the aggregation, see
+    aggregate_dump_files.aggregate_runs_dumps
+    :param: catalog (bool): if True, the annotations of the VCF dump files are
+    replaced by their ID in the annotation catalog before the aggregation
+    """
+    amplicons_coords = get_amplicons_coords()
+    sample_id_lists, unprocessed_runs = read_input_log_file(
+        input_log_file_path)
+    print(f"{INFO}\tanalysis:\t{len(sample_id_lists)} runs")
+    ok_run_id_list = analyze_runs(input_log_file_path,
+                                  output_dir,
+                                  s3_bucket,
+                                  amplicons_coords=amplicons_coords,
+                                  sample_id_lists=sample_id_lists,
+                                  unprocessed_runs=unprocessed_runs,
+                                  v_types=v_types)
+    run_id_list = get_run_id_list(output_dir)
+    if catalog:
+        annotation_catalog = encode_runs_dumps(run_id_list, output_dir,
+                                               v_types)
+        print(f"{INFO}\tannotations:\t{len(annotation_catalog)}")
+    print(f"{INFO}\taggregation:\t{len(ok_run_id_list)} successful runs")
+    shards = new_shards() if nb_processes > 1 else None
+    runs_dumps = read_runs_dumps(run_id_list, output_dir, shards)
+    grouped_indels = aggregate_runs_dumps(runs_dumps, output_dir, shards,
+                                          nb_processes)
+    print(f"{INFO}\tcontrol samples artefacts:\twindow {window}")
+    runs_samples = {
+        run_id: sample_id_list
+        for (run_id, _), sample_id_list in sample_id_lists.items()
+    }
+    dump_control_artefacts(output_dir, grouped_indels[SAMPLE_TYPE_DNA],
+                           grouped_indels[SAMPLE_TYPE_CTRL],
+                           count_ctrl_samples(runs_samples, run_id_list),
+                           window)
+    print(f"{INFO}\tco-located indels:\t{colocated_file_path}")
+    runs_colocated_indels = {
+        run_id: get_colocated_indels(runs_dumps[run_id][0], gap_len)
+        for run_id in ok_run_id_list
+    }
+    write_colocated_indels(colocated_file_path, runs_colocated_indels)
+    print_samples_counts(count_samples(sample_id_lists))
+
+
+def cmd_pipeline(args):
+    run_pipeline(args.input_log_file, args.output_dir, args.colocated_file,
+                 args.s3_bucket, args.gap_len, get_v_types(args),
+                 args.window, args.nb_processes, args.catalog)
+
+
+if __name__ == "__main__":
+    """
+    Subcommands:
+    - submit: see run_utils.py
+    - analyze: see analysis_utils.py
+    - resubmit: see resubmit_runs.py
+    - aggregate: see aggregate_dump_files.py
+    - catalog: see annotation_catalog.py (encoding of the dump files)
+    - artefacts: see control_artefacts.py
+    - colocated: see extract_colocated_indels.py
+    - clusters: see colocated_clusters.py
+    - support: see alignment_arrays.py (reads support file)
+    - diff: see diff_batches.py
+    - store: see artefact_store.py
+    - traces: see nextflow_traces.py
+    - count: see count_samples.py
+    - pipeline: analyze, aggregate, artefacts, colocated and count for the
+      runs of an input log file
+      Arguments: input_log_file, output_dir, colocated_file (co-located indels
+      output file), s3_bucket (optional), gap_len (optional), snps
+      (optional, SNPs calls are also dumped), window (optional),
+      nb_processes (optional, aggregation processes), catalog (optional,
+      annotations of the dump files replaced by annotation IDs)
+    """
+    ARGS_RUNS_CSV_FILE = ['runs_csv_file', None, 'Runs CSV file']
+    ARGS_INPUT_BUCKET = ['s3_input', None, 'Input S3 bucket directory']
+    ARGS_BRANCH = ['branch', None, 'indels-pipeline branch']
+    ARGS_OUTPUT_BUCKET = ['-o', '--s3_output', 'output S3 bucket directory']
+    ARGS_AWS_DEF = ['-d', '--aws_def', 'AWS definition']
+    ARGS_AWS_QUEUE = ['-q', '--aws_queue', 'AWS queue']
+    ARGS_INPUT_LOG_FILE = ['input_log_file', None, 'Input log file']
+    ARGS_OUTPUT_LOG_FILE = ['output_log_file', None, 'Output log file']
+    ARGS_INPUT_LOG_FILES = ['input_log_files', None, 'Input log files']
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    ARGS_S3_BUCKET = ['-s3', '--s3_bucket', 'S3 bucket containing the results']
+    ARGS_OUTPUT_FILE = ['output_file', None, 'Co-located indels file']
+    ARGS_COLOCATED_FILE = ['colocated_file', None, 'Co-located indels file']
+    ARGS_GAP_LEN = ['-g', '--gap_len', 'Gap length']
+    ARGS_OUTPUT_DIRS = ['output_dirs', None, 'Batches output directories']
+    ARGS_MIN_INDELS = ['-i', '--min_indels', 'Minimum number of indels']
+    ARGS_MIN_SAMPLES = ['-s', '--min_samples', 'Minimum number of samples']
+    ARGS_SNPS = ['--snps', None, 'Dump SNPs calls']
+    ARGS_INDEX_V_GRAPHS = [
+        '--index_variants_graphs', None, 'Index the variants graphs'
+    ]
+    ARGS_WINDOW = ['-w', '--window', 'Control artefacts window size']
+    ARGS_DEEP_CHECK = ['--deep_check', None, 'Check the FASTQ files content']
+    ARGS_NB_THREADS = ['-t', '--nb_threads', 'Number of FASTQ files read']
+    ARGS_NB_ROUNDS = ['-r', '--nb_rounds', 'Maximum number of rounds']
+    ARGS_NB_WORKERS = ['-j', '--nb_workers', 'Number of runs analyzed at once']
+    ARGS_POLL_DELAY = ['-p', '--poll_delay', 'Jobs polling delay (s)']
+    ARGS_JOB_CAPACITY = ['-c', '--job_capacity', 'Maximum samples per job']
+    ARGS_SKIP_DONE = ['--skip_done', None, 'Skip runs with complete outputs']
+    ARGS_NB_PROBES = ['--nb_probes', None, 'Number of runs outputs probed']
+    ARGS_NB_PROCESSES = ['-n', '--nb_processes', 'Aggregation processes']
+    ARGS_CATALOG = ['--catalog', None, 'Encode the annotations of the dumps']
+    ARGS_SUPPORT_FILE = ['output_file', None, 'Reads support file']
+    ARGS_BATCH_1 = ['batch_1', None, 'First batch dump file or directory']
+    ARGS_BATCH_2 = ['batch_2', None, 'Second batch dump file or directory']
+    ARGS_DIFF_FILE = ['output_file', None, 'Differences file']
+    ARGS_SAMPLE_TYPE = ['-t', '--sample_type', 'Sample type']
+    ARGS_SUMMARY_FILE = ['-s', '--summary_file', 'Amplicons summary file']
+    ARGS_VAF_TOLERANCE = ['-v', '--vaf_tolerance', 'VAF tolerance']
+    ARGS_MAX_MISMATCHES = [
+        '-m', '--max_mismatches', 'Maximum number of mismatches'
+    ]
+    ARGS_OUTPUT_PREFIX = ['output_prefix', None, 'Output files prefix']
+    ARGS_TRACE_PATH = ['-p', '--trace_path', 'Trace files directory']
+    ARGS_NB_TRACE_THREADS = [
+        '-t', '--nb_threads', 'Number of trace files read'
+    ]
+    ARGS_ARTEFACT_STORE = ['-a', '--artefact_store', 'Artefact store']
+    ARGS_STORE_DIR = ['store_dir', None, 'Artefact store directory']
+    ARGS_BATCH_DIRS = ['batch_dirs', None, 'Batches directories to ingest']
+    ARGS_STORE_LOG_FILES = ['-l', '--input_log_files', 'Input log files']
+    ARGS_ANNOTATE_DIRS = [
+        '-a', '--annotate_dirs', 'Batches directories to annotate'
+    ]
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: analysis of a set of runs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    submit_parser = subparsers.add_parser('submit',
+                                          help='Run the pipeline on AWS')
+    submit_parser.add_argument(ARGS_RUNS_CSV_FILE[0],
+                               type=str,
+                               help=ARGS_RUNS_CSV_FILE[2])
+    submit_parser.add_argument(ARGS_INPUT_BUCKET[0],
+                               type=str,
+                               help=ARGS_INPUT_BUCKET[2])
+    submit_parser.add_argument(ARGS_BRANCH[0], type=str, help=ARGS_BRANCH[2])
+    submit_parser.add_argument(ARGS_OUTPUT_BUCKET[0],
+                               ARGS_OUTPUT_BUCKET[1],
+                               type=str,
+                               help=ARGS_OUTPUT_BUCKET[2])
+    submit_parser.add_argument(ARGS_AWS_DEF[0],
+                               ARGS_AWS_DEF[1],
+                               default=AWS_DEF,
+                               type=str,
+                               help=ARGS_AWS_DEF[2])
+    submit_parser.add_argument(ARGS_AWS_QUEUE[0],
+                               ARGS_AWS_QUEUE[1],
+                               default=AWS_QUEUE,
+                               type=str,
+                               help=ARGS_AWS_QUEUE[2])
+    submit_parser.add_argument(ARGS_DEEP_CHECK[0],
+                               action='store_true',
+                               help=ARGS_DEEP_CHECK[2])
+    submit_parser.add_argument(ARGS_NB_THREADS[0],
+                               ARGS_NB_THREADS[1],
+                               type=int,
+                               default=FASTQ_CHECK_THREADS,
+                               help=ARGS_NB_THREADS[2])
+    submit_parser.add_argument(ARGS_JOB_CAPACITY[0],
+                               ARGS_JOB_CAPACITY[1],
+                               type=int,
+                               default=JOB_CAPACITY,
+                               help=ARGS_JOB_CAPACITY[2])
+    submit_parser.add_argument(ARGS_SKIP_DONE[0],
+                               action='store_true',
+                               help=ARGS_SKIP_DONE[2])
+    submit_parser.add_argument(ARGS_NB_PROBES[0],
+                               type=int,
+                               default=OUTPUT_PROBE_THREADS,
+                               help=ARGS_NB_PROBES[2])
+    submit_parser.set_defaults(func=cmd_submit)
+
+    analyze_parser = subparsers.add_parser(
+        'analyze', help='Analysis of the results on AWS')
+    analyze_parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                                type=str,
+                                help=ARGS_INPUT_LOG_FILE[2])
+    analyze_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                type=str,
+                                help=ARGS_OUTPUT_DIR[2])
+    analyze_parser.add_argument(ARGS_S3_BUCKET[0],
+                                ARGS_S3_BUCKET[1],
+                                default=CCHAUVE_S3_OUTPUT,
+                                type=str,
+                                help=ARGS_S3_BUCKET[2])
+    analyze_parser.add_argument(ARGS_SNPS[0],
+                                action='store_true',
+                                help=ARGS_SNPS[2])
+    analyze_parser.add_argument(ARGS_ARTEFACT_STORE[0],
+                                ARGS_ARTEFACT_STORE[1],
+                                type=str,
+                                help=ARGS_ARTEFACT_STORE[2])
+    analyze_parser.add_argument(ARGS_INDEX_V_GRAPHS[0],
+                                action='store_true',
+                                help=ARGS_INDEX_V_GRAPHS[2])
+    analyze_parser.set_defaults(func=cmd_analyze)
+
+    resubmit_parser = subparsers.add_parser(
+        'resubmit', help='Resubmission and analysis of failed runs')
+    resubmit_parser.add_argument(ARGS_RUNS_CSV_FILE[0],
+                                 type=str,
+                                 help=ARGS_RUNS_CSV_FILE[2])
+    resubmit_parser.add_argument(ARGS_INPUT_BUCKET[0],
+                                 type=str,
+                                 help=ARGS_INPUT_BUCKET[2])
+    resubmit_parser.add_argument(ARGS_BRANCH[0],
+                                 type=str,
+                                 help=ARGS_BRANCH[2])
+    resubmit_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                 type=str,
+                                 help=ARGS_OUTPUT_DIR[2])
+    resubmit_parser.add_argument(ARGS_OUTPUT_BUCKET[0],
+                                 ARGS_OUTPUT_BUCKET[1],
+                                 type=str,
+                                 help=ARGS_OUTPUT_BUCKET[2])
+    resubmit_parser.add_argument(ARGS_AWS_DEF[0],
+                                 ARGS_AWS_DEF[1],
+                                 default=AWS_DEF,
+                                 type=str,
+                                 help=ARGS_AWS_DEF[2])
+    resubmit_parser.add_argument(ARGS_AWS_QUEUE[0],
+                                 ARGS_AWS_QUEUE[1],
+                                 default=AWS_QUEUE,
+                                 type=str,
+                                 help=ARGS_AWS_QUEUE[2])
+    resubmit_parser.add_argument(ARGS_S3_BUCKET[0],
+                                 ARGS_S3_BUCKET[1],
+                                 default=CCHAUVE_S3_OUTPUT,
+                                 type=str,
+                                 help=ARGS_S3_BUCKET[2])
+    resubmit_parser.add_argument(ARGS_SNPS[0],
+                                 action='store_true',
+                                 help=ARGS_SNPS[2])
+    resubmit_parser.add_argument(ARGS_NB_ROUNDS[0],
+                                 ARGS_NB_ROUNDS[1],
+                                 type=int,
+                                 default=NB_ROUNDS,
+                                 help=ARGS_NB_ROUNDS[2])
+    resubmit_parser.add_argument(ARGS_NB_WORKERS[0],
+                                 ARGS_NB_WORKERS[1],
+                                 type=int,
+                                 default=MAX_WORKERS,
+                                 help=ARGS_NB_WORKERS[2])
+    resubmit_parser.add_argument(ARGS_POLL_DELAY[0],
+                                 ARGS_POLL_DELAY[1],
+                                 type=int,
+                                 default=POLL_DELAY,
+                                 help=ARGS_POLL_DELAY[2])
+    resubmit_parser.add_argument(ARGS_JOB_CAPACITY[0],
+                                 ARGS_JOB_CAPACITY[1],
+                                 type=int,
+                                 default=JOB_CAPACITY,
+                                 help=ARGS_JOB_CAPACITY[2])
+    resubmit_parser.set_defaults(func=cmd_resubmit)
+
+    aggregate_parser = subparsers.add_parser(
+        'aggregate', help='Aggregation of the dump files of the runs')
+    aggregate_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_DIR[2])
+    aggregate_parser.add_argument(ARGS_NB_PROCESSES[0],
+                                  ARGS_NB_PROCESSES[1],
+                                  type=int,
+                                  default=1,
+                                  help=ARGS_NB_PROCESSES[2])
+    aggregate_parser.set_defaults(func=cmd_aggregate)
+
+    catalog_parser = subparsers.add_parser(
+        'catalog', help='Annotation catalog of the dump files of the runs')
+    catalog_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                type=str,
+                                help=ARGS_OUTPUT_DIR[2])
+    catalog_parser.add_argument(ARGS_SNPS[0],
+                                action='store_true',
+                                help=ARGS_SNPS[2])
+    catalog_parser.set_defaults(func=cmd_catalog)
+
+    artefacts_parser = subparsers.add_parser(
+        'artefacts', help='Annotation of patient indels with control samples')
+    artefacts_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_DIR[2])
+    artefacts_parser.add_argument(ARGS_INPUT_LOG_FILES[0],
+                                  type=str,
+                                  nargs='+',
+                                  help=ARGS_INPUT_LOG_FILES[2])
+    artefacts_parser.add_argument(ARGS_WINDOW[0],
+                                  ARGS_WINDOW[1],
+                                  type=int,
+                                  default=WINDOW,
+                                  help=ARGS_WINDOW[2])
+    artefacts_parser.set_defaults(func=cmd_artefacts)
+
+    colocated_parser = subparsers.add_parser(
+        'colocated', help='Detection of groups of co-located indels')
+    colocated_parser.add_argument(ARGS_OUTPUT_LOG_FILE[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_LOG_FILE[2])
+    colocated_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_DIR[2])
+    colocated_parser.add_argument(ARGS_OUTPUT_FILE[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_FILE[2])
+    colocated_parser.add_argument(ARGS_GAP_LEN[0],
+                                  ARGS_GAP_LEN[1],
+                                  type=int,
+                                  default=GAP_LEN,
+                                  help=ARGS_GAP_LEN[2])
+    colocated_parser.set_defaults(func=cmd_colocated)
+
+    clusters_parser = subparsers.add_parser(
+        'clusters', help='Clusters of co-located indels across samples')
+    clusters_parser.add_argument(ARGS_OUTPUT_FILE[0],
+                                 type=str,
+                                 help=ARGS_OUTPUT_FILE[2])
+    clusters_parser.add_argument(ARGS_OUTPUT_DIRS[0],
+                                 type=str,
+                                 nargs='+',
+                                 help=ARGS_OUTPUT_DIRS[2])
+    clusters_parser.add_argument(ARGS_GAP_LEN[0],
+                                 ARGS_GAP_LEN[1],
+                                 type=int,
+                                 default=GAP_LEN,
+                                 help=ARGS_GAP_LEN[2])
+    clusters_parser.add_argument(ARGS_MIN_INDELS[0],
+                                 ARGS_MIN_INDELS[1],
+                                 type=int,
+                                 default=MIN_INDELS,
+                                 help=ARGS_MIN_INDELS[2])
+    clusters_parser.add_argument(ARGS_MIN_SAMPLES[0],
+                                 ARGS_MIN_SAMPLES[1],
+                                 type=int,
+                                 default=MIN_SAMPLES,
+                                 help=ARGS_MIN_SAMPLES[2])
+    clusters_parser.set_defaults(func=cmd_clusters)
+
+    support_parser = subparsers.add_parser(
+        'support', help='Reads support of the indels from alignments arrays')
+    support_parser.add_argument(ARGS_SUPPORT_FILE[0],
+                                type=str,
+                                help=ARGS_SUPPORT_FILE[2])
+    support_parser.add_argument(ARGS_OUTPUT_DIRS[0],
+                                type=str,
+                                nargs='+',
+                                help=ARGS_OUTPUT_DIRS[2])
+    support_parser.add_argument(ARGS_MAX_MISMATCHES[0],
+                                ARGS_MAX_MISMATCHES[1],
+                                type=int,
+                                default=MAX_MISMATCHES,
+                                help=ARGS_MAX_MISMATCHES[2])
+    support_parser.set_defaults(func=cmd_support)
+
+    diff_parser = subparsers.add_parser(
+        'diff', help='Differences between the indels calls of two batches')
+    diff_parser.add_argument(ARGS_BATCH_1[0], type=str, help=ARGS_BATCH_1[2])
+    diff_parser.add_argument(ARGS_BATCH_2[0], type=str, help=ARGS_BATCH_2[2])
+    diff_parser.add_argument(ARGS_DIFF_FILE[0],
+                             type=str,
+                             help=ARGS_DIFF_FILE[2])
+    diff_parser.add_argument(ARGS_SAMPLE_TYPE[0],
+                             ARGS_SAMPLE_TYPE[1],
+                             type=str,
+                             choices=SAMPLE_TYPES,
+                             default=SAMPLE_TYPE_DNA,
+                             help=ARGS_SAMPLE_TYPE[2])
+    diff_parser.add_argument(ARGS_SUMMARY_FILE[0],
+                             ARGS_SUMMARY_FILE[1],
+                             type=str,
+                             help=ARGS_SUMMARY_FILE[2])
+    diff_parser.add_argument(ARGS_VAF_TOLERANCE[0],
+                             ARGS_VAF_TOLERANCE[1],
+                             type=float,
+                             default=VAF_TOLERANCE,
+                             help=ARGS_VAF_TOLERANCE[2])
+    diff_parser.set_defaults(func=cmd_diff)
+
+    store_parser = subparsers.add_parser(
+        'store', help='Control samples artefact store')
+    store_parser.add_argument(ARGS_STORE_DIR[0],
+                              type=str,
+                              help=ARGS_STORE_DIR[2])
+    store_parser.add_argument(ARGS_BATCH_DIRS[0],
+                              type=str,
+                              nargs='*',
+                              help=ARGS_BATCH_DIRS[2])
+    store_parser.add_argument(ARGS_STORE_LOG_FILES[0],
+                              ARGS_STORE_LOG_FILES[1],
+                              type=str,
+                              nargs='+',
+                              default=[],
+                              help=ARGS_STORE_LOG_FILES[2])
+    store_parser.add_argument(ARGS_ANNOTATE_DIRS[0],
+                              ARGS_ANNOTATE_DIRS[1],
+                              type=str,
+                              nargs='+',
+                              default=[],
+                              help=ARGS_ANNOTATE_DIRS[2])
+    store_parser.set_defaults(func=cmd_store)
+
+    traces_parser = subparsers.add_parser(
+        'traces', help='Resources reports from Nextflow trace files')
+    traces_parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                               type=str,
+                               help=ARGS_INPUT_LOG_FILE[2])
+    traces_parser.add_argument(ARGS_OUTPUT_PREFIX[0],
+                               type=str,
+                               help=ARGS_OUTPUT_PREFIX[2])
+    traces_parser.add_argument(ARGS_TRACE_PATH[0],
+                               ARGS_TRACE_PATH[1],
+                               type=str,
+                               default=TRACE_PATH,
+                               help=ARGS_TRACE_PATH[2])
+    traces_parser.add_argument(ARGS_NB_TRACE_THREADS[0],
+                               ARGS_NB_TRACE_THREADS[1],
+                               type=int,
+                               default=TRACE_READ_THREADS,
+                               help=ARGS_NB_TRACE_THREADS[2])
+    traces_parser.set_defaults(func=cmd_traces)
+
+    count_parser = subparsers.add_parser('count', help='Count samples')
+    count_parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                              type=str,
+                              help=ARGS_INPUT_LOG_FILE[2])
+    count_parser.set_defaults(func=cmd_count)
+
+    pipeline_parser = subparsers.add_parser(
+        'pipeline', help='analyze, aggregate, artefacts, colocated and count')
+    pipeline_parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                                 type=str,
+                                 help=ARGS_INPUT_LOG_FILE[2])
+    pipeline_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                                 type=str,
+                                 help=ARGS_OUTPUT_DIR[2])
+    pipeline_parser.add_argument(ARGS_COLOCATED_FILE[0],
+                                 type=str,
+                                 help=ARGS_COLOCATED_FILE[2])
+    pipeline_parser.add_argument(ARGS_S3_BUCKET[0],
+                                 ARGS_S3_BUCKET[1],
+                                 default=CCHAUVE_S3_OUTPUT,
+                                 type=str,
+                                 help=ARGS_S3_BUCKET[2])
+    pipeline_parser.add_argument(ARGS_GAP_LEN[0],
+                                 ARGS_GAP_LEN[1],
+                                 type=int,
+                                 default=GAP_LEN,
+                                 help=ARGS_GAP_LEN[2])
+    pipeline_parser.add_argument(ARGS_SNPS[0],
+                                 action='store_true',
+                                 help=ARGS_SNPS[2])
+    pipeline_parser.add_argument(ARGS_WINDOW[0],
+                                 ARGS_WINDOW[1],
+                                 type=int,
+                                 default=WINDOW,
+                                 help=ARGS_WINDOW[2])
+    pipeline_parser.add_argument(ARGS_NB_PROCESSES[0],
+                                 ARGS_NB_PROCESSES[1],
+                                 type=int,
+                                 default=1,
+                                 help=ARGS_NB_PROCESSES[2])
+    pipeline_parser.add_argument(ARGS_CATALOG[0],
+                                 action='store_true',
+                                 help=ARGS_CATALOG[2])
+    pipeline_parser.set_defaults(func=cmd_pipeline)
+
+    args = parser.parse_args()
+    args.func(args)
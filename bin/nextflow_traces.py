@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Resources used by the runs of the indels pipeline, from Nextflow trace files
+The trace files of the AWS job of a run (named after the run, or the job
+name logged with AWS.JOB for packed runs) are the files of
+<trace_path>/<job_name>/ whose name contains 'trace'; they are read
+concurrently and their tasks (rows) are attributed to the run and sample
+whose ID occurs in the task name or tag. Durations, CPU usage, memory and
+I/O are parsed from raw or human-readable values (e.g. 1m 2s, 95.3%,
+1.2 GB) into seconds, percents and bytes, and summarized by process and by
+run with percentiles over the tasks.
+"""
+
+# Standard imports
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Local imports
+from common_utils import DUMP_FIELDS_SEP, INFO, DumpWriter
+from run_ledger import get_input_runs, get_run_jobs, read_ledger
+from s3_utils import (S3_PREFIX, S3Error, get_files_in_s3, read_s3_lines,
+                      split_s3_path)
+
+# Default directory of the trace files
+TRACE_PATH = 's3://cchauve-orchestration-ch/_trace'
+# Substring of the names of trace files
+TRACE_FILE_KEY = 'trace'
+# Default number of trace files read concurrently
+TRACE_READ_THREADS = 16
+# Missing values in trace files
+TRACE_MISSING = ['', '-']
+# Trace fields
+TRACE_HASH = 'hash'
+TRACE_NAME = 'name'
+TRACE_PROCESS = 'process'
+TRACE_TAG = 'tag'
+TRACE_STATUS = 'status'
+TRACE_EXIT = 'exit'
+TRACE_SUBMIT = 'submit'
+TRACE_DURATION = 'duration'
+TRACE_REALTIME = 'realtime'
+TRACE_CPU = '%cpu'
+TRACE_PEAK_RSS = 'peak_rss'
+TRACE_PEAK_VMEM = 'peak_vmem'
+TRACE_RCHAR = 'rchar'
+TRACE_WCHAR = 'wchar'
+# Status of successful tasks
+TRACE_STATUS_OK = ['COMPLETED', 'CACHED']
+# Submission date format of human-readable trace files
+TRACE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+# Durations and sizes units
+TIME_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0, 'd': 86400.0}
+SIZE_UNITS = {
+    'B': 1,
+    'KB': 1 << 10,
+    'MB': 1 << 20,
+    'GB': 1 << 30,
+    'TB': 1 << 40
+}
+# Numeric metrics of a task: trace field, column
+TASK_METRICS = [(TRACE_DURATION, 'duration_s'), (TRACE_REALTIME, 'realtime_s'),
+                (TRACE_CPU, 'cpu_pct'), (TRACE_PEAK_RSS, 'peak_rss'),
+                (TRACE_PEAK_VMEM, 'peak_vmem'), (TRACE_RCHAR, 'rchar'),
+                (TRACE_WCHAR, 'wchar')]
+METRICS_COLUMNS = [column for _, column in TASK_METRICS]
+# Header of the tasks file
+TASKS_HEADER = [
+    'run_id', 'job', 'process', 'sample', 'name', 'status', 'exit', 'submit_s'
+] + METRICS_COLUMNS
+# Metrics summarized by percentiles and percentiles
+SUMMARY_METRICS = ['realtime_s', 'cpu_pct', 'peak_rss', 'rchar', 'wchar']
+PERCENTILES = [50, 90, 95, 99]
+PERCENTILES_COLUMNS = [
+    f"{metric}_{stat}" for metric in SUMMARY_METRICS
+    for stat in [f"p{q}" for q in PERCENTILES] + ['max']
+]
+# Headers of the processes and runs files
+GROUP_HEADER = ['nb_tasks', 'nb_failed', 'realtime_h', 'cpu_h']
+PROCESSES_HEADER = ['process'] + GROUP_HEADER + PERCENTILES_COLUMNS
+RUNS_HEADER = ['run_id', 'job'] + GROUP_HEADER + [
+    'wall_time_s', 'top_sample', 'top_sample_realtime_fraction'
+] + PERCENTILES_COLUMNS
+
+
+def get_trace_files(trace_path, job_name):
+    """
+    :param: trace_path (str): directory of the trace files, local or in S3
+    :param: job_name (str): name of an AWS job
+    :return: list(str): paths to the trace files of the job, sorted
+    :raise: S3Error if the S3 directory can not be listed
+    """
+    if trace_path.startswith(S3_PREFIX):
+        s3_bucket, trace_dir = split_s3_path(trace_path.rstrip('/'))
+        keys = get_files_in_s3(f"{trace_dir}/{job_name}/", s3_bucket) or []
+        trace_files = [f"{S3_PREFIX}{s3_bucket}/{key}" for key in keys]
+    else:
+        job_dir = os.path.join(trace_path, job_name)
+        if not os.path.isdir(job_dir):
+            return []
+        trace_files = [
+            os.path.join(job_dir, file_name)
+            for file_name in os.listdir(job_dir)
+        ]
+    return sorted(trace_file for trace_file in trace_files
+                  if TRACE_FILE_KEY in os.path.basename(trace_file))
+
+
+def parse_duration(value):
+    """
+    :param: value (str): duration, in ms (raw) or human-readable (1h 2m 3s)
+    :return: float: duration in seconds, None if missing
+    """
+    if value in TRACE_MISSING:
+        return None
+    if value.isdigit():
+        return int(value) * TIME_UNITS['ms']
+    duration = 0.0
+    for token in value.split():
+        unit = token.lstrip('0123456789.')
+        duration += float(token[:len(token) - len(unit)]) * TIME_UNITS[unit]
+    return duration
+
+
+def parse_size(value):
+    """
+    :param: value (str): size, in bytes (raw) or human-readable (1.2 GB)
+    :return: float: size in bytes, None if missing
+    """
+    if value in TRACE_MISSING:
+        return None
+    fields = value.split()
+    if len(fields) == 1:
+        return float(fields[0])
+    return float(fields[0]) * SIZE_UNITS[fields[1]]
+
+
+def parse_percent(value):
+    """
+    :param: value (str): percentage, with or without %
+    :return: float: percentage, None if missing
+    """
+    if value in TRACE_MISSING:
+        return None
+    return float(value.rstrip('%'))
+
+
+def parse_submit(value):
+    """
+    :param: value (str): submission time, epoch in ms (raw) or date
+    :return: float: submission time in seconds since the epoch, None if
+    missing
+    """
+    if value in TRACE_MISSING:
+        return None
+    if value.isdigit():
+        return int(value) * TIME_UNITS['ms']
+    return datetime.strptime(value, TRACE_DATE_FORMAT).timestamp()
+
+
+TRACE_PARSERS = {
+    TRACE_DURATION: parse_duration,
+    TRACE_REALTIME: parse_duration,
+    TRACE_CPU: parse_percent,
+    TRACE_PEAK_RSS: parse_size,
+    TRACE_PEAK_VMEM: parse_size,
+    TRACE_RCHAR: parse_size,
+    TRACE_WCHAR: parse_size
+}
+
+
+def read_trace_lines(trace_lines):
+    """
+    :param: trace_lines (list(str)): lines of a trace file
+    :return: list(dict(str, str)): tasks of the trace file, indexed by field
+    """
+    lines = [line.rstrip('\n') for line in trace_lines if line.strip()]
+    if len(lines) == 0:
+        return []
+    header = lines[0].split(DUMP_FIELDS_SEP)
+    return [
+        dict(zip(header, line.split(DUMP_FIELDS_SEP))) for line in lines[1:]
+    ]
+
+
+def get_task_process(task):
+    """
+    :param: task (dict(str, str)): task of a trace file
+    :return: str: process of the task, from its name (<process> (<tag>)) if
+    the trace has no process field
+    """
+    process = task.get(TRACE_PROCESS, '')
+    if process in TRACE_MISSING:
+        process = task.get(TRACE_NAME, '').split(' (')[0]
+    return process
+
+
+def get_task_row(task, run_id, job_name, sample_id):
+    """
+    :param: task (dict(str, str)): task of a trace file
+    :param: run_id, job_name, sample_id (str): run, job and sample of the
+    task, sample_id being empty for tasks of a whole run
+    :return: list: fields of TASKS_HEADER, numeric fields as float or None
+    """
+    row = [
+        run_id, job_name,
+        get_task_process(task), sample_id,
+        task.get(TRACE_NAME, ''),
+        task.get(TRACE_STATUS, ''),
+        task.get(TRACE_EXIT, ''),
+        parse_submit(task.get(TRACE_SUBMIT, ''))
+    ]
+    row += [
+        TRACE_PARSERS[field](task.get(field, ''))
+        for field, _ in TASK_METRICS
+    ]
+    return row
+
+
+def get_job_tasks(job_name, job_runs, trace_lists):
+    """
+    :param: job_name (str): name of an AWS job
+    :param: job_runs (list((str, list(str)))): run ID and sample IDs of the
+    runs of the job
+    :param: trace_lists (list(list(str))): lines of the trace files of the
+    job, in the order they were written
+    :return: list(list): rows (see get_task_row) of the tasks of the job; a
+    task present in several trace files (resumed job) is taken from the last
+    one, and a task whose name or tag does not contain any sample or run ID
+    of the job is attributed to its first run
+    """
+    tasks = {}
+    for trace_lines in trace_lists:
+        for task in read_trace_lines(trace_lines):
+            tasks[task.get(TRACE_HASH, len(tasks))] = task
+    rows = []
+    for task in tasks.values():
+        label = f"{task.get(TRACE_NAME, '')} {task.get(TRACE_TAG, '')}"
+        task_run_id, task_sample_id = job_runs[0][0], ''
+        for run_id, sample_id_list in job_runs:
+            sample_ids = [x for x in sample_id_list if x in label]
+            if len(sample_ids) > 0:
+                task_run_id, task_sample_id = run_id, max(sample_ids, key=len)
+                break
+            if run_id in label:
+                task_run_id = run_id
+        rows.append(get_task_row(task, task_run_id, job_name, task_sample_id))
+    return rows
+
+
+def read_runs_traces(input_log_file_path,
+                     trace_path=TRACE_PATH,
+                     nb_threads=TRACE_READ_THREADS):
+    """
+    Reads the trace files of the jobs of the runs of an input log file,
+    nb_threads files at a time
+    :param: input_log_file_path (str): path to the input log file of the runs
+    :param: trace_path (str): directory of the trace files, local or in S3
+    :param: nb_threads (int): number of trace files read concurrently
+    :return: list(list), list(str): rows of the tasks (see get_task_row) and
+    names of the jobs without trace file or whose trace files can not be read
+    """
+    entries = read_ledger(input_log_file_path)
+    sample_id_lists, _ = get_input_runs(entries)
+    run_jobs = get_run_jobs(entries)
+    jobs = {}
+    for (run_id, _), sample_id_list in sample_id_lists.items():
+        jobs.setdefault(run_jobs.get(run_id, run_id),
+                        []).append((run_id, sample_id_list))
+
+    def read_job_traces(job_name):
+        try:
+            return [
+                read_s3_lines(trace_file)
+                for trace_file in get_trace_files(trace_path, job_name)
+            ]
+        except (S3Error, OSError):
+            return []
+
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        jobs_traces = list(executor.map(read_job_traces, jobs.keys()))
+    tasks, missing_jobs = [], []
+    for (job_name, job_runs), trace_lists in zip(jobs.items(), jobs_traces):
+        if len(trace_lists) == 0:
+            missing_jobs.append(job_name)
+        else:
+            tasks += get_job_tasks(job_name, job_runs, trace_lists)
+    return tasks, missing_jobs
+
+
+def get_tasks_arrays(tasks):
+    """
+    :param: tasks (list(list)): rows of tasks (see get_task_row)
+    :return: dict(str, numpy array): float arrays of the numeric columns of
+    TASKS_HEADER, missing values being NaN
+    """
+    import numpy as np
+
+    columns = ['submit_s'] + METRICS_COLUMNS
+    indices = [TASKS_HEADER.index(column) for column in columns]
+    values = np.array([[row[i] for i in indices] for row in tasks],
+                      dtype=np.float64).reshape(-1, len(columns))
+    return {column: values[:, i] for i, column in enumerate(columns)}
+
+
+def get_groups_stats(tasks, arrays, group_column):
+    """
+    :param: tasks (list(list)): rows of tasks (see get_task_row)
+    :param: arrays (dict): see get_tasks_arrays
+    :param: group_column (str): column of TASKS_HEADER grouping the tasks
+    :return: dict(str, list(str)): fields of GROUP_HEADER and
+    PERCENTILES_COLUMNS of each group
+    """
+    import numpy as np
+
+    group_index = TASKS_HEADER.index(group_column)
+    status_index = TASKS_HEADER.index('status')
+    groups = {}
+    for i, row in enumerate(tasks):
+        groups.setdefault(row[group_index], []).append(i)
+    groups_stats = {}
+    for group, group_tasks in groups.items():
+        realtime = arrays['realtime_s'][group_tasks]
+        cpu = arrays['cpu_pct'][group_tasks]
+        nb_failed = sum(tasks[i][status_index] not in TRACE_STATUS_OK
+                        for i in group_tasks)
+        stats = [
+            str(len(group_tasks)),
+            str(nb_failed),
+            str(round(np.nansum(realtime) / 3600, 4)),
+            str(round(np.nansum(realtime * cpu / 100) / 3600, 4))
+        ]
+        for metric in SUMMARY_METRICS:
+            values = arrays[metric][group_tasks]
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                stats += [''] * (len(PERCENTILES) + 1)
+            else:
+                stats += [
+                    str(round(float(x), 2))
+                    for x in np.percentile(values, PERCENTILES)
+                ] + [str(round(float(values.max()), 2))]
+        groups_stats[group] = stats
+    return groups_stats
+
+
+def get_runs_times(tasks, arrays):
+    """
+    :param: tasks (list(list)): rows of tasks (see get_task_row)
+    :param: arrays (dict): see get_tasks_arrays
+    :return: dict(str, list(str)): wall time (first submission to last task
+    end), sample with the largest total realtime and its fraction of the
+    realtime of the run, for each run
+    """
+    import numpy as np
+
+    run_index = TASKS_HEADER.index('run_id')
+    sample_index = TASKS_HEADER.index('sample')
+    ends = arrays['submit_s'] + arrays['duration_s']
+    realtimes = arrays['realtime_s']
+    runs = {}
+    for i, row in enumerate(tasks):
+        runs.setdefault(row[run_index], []).append(i)
+    runs_times = {}
+    for run_id, run_tasks in runs.items():
+        submit, end = arrays['submit_s'][run_tasks], ends[run_tasks]
+        wall_time = ''
+        if not np.all(np.isnan(end)):
+            wall_time = str(round(float(np.nanmax(end) - np.nanmin(submit)),
+                                  2))
+        samples_realtime = {}
+        for i in run_tasks:
+            sample_id = tasks[i][sample_index]
+            if sample_id and not np.isnan(realtimes[i]):
+                samples_realtime[sample_id] = (
+                    samples_realtime.get(sample_id, 0.0) + realtimes[i])
+        run_realtime = np.nansum(realtimes[run_tasks])
+        top_sample, top_fraction = '', ''
+        if len(samples_realtime) > 0 and run_realtime > 0:
+            top_sample = max(samples_realtime, key=samples_realtime.get)
+            top_fraction = str(
+                round(samples_realtime[top_sample] / run_realtime, 4))
+        runs_times[run_id] = [wall_time, top_sample, top_fraction]
+    return runs_times
+
+
+def get_trace_files_paths(output_prefix):
+    """
+    :param: output_prefix (str): prefix of the paths of the output files
+    :return: (str, str, str): paths to the tasks, processes and runs files
+    """
+    return (f"{output_prefix}_trace_tasks.tsv",
+            f"{output_prefix}_trace_processes.tsv",
+            f"{output_prefix}_trace_runs.tsv")
+
+
+def format_value(value):
+    """
+    :param: value (str, float or None): field of a task
+    :return: str: value, empty if missing
+    """
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return str(round(value, 3))
+    return value
+
+
+def write_traces_reports(output_prefix, tasks):
+    """
+    Writes the tasks (TASKS_HEADER), processes (PROCESSES_HEADER) and runs
+    (RUNS_HEADER) files of a set of tasks
+    :param: output_prefix (str): prefix of the paths of the output files
+    :param: tasks (list(list)): rows of tasks (see get_task_row)
+    """
+    tasks_file, processes_file, runs_file = get_trace_files_paths(
+        output_prefix)
+    arrays = get_tasks_arrays(tasks)
+    with DumpWriter(tasks_file, TASKS_HEADER) as out_tasks:
+        out_tasks.write_rows([[format_value(x) for x in row]
+                              for row in tasks])
+    processes_stats = get_groups_stats(tasks, arrays, 'process')
+    with DumpWriter(processes_file, PROCESSES_HEADER) as out_processes:
+        out_processes.write_rows([[process] + stats for process, stats in
+                                  sorted(processes_stats.items())])
+    runs_stats = get_groups_stats(tasks, arrays, 'run_id')
+    runs_times = get_runs_times(tasks, arrays)
+    run_jobs = {row[0]: row[1] for row in tasks}
+    with DumpWriter(runs_file, RUNS_HEADER) as out_runs:
+        out_runs.write_rows([[run_id, run_jobs[run_id]] + stats[:len(
+            GROUP_HEADER)] + runs_times[run_id] + stats[len(GROUP_HEADER):]
+                             for run_id, stats in sorted(runs_stats.items())])
+
+
+if __name__ == "__main__":
+    """
+    Reads the Nextflow trace files of the AWS jobs of the runs of an input
+    log file and writes three TSV files:
+    - <output_prefix>_trace_tasks.tsv: one line per task, with columns run_id,
+      job, process, sample (empty for tasks of a whole run), name, status,
+      exit, submit_s (submission time), duration_s, realtime_s, cpu_pct,
+      peak_rss, peak_vmem, rchar and wchar (bytes)
+    - <output_prefix>_trace_processes.tsv: one line per process, with columns
+      process, nb_tasks, nb_failed, realtime_h and cpu_h (total realtime and
+      CPU time in hours), and the percentiles 50, 90, 95, 99 and the maximum
+      of realtime_s, cpu_pct, peak_rss, rchar and wchar over the tasks
+    - <output_prefix>_trace_runs.tsv: the same columns for each run, with
+      run_id and job, and wall_time_s (first submission to last task end),
+      top_sample (sample with the largest total realtime) and
+      top_sample_realtime_fraction
+    Jobs without trace file are printed.
+
+    Arguments:
+    - input_log_file: input log file from a set of runs
+    - output_prefix: prefix of the paths of the output files
+    - trace_path (optional): directory, local or in S3, containing a
+      directory <job_name> of trace files per job;
+      default = s3://cchauve-orchestration-ch/_trace
+    - nb_threads (optional): number of trace files read concurrently;
+      default = 16
+    """
+    ARGS_INPUT_LOG_FILE = ['input_log_file', None, 'Input log file']
+    ARGS_OUTPUT_PREFIX = ['output_prefix', None, 'Output files prefix']
+    ARGS_TRACE_PATH = ['-p', '--trace_path', 'Trace files directory']
+    ARGS_NB_THREADS = ['-t', '--nb_threads', 'Number of trace files read']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: Nextflow traces resources reports')
+    parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                        type=str,
+                        help=ARGS_INPUT_LOG_FILE[2])
+    parser.add_argument(ARGS_OUTPUT_PREFIX[0],
+                        type=str,
+                        help=ARGS_OUTPUT_PREFIX[2])
+    parser.add_argument(ARGS_TRACE_PATH[0],
+                        ARGS_TRACE_PATH[1],
+                        type=str,
+                        default=TRACE_PATH,
+                        help=ARGS_TRACE_PATH[2])
+    parser.add_argument(ARGS_NB_THREADS[0],
+                        ARGS_NB_THREADS[1],
+                        type=int,
+                        default=TRACE_READ_THREADS,
+                        help=ARGS_NB_THREADS[2])
+    args = parser.parse_args()
+
+    tasks, missing_jobs = read_runs_traces(args.input_log_file,
+                                           args.trace_path, args.nb_threads)
+    write_traces_reports(args.output_prefix, tasks)
+    print(f"{INFO}\ttasks:\t{len(tasks)}")
+    for job_name in missing_jobs:
+        print(f"{INFO}\t{job_name}\tno trace file")
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Automatic resubmission of the failed runs of a set of runs
+Each round submits the runs to reprocess on AWS (with -resume, see
+run_utils.get_aws_cmd), waits for their AWS Batch jobs to complete and
+analyzes the results of the runs whose job succeeded; the runs still failing
+are resubmitted in the next round, for at most nb_rounds rounds, except the
+runs whose job is still running after JOBS_TIMEOUT.
+All rounds are logged in a single log file (and ledger), each round starting
+by a line ROUND:<round number>\t<number of runs>.
+"""
+
+# Standard imports
+import argparse
+import io
+import os
+import time
+
+# Local imports
+from analysis_utils import (CCHAUVE_S3_OUTPUT, analyze_runs_list,
+                            write_failed_runs_file)
+from common_utils import (ERROR_RUN_UNPROCESSED, INDELS, INFO, ROUND, SNPS,
+                          WARNING, get_amplicons_coords)
+from run_ledger import RunLog, get_input_runs, get_run_jobs, parse_log_line
+from run_utils import (AWS_DEF, AWS_QUEUE, AWS_REGION, JOB_CAPACITY,
+                       get_runs_manifests_list, submit_runs_list)
+from s3_utils import retry
+
+# Default number of rounds
+NB_ROUNDS = 3
+# Default maximum number of runs analyzed concurrently
+MAX_WORKERS = 4
+# Delay in seconds between two polls of the AWS Batch jobs status
+POLL_DELAY = 300
+# Maximum time in seconds to wait for the jobs of a round
+JOBS_TIMEOUT = 24 * 3600
+# Delay in seconds after which a job still not listed by AWS Batch is
+# considered lost
+JOB_LISTING_GRACE = 600
+# Margin in seconds subtracted from the local submission time of a round to
+# select its jobs, their creation time being set by the clock of AWS Batch
+JOB_CREATED_MARGIN = 300
+# Final status of AWS Batch jobs, JOB_NOT_FOUND for lost jobs
+JOB_SUCCEEDED = 'SUCCEEDED'
+JOB_FAILED = 'FAILED'
+JOB_NOT_FOUND = 'NOT_FOUND'
+JOB_FINAL_STATUS = [JOB_SUCCEEDED, JOB_FAILED, JOB_NOT_FOUND]
+
+
+def get_resubmit_log_file_path(runs_csv_file):
+    """
+    :param: runs_csv_file (str): path to the CSV file of the runs to reprocess
+    :return: str: path to the log file of the rounds, in log
+    """
+    _, run_file_name = os.path.split(runs_csv_file)
+    return os.path.join('log', run_file_name.replace('.csv', '_resubmit.log'))
+
+
+def get_resubmit_failed_file_path(runs_csv_file):
+    """
+    :param: runs_csv_file (str): path to the CSV file of the runs to reprocess
+    :return: str: path to the CSV file of the runs failing after all rounds,
+    in data
+    """
+    _, run_file_name = os.path.split(runs_csv_file)
+    return os.path.join('data',
+                        run_file_name.replace('.csv', '_resubmit_failed.csv'))
+
+
+def get_job_status(job_name, aws_queue, created_after, ignored_job_ids=()):
+    """
+    :param: job_name (str): name of an AWS Batch job
+    :param: aws_queue (str): AWS Batch queue the job was submitted to
+    :param: created_after (int): time in ms, older jobs are ignored
+    :param: ignored_job_ids (set(str)): IDs of jobs to ignore, e.g. jobs of
+    previous rounds created after created_after
+    :return: (str, str): ID and status of the most recent job with this name,
+    (None, None) if there is no such job
+    """
+    import boto3
+
+    batch_client = boto3.client('batch', region_name=AWS_REGION)
+    jobs, list_args = [], {
+        'jobQueue': aws_queue,
+        'filters': [{
+            'name': 'JOB_NAME',
+            'values': [job_name]
+        }]
+    }
+    while True:
+        response = batch_client.list_jobs(**list_args)
+        jobs += [
+            job for job in response['jobSummaryList']
+            if job['createdAt'] >= created_after
+            and job['jobId'] not in ignored_job_ids
+        ]
+        if 'nextToken' not in response:
+            break
+        list_args['nextToken'] = response['nextToken']
+    if len(jobs) == 0:
+        return None, None
+    job = max(jobs, key=lambda job: job['createdAt'])
+    return job['jobId'], job['status']
+
+
+def wait_for_jobs(job_name_list,
+                  aws_queue,
+                  created_after,
+                  poll_delay=POLL_DELAY,
+                  timeout=JOBS_TIMEOUT,
+                  grace=JOB_LISTING_GRACE,
+                  seen_job_ids=None):
+    """
+    Waits until a list of AWS Batch jobs are completed; a job not listed by
+    AWS Batch after grace seconds is considered lost (JOB_NOT_FOUND)
+    :param: job_name_list (list(str)): names of the submitted jobs
+    :param: aws_queue, created_after: see get_job_status
+    :param: poll_delay (int): delay in seconds between two polls
+    :param: timeout (int): maximum waiting time in seconds
+    :param: grace (int): delay in seconds for a submitted job to be listed
+    :param: seen_job_ids (set(str)): IDs of the jobs of previous rounds,
+    ignored; the IDs of the jobs found are added to it
+    :return: dict(str, str): job name -> last status of the job, not in
+    JOB_FINAL_STATUS for the jobs still running after timeout seconds
+    """
+    if seen_job_ids is None:
+        seen_job_ids = set()
+    jobs_status = {job_name: None for job_name in job_name_list}
+    jobs_id = {}
+    start_time = time.time()
+    while True:
+        for job_name, status in jobs_status.items():
+            if status not in JOB_FINAL_STATUS:
+                job_id, status = retry(get_job_status, job_name, aws_queue,
+                                       created_after, seen_job_ids)
+                if job_id is not None:
+                    jobs_id[job_name] = job_id
+                elif time.time() - start_time > grace:
+                    status = JOB_NOT_FOUND
+                jobs_status[job_name] = status
+        nb_running = sum(1 for status in jobs_status.values()
+                         if status not in JOB_FINAL_STATUS)
+        if nb_running == 0 or time.time() - start_time > timeout:
+            seen_job_ids.update(jobs_id.values())
+            return jobs_status
+        print(f"{INFO}\twaiting for jobs:\t{nb_running} jobs")
+        time.sleep(poll_delay)
+
+
+def resubmit_runs(runs_csv_file,
+                  s3_input,
+                  branch,
+                  output_dir,
+                  s3_output=None,
+                  aws_def=AWS_DEF,
+                  aws_queue=AWS_QUEUE,
+                  s3_bucket=CCHAUVE_S3_OUTPUT,
+                  nb_rounds=NB_ROUNDS,
+                  max_workers=MAX_WORKERS,
+                  poll_delay=POLL_DELAY,
+                  v_types=(INDELS, ),
+                  job_capacity=JOB_CAPACITY):
+    """
+    Resubmits and analyzes failed runs until they succeed, for at most
+    nb_rounds rounds
+    :param: runs_csv_file (str): CSV file with 2 fields <run_name>,<run_id>,
+    e.g. the _failed.csv file written by analysis_utils.analyze_runs
+    :param: s3_input, branch, s3_output, aws_def, aws_queue: see
+    run_utils.get_aws_cmd
+    :param: output_dir, s3_bucket, v_types: see analysis_utils.analyze_runs
+    :param: nb_rounds (int): maximum number of rounds
+    :param: max_workers (int): maximum number of runs analyzed concurrently
+    :param: poll_delay (int): delay in seconds between two polls of the jobs
+    :param: job_capacity (int): see run_utils.submit_runs_list
+    :return: (list(str), list((str, str))): IDs of the runs that succeeded
+    and (run ID, run name) of the runs still failing, including the runs
+    whose job was still running after JOBS_TIMEOUT
+    """
+    amplicons_coords = get_amplicons_coords()
+    runs_manifests_list = get_runs_manifests_list(runs_csv_file)
+    ok_run_id_list, running_runs = [], []
+    seen_job_ids = set()
+    log_file_path = get_resubmit_log_file_path(runs_csv_file)
+    with RunLog(log_file_path) as log_file:
+        for round_nb in range(1, nb_rounds + 1):
+            if len(runs_manifests_list) == 0:
+                break
+            log_file.write(
+                f"{ROUND}:{round_nb}\t{len(runs_manifests_list)} runs\n")
+            print(f"{INFO}\tround {round_nb}:\t"
+                  f"{len(runs_manifests_list)} runs")
+            # Submission; the round log is read back to get the runs samples
+            created_after = int((time.time() - JOB_CREATED_MARGIN) * 1000)
+            round_log = io.StringIO()
+            submit_runs_list(runs_manifests_list,
+                             s3_input,
+                             branch,
+                             round_log,
+                             s3_output,
+                             aws_def,
+                             aws_queue,
+                             job_capacity=job_capacity)
+            log_file.write(round_log.getvalue())
+            round_entries = [
+                entry for entry in map(parse_log_line,
+                                       round_log.getvalue().splitlines())
+                if entry is not None
+            ]
+            sample_id_lists, failed_runs = get_input_runs(round_entries)
+            # Waiting for the jobs, a job without AWS.JOB entry being named
+            # after its run
+            run_jobs = get_run_jobs(round_entries)
+            run_job_names = {
+                run_id: run_jobs.get(run_id, run_id)
+                for (run_id, _) in sample_id_lists.keys()
+            }
+            jobs_status = wait_for_jobs(
+                list(dict.fromkeys(run_job_names.values())),
+                aws_queue,
+                created_after,
+                poll_delay,
+                seen_job_ids=seen_job_ids)
+            # Only the runs whose job succeeded are analyzed; the runs whose
+            # job is still running are not resubmitted
+            for (run_id, run_name) in list(sample_id_lists.keys()):
+                status = jobs_status[run_job_names[run_id]]
+                if status == JOB_SUCCEEDED:
+                    continue
+                log_file.write(f"{WARNING}:{run_id}\tAWS job {status}\n")
+                log_file.write(
+                    f"{WARNING}:{run_id}\t{ERROR_RUN_UNPROCESSED}\n")
+                del sample_id_lists[(run_id, run_name)]
+                if status in JOB_FINAL_STATUS:
+                    failed_runs.append((run_id, run_name))
+                else:
+                    running_runs.append((run_id, run_name))
+            # Analysis
+            round_ok_run_id_list, round_failed_runs = analyze_runs_list(
+                sample_id_lists,
+                output_dir,
+                s3_bucket,
+                log_file,
+                amplicons_coords,
+                v_types=v_types,
+                max_workers=max_workers)
+            ok_run_id_list += round_ok_run_id_list
+            failed_run_ids = {
+                run_id
+                for (run_id, _) in failed_runs + round_failed_runs
+            }
+            runs_manifests_list = [
+                run for run in runs_manifests_list if run[0] in failed_run_ids
+            ]
+    failed_runs = [(run_id, run_name)
+                   for (run_id, _, run_name) in runs_manifests_list]
+    failed_runs += running_runs
+    write_failed_runs_file(get_resubmit_failed_file_path(runs_csv_file),
+                           failed_runs)
+    return ok_run_id_list, failed_runs
+
+
+if __name__ == "__main__":
+    """
+    Resubmits the runs of a CSV file of runs to reprocess (e.g.
+    data/<name>_failed.csv written by analysis_utils.py) until they succeed,
+    for at most nb_rounds rounds. Each round submits the runs as run_utils.py,
+    waits for their AWS Batch jobs to complete and analyzes their results as
+    analysis_utils.py, nb_workers runs at a time.
+
+    The rounds are logged in log/<name>_failed_resubmit.log (and its ledger
+    .jsonl); the runs still failing after the last round are written in
+    data/<name>_failed_resubmit_failed.csv.
+
+    Arguments:
+    - runs_csv_file: CSV file with 2 fields <run_name>,<run_id>
+    - s3_input, branch, s3_output, aws_def, aws_queue: see run_utils.py
+    - output_dir, s3_bucket, snps: see analysis_utils.py
+    - nb_rounds (optional): maximum number of rounds; default = 3
+    - nb_workers (optional): number of runs analyzed concurrently; default = 4
+    - poll_delay (optional): delay in seconds between two polls of the jobs
+      status; default = 300
+    - job_capacity (optional): maximum number of samples of a job, see
+      run_utils.py (requires a branch of run_utils.JOB_PACKING_BRANCHES);
+      default = 0 (one job per run)
+    """
+    ARGS_RUNS_FILE = ['runs_csv_file', None, 'Runs CSV file']
+    ARGS_INPUT_BUCKET = ['s3_input', None, 'Input S3 bucket directory']
+    ARGS_BRANCH = ['branch', None, 'indels-pipeline branch']
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    ARGS_OUTPUT_BUCKET = ['-o', '--s3_output', 'output S3 bucket directory']
+    ARGS_AWS_DEF = ['-d', '--aws_def', 'AWS definition']
+    ARGS_AWS_QUEUE = ['-q', '--aws_queue', 'AWS queue']
+    ARGS_S3_BUCKET = ['-s3', '--s3_bucket', 'S3 bucket containing the results']
+    ARGS_SNPS = ['--snps', None, 'Dump SNPs calls']
+    ARGS_NB_ROUNDS = ['-r', '--nb_rounds', 'Maximum number of rounds']
+    ARGS_NB_WORKERS = ['-j', '--nb_workers', 'Number of runs analyzed at once']
+    ARGS_POLL_DELAY = ['-p', '--poll_delay', 'Jobs polling delay (s)']
+    ARGS_JOB_CAPACITY = ['-c', '--job_capacity', 'Maximum samples per job']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: resubmission of failed runs')
+    parser.add_argument(ARGS_RUNS_FILE[0], type=str, help=ARGS_RUNS_FILE[2])
+    parser.add_argument(ARGS_INPUT_BUCKET[0],
+                        type=str,
+                        help=ARGS_INPUT_BUCKET[2])
+    parser.add_argument(ARGS_BRANCH[0], type=str, help=ARGS_BRANCH[2])
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_OUTPUT_BUCKET[0],
+                        ARGS_OUTPUT_BUCKET[1],
+                        type=str,
+                        help=ARGS_OUTPUT_BUCKET[2])
+    parser.add_argument(ARGS_AWS_DEF[0],
+                        ARGS_AWS_DEF[1],
+                        default=AWS_DEF,
+                        type=str,
+                        help=ARGS_AWS_DEF[2])
+    parser.add_argument(ARGS_AWS_QUEUE[0],
+                        ARGS_AWS_QUEUE[1],
+                        default=AWS_QUEUE,
+                        type=str,
+                        help=ARGS_AWS_QUEUE[2])
+    parser.add_argument(ARGS_S3_BUCKET[0],
+                        ARGS_S3_BUCKET[1],
+                        default=CCHAUVE_S3_OUTPUT,
+                        type=str,
+                        help=ARGS_S3_BUCKET[2])
+    parser.add_argument(ARGS_SNPS[0], action='store_true', help=ARGS_SNPS[2])
+    parser.add_argument(ARGS_NB_ROUNDS[0],
+                        ARGS_NB_ROUNDS[1],
+                        type=int,
+                        default=NB_ROUNDS,
+                        help=ARGS_NB_ROUNDS[2])
+    parser.add_argument(ARGS_NB_WORKERS[0],
+                        ARGS_NB_WORKERS[1],
+                        type=int,
+                        default=MAX_WORKERS,
+                        help=ARGS_NB_WORKERS[2])
+    parser.add_argument(ARGS_POLL_DELAY[0],
+                        ARGS_POLL_DELAY[1],
+                        type=int,
+                        default=POLL_DELAY,
+                        help=ARGS_POLL_DELAY[2])
+    parser.add_argument(ARGS_JOB_CAPACITY[0],
+                        ARGS_JOB_CAPACITY[1],
+                        type=int,
+                        default=JOB_CAPACITY,
+                        help=ARGS_JOB_CAPACITY[2])
+    args = parser.parse_args()
+
+    v_types = (INDELS, SNPS) if args.snps else (INDELS, )
+    ok_run_id_list, failed_runs = resubmit_runs(
+        args.runs_csv_file, args.s3_input, args.branch, args.output_dir,
+        args.s3_output, args.aws_def, args.aws_queue, args.s3_bucket,
+        args.nb_rounds, args.nb_workers, args.poll_delay, v_types,
+        args.job_capacity)
+    print(f"{INFO}\tsuccessful runs:\t{len(ok_run_id_list)}")
+    print(f"{INFO}\tfailed runs:\t{len(failed_runs)}")
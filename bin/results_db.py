@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+SQLite database of the results of sets of runs: indels calls, alignments,
+warnings and runs metadata
+"""
+
+# Standard imports
+import argparse
+import csv
+import os
+import sqlite3
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+# Local imports
+from aggregate_dump_files import group_data, sort_data
+from common_utils import (DUMP_FIELDS_SEP, ERROR_NONE, ERROR_RUN_UNPROCESSED,
+                          INDELS, INFO, WARNING, WARNINGS_OUTPUT_SUFFIX,
+                          get_alg_dump_file, get_sample_info,
+                          get_vcf_dump_file)
+from run_ledger import (LEDGER_MESSAGE, LEDGER_RUN_ID, LEDGER_SAMPLE_ID,
+                        LEDGER_TYPE, read_input_log_file, read_ledger)
+
+# Tables; the run ID is the first column of every results table
+DB_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY, run_name TEXT, log_name TEXT, status TEXT)""",
+    """CREATE TABLE IF NOT EXISTS run_samples (
+        run_id TEXT, sample TEXT)""",
+    """CREATE TABLE IF NOT EXISTS run_logs (
+        run_id TEXT, log_name TEXT, log_type TEXT, sample TEXT,
+        message TEXT)""",
+    """CREATE TABLE IF NOT EXISTS indels (
+        run_id TEXT, sample TEXT, chr TEXT, pos INTEGER, ref TEXT, alt TEXT,
+        vaf REAL, source TEXT, features_cov TEXT, features_seq TEXT,
+        annotation TEXT)""",
+    """CREATE TABLE IF NOT EXISTS alignments (
+        run_id TEXT, sample TEXT, chr TEXT, pos INTEGER, ref TEXT, alt TEXT,
+        source TEXT, alignments TEXT)""",
+    """CREATE TABLE IF NOT EXISTS warnings (
+        run_id TEXT, step TEXT, sample_amplicon TEXT, message TEXT)""",
+    """CREATE TABLE IF NOT EXISTS samples (
+        sample TEXT PRIMARY KEY, sample_type TEXT, patient_id TEXT,
+        run_tag TEXT, well INTEGER, s_nb INTEGER)""",
+    """CREATE VIEW IF NOT EXISTS indels_typed AS
+        SELECT indels.*, samples.sample_type, samples.patient_id
+        FROM indels JOIN samples USING (sample)"""
+]
+# Indexes, created after bulk loading
+DB_INDEXES = {
+    'indels': ['chr, pos, ref, alt', 'sample', 'run_id'],
+    'alignments': ['chr, pos, ref, alt', 'sample', 'run_id'],
+    'warnings': ['sample_amplicon', 'run_id'],
+    'run_samples': ['sample', 'run_id'],
+    'samples': ['sample_type'],
+    'run_logs': ['run_id']
+}
+# Tables whose content is replaced when a run is loaded again
+RUN_TABLES = ['run_samples', 'run_logs', 'indels', 'alignments', 'warnings']
+
+# Rows inserted per executemany call
+INSERT_BATCH_SIZE = 10000
+
+
+def open_results_db(db_file_path):
+    """
+    Opens (and creates if needed) a results database
+    :param: db_file_path (str): path to the SQLite database file
+    :return: sqlite3.Connection: connection to the database
+    """
+    db = sqlite3.connect(db_file_path)
+    for statement in DB_SCHEMA:
+        db.execute(statement)
+    return db
+
+
+def create_indexes(db):
+    for table, indexes in DB_INDEXES.items():
+        for columns in indexes:
+            index_name = f"{table}_{columns.replace(', ', '_')}_idx"
+            db.execute(f"CREATE INDEX IF NOT EXISTS {index_name} "
+                       f"ON {table}({columns})")
+
+
+def bulk_insert(db, table, nb_columns, rows):
+    """
+    Inserts rows into a table by batches of INSERT_BATCH_SIZE rows
+    :param: db (sqlite3.Connection): results database
+    :param: table (str): table name
+    :param: nb_columns (int): number of columns of the table
+    :param: rows (iterable(tuple)): rows to insert
+    :return: int: number of inserted rows
+    """
+    statement = f"INSERT INTO {table} VALUES ({','.join('?' * nb_columns)})"
+    nb_rows, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_BATCH_SIZE:
+            db.executemany(statement, batch)
+            nb_rows += len(batch)
+            batch = []
+    db.executemany(statement, batch)
+    return nb_rows + len(batch)
+
+
+def read_dump_rows(run_id, dump_file_path, int_columns=[3]):
+    """
+    Reads a run dump file into rows prefixed by the run ID
+    :param: run_id (str): run ID
+    :param: dump_file_path (str): path to a VCF or alignments dump file
+    :param: int_columns (list(int)): indexes of integer columns, after the
+    run ID
+    :return: iterator(list): rows of the dump file
+    """
+    with open(dump_file_path) as dump_file:
+        dump_reader = csv.reader(dump_file, delimiter=DUMP_FIELDS_SEP)
+        next(dump_reader, None)
+        for row in dump_reader:
+            if len(row) > 0:
+                out_row = [run_id] + row
+                for i in int_columns:
+                    out_row[i] = int(out_row[i])
+                yield out_row
+
+
+def read_warnings_rows(run_id, prefix):
+    """
+    Reads the warnings files of a run written by extract_main_warnings
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the output directory
+    :return: iterator((str, str, str, str)): run ID, step, sample.amplicon,
+    message
+    """
+    for step, warning_suffix in WARNINGS_OUTPUT_SUFFIX.items():
+        warning_file_path = os.path.join(prefix, run_id,
+                                         f"{run_id}_warnings{warning_suffix}")
+        if not os.path.isfile(warning_file_path):
+            continue
+        with open(warning_file_path) as warning_file:
+            for line in warning_file:
+                line_split = line.rstrip('\n').split('\t', 1)
+                if len(line_split) == 2:
+                    yield (run_id, step, line_split[0], line_split[1])
+
+
+def get_log_events(log_file_path):
+    """
+    Reads the INFO/WARNING entries of the ledger of a log file
+    :param: log_file_path (str): path to an input or output log file
+    :return: list((str, str, str, str, str)): run ID, log file name, log
+    type, sample ID (None for a run event), message
+    """
+    log_file_name = os.path.basename(log_file_path)
+    return [(entry[LEDGER_RUN_ID], log_file_name, entry[LEDGER_TYPE],
+             entry.get(LEDGER_SAMPLE_ID), entry[LEDGER_MESSAGE])
+            for entry in read_ledger(log_file_path)
+            if entry[LEDGER_TYPE] in [INFO, WARNING]]
+
+
+def load_runs(db, input_log_file_path, output_dir):
+    """
+    Loads into the results database the runs of an input log file, their
+    output log events and the dump and warnings files of the successful runs.
+    Runs already in the database are replaced.
+    :param: db (sqlite3.Connection): results database
+    :param: input_log_file_path (str): path to the input log file
+    :param: output_dir (str): directory containing the runs results
+    :return: dict(str, int): number of rows loaded per table
+    """
+    log_name = os.path.basename(input_log_file_path).replace('_input.log', '')
+    sample_id_lists, unprocessed_runs = read_input_log_file(
+        input_log_file_path)
+    output_log_file_path = input_log_file_path.replace('_input.log',
+                                                       '_output.log')
+    log_events = []
+    for log_file_path in [input_log_file_path, output_log_file_path]:
+        if os.path.isfile(log_file_path):
+            log_events += get_log_events(log_file_path)
+    # The status of a failed run is its error, not the unprocessed mark that
+    # follows it
+    runs_status = defaultdict(lambda: ERROR_NONE)
+    for (run_id, log_file_name, log_type, sample_id, message) in log_events:
+        if (log_file_name.endswith('_output.log') and log_type == WARNING
+                and sample_id is None and message != ERROR_RUN_UNPROCESSED):
+            runs_status[run_id] = message
+    runs = [(run_id, run_name, log_name, runs_status[run_id])
+            for (run_id, run_name) in sample_id_lists.keys()]
+    runs += [(run_id, run_name, log_name, WARNING)
+             for (run_id, run_name) in unprocessed_runs]
+    nb_rows = defaultdict(int)
+    with db:
+        db.execute('PRAGMA synchronous = OFF')
+        for (run_id, _, _, _) in runs:
+            for table in RUN_TABLES:
+                db.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id, ))
+        nb_rows['runs'] = len(runs)
+        db.executemany('INSERT OR REPLACE INTO runs VALUES (?,?,?,?)', runs)
+        nb_rows['run_samples'] = bulk_insert(
+            db, 'run_samples', 2,
+            ((run_id, sample_id)
+             for (run_id, _), sample_id_list in sample_id_lists.items()
+             for sample_id in sample_id_list))
+        nb_rows['run_logs'] = bulk_insert(db, 'run_logs', 5, log_events)
+        db.executemany(
+            'INSERT OR IGNORE INTO samples VALUES (?,?,?,?,?,?)',
+            ((sample_id, ) + get_sample_info(sample_id)
+             for sample_id_list in sample_id_lists.values()
+             for sample_id in sample_id_list))
+        for (run_id, _), _ in sample_id_lists.items():
+            if runs_status[run_id] != ERROR_NONE:
+                continue
+            indels_dump_file = get_vcf_dump_file(run_id,
+                                                 output_dir,
+                                                 INDELS,
+                                                 init=False)
+            if os.path.isfile(indels_dump_file):
+                nb_rows['indels'] += bulk_insert(
+                    db, 'indels', 11, read_dump_rows(run_id, indels_dump_file))
+            alg_dump_file = get_alg_dump_file(run_id, output_dir, init=False)
+            if os.path.isfile(alg_dump_file):
+                nb_rows['alignments'] += bulk_insert(
+                    db, 'alignments', 8, read_dump_rows(run_id,
+                                                        alg_dump_file))
+            nb_rows['warnings'] += bulk_insert(
+                db, 'warnings', 4, read_warnings_rows(run_id, output_dir))
+        create_indexes(db)
+    return nb_rows
+
+
+# Queries
+
+
+def query_grouped_indels(db, sample_type):
+    """
+    Groups the indels calls of a type of samples by (chr, pos, ref, alt)
+    :param: db (sqlite3.Connection): results database
+    :param: sample_type (str): DNA, ctrl or misc
+    :return: list(list): rows nb, chr, pos, ref, alt, avg_vaf, std_vaf,
+    sample:vaf, by decreasing number of samples then in the order of the
+    grouped dump files
+    """
+    query = """
+        SELECT sample, chr, pos, ref, alt, vaf, source, features_cov,
+            features_seq, annotation
+        FROM indels_typed WHERE sample_type = ?"""
+    # Rows and samples are sorted and grouped as in aggregate_dump_files, as
+    # SQLite sorts chromosomes as text and does not guarantee the order of
+    # GROUP_CONCAT
+    indels = db.execute(query, (sample_type, )).fetchall()
+    sort_data(indels)
+    grouped_indels = [
+        out_group[:7] + out_group[-1:]
+        for out_group in group_data(indels)
+    ]
+    grouped_indels.sort(key=itemgetter(0), reverse=True)
+    return grouped_indels
+
+
+def query_colocated_indels(db, gap_len):
+    """
+    Detects groups of co-located indels within each sample, where two
+    consecutive indels of a group are separated by at most gap_len bases
+    :param: db (sqlite3.Connection): results database
+    :param: gap_len (int): maximum number of bases between consecutive indels
+    :return: dict(str, list(str)): group of co-located indels ->
+    list of run_id.sample_id where it occurs
+    """
+    query = """
+        WITH ordered AS (
+            SELECT rowid AS row_nb, run_id, sample, chr, pos, ref, alt,
+                CASE WHEN chr = LAG(chr) OVER w AND
+                    pos - LAG(pos) OVER w <= :gap_len THEN 0 ELSE 1 END
+                    AS new_group
+            FROM indels
+            WINDOW w AS (PARTITION BY run_id, sample ORDER BY chr, pos)),
+        numbered AS (
+            SELECT *, SUM(new_group) OVER (
+                PARTITION BY run_id, sample ORDER BY chr, pos
+                ROWS UNBOUNDED PRECEDING) AS group_id
+            FROM ordered)
+        SELECT run_id, sample, group_id,
+            chr || '.' || pos || '.' || ref || '.' || alt
+        FROM numbered
+        ORDER BY run_id, sample, group_id, pos, row_nb"""
+    # The indels of a group are concatenated here, as the order of
+    # GROUP_CONCAT is not guaranteed by SQLite; indels at the same position
+    # are kept in the order of the dump file
+    indel_groups_to_sample = defaultdict(list)
+    for (run_id, sample_id, _), group in groupby(
+            db.execute(query, {'gap_len': gap_len}), key=itemgetter(0, 1, 2)):
+        indels = [indel for *_, indel in group]
+        if len(indels) > 1:
+            indel_groups_to_sample['___'.join(indels)].append(
+                f"{run_id}.{sample_id}")
+    return indel_groups_to_sample
+
+
+if __name__ == "__main__":
+    """
+    Commands:
+    - load input_log_file output_dir: loads the runs of input_log_file (and
+      the corresponding output log file) and their results found in
+      output_dir
+    - grouped sample_type output_file: writes the indels calls of a type of
+      samples (DNA, ctrl, misc) grouped by (chr, pos, ref, alt)
+    - colocated output_file [-g gap_len]: writes the groups of co-located
+      indels and the samples they occur in
+
+    Arguments:
+    - db_file: path to the SQLite database file
+    """
+    ARGS_DB_FILE = ['db_file', None, 'SQLite database file']
+    ARGS_INPUT_LOG_FILE = ['input_log_file', None, 'Input log file']
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Runs output directory']
+    ARGS_SAMPLE_TYPE = ['sample_type', None, 'DNA, ctrl or misc']
+    ARGS_OUTPUT_FILE = ['output_file', None, 'Output file']
+    ARGS_GAP_LEN = ['-g', '--gap_len', 'Gap length']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: results database')
+    parser.add_argument(ARGS_DB_FILE[0], type=str, help=ARGS_DB_FILE[2])
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+    load_parser = subparsers.add_parser('load')
+    load_parser.add_argument(ARGS_INPUT_LOG_FILE[0],
+                             type=str,
+                             help=ARGS_INPUT_LOG_FILE[2])
+    load_parser.add_argument(ARGS_OUTPUT_DIR[0],
+                             type=str,
+                             help=ARGS_OUTPUT_DIR[2])
+    grouped_parser = subparsers.add_parser('grouped')
+    grouped_parser.add_argument(ARGS_SAMPLE_TYPE[0],
+                                type=str,
+                                help=ARGS_SAMPLE_TYPE[2])
+    grouped_parser.add_argument(ARGS_OUTPUT_FILE[0],
+                                type=str,
+                                help=ARGS_OUTPUT_FILE[2])
+    colocated_parser = subparsers.add_parser('colocated')
+    colocated_parser.add_argument(ARGS_OUTPUT_FILE[0],
+                                  type=str,
+                                  help=ARGS_OUTPUT_FILE[2])
+    colocated_parser.add_argument(ARGS_GAP_LEN[0],
+                                  ARGS_GAP_LEN[1],
+                                  type=int,
+                                  default=5,
+                                  help=ARGS_GAP_LEN[2])
+    args = parser.parse_args()
+
+    db = open_results_db(args.db_file)
+    if args.cmd == 'load':
+        nb_rows = load_runs(db, args.input_log_file, args.output_dir)
+        for table, nb in nb_rows.items():
+            print(f"INFO\t{table}\t{nb}")
+    elif args.cmd == 'grouped':
+        header = [
+            'nb', 'chr', 'pos', 'ref', 'alt', 'avg_vaf', 'std_vaf',
+            'sample:vaf'
+        ]
+        with open(args.output_file, 'w') as out_file:
+            writer = csv.writer(out_file, delimiter=DUMP_FIELDS_SEP)
+            writer.writerows([header] +
+                             query_grouped_indels(db, args.sample_type))
+    elif args.cmd == 'colocated':
+        indel_groups_to_sample = query_colocated_indels(db, args.gap_len)
+        with open(args.output_file, 'w') as out_file:
+            out_file.write('#colocated_indels_group'
+                           '\tnumber_of_occuring_samples'
+                           '\tlist_of_(run_id.sample_id)')
+            for indel_group in sorted(indel_groups_to_sample.keys()):
+                sample_id_list = indel_groups_to_sample[indel_group]
+                out_file.write(f"\n{indel_group}\t{len(sample_id_list)}"
+                               f"\t{' '.join(sample_id_list)}")
+    db.close()
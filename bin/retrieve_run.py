@@ -6,15 +6,12 @@ Retrieve results or data from a run
 # Standard imports
 import argparse
 import os
-import subprocess
 import tarfile
 
-from common_utils import get_files_in_s3
+from s3_utils import download_s3_file, get_files_in_s3
 
 # Default S3 directory containing results
 CCHAUVE_S3_OUTPUT = 'cchauve-orchestration-ch'
-# AWS cp command
-AWS_CP = ['aws', 's3', 'cp']
 
 if __name__ == "__main__":
     """
@@ -54,20 +51,17 @@ if __name__ == "__main__":
         for file_path in s3_files:
             if file_path.endswith('_main.tar.gz') or file_path.endswith(
                     '_vcf.tar.gz'):
-                subprocess.call(AWS_CP + [
-                    os.path.join('s3://', args.s3_bucket, file_path), out_dir
-                ])
+                download_s3_file(
+                    os.path.join('s3://', args.s3_bucket, file_path), out_dir)
                 tarfile.open(os.path.join(args.output_dir, file_path),
                              'r:gz').extractall(path=out_dir)
             elif file_path.endswith('.yaml'):
-                subprocess.call(AWS_CP + [
-                    os.path.join('s3://', args.s3_bucket, file_path), out_dir
-                ])
+                download_s3_file(
+                    os.path.join('s3://', args.s3_bucket, file_path), out_dir)
     elif args.cmd == 'data':
         s3_files = get_files_in_s3(f"input/{args.run_id}", args.s3_bucket)
         for file_path in s3_files:
-            subprocess.call(
-                AWS_CP +
-                [os.path.join('s3://', args.s3_bucket, file_path), out_dir])
+            download_s3_file(
+                os.path.join('s3://', args.s3_bucket, file_path), out_dir)
     else:
         print('ERROR: first argument is either \"data\" or \"results\"')
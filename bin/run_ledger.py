@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Structured runs ledger: JSON lines version of the input/output log files of a
+set of runs
+Each line of a log file <name>.log is recorded in <name>.jsonl as a JSON
+object with fields
+- type: RUN.ID, RUN.SAMPLES, RUN.READS, INFO, WARNING, AWS, AWS.JOB or ROUND
+- run_id (all but ROUND and AWS.JOB): run ID
+- round (ROUND only): resubmission round number
+- job_name, runs (AWS.JOB only): name of an AWS Batch job running several
+  runs and IDs of these runs
+- run_name (RUN.ID only): run name
+- samples (RUN.SAMPLES only): list of sample IDs
+- sample_id (RUN.READS, optional for WARNING): sample ID the entry is about
+- reads (RUN.READS only): number of read pairs of the sample
+- message (INFO, WARNING, AWS, ROUND): message or AWS command
+"""
+
+# Standard imports
+import argparse
+import json
+import os
+
+# Local imports
+from common_utils import (AWS_CMD, AWS_JOB, ERROR_RUN_UNPROCESSED, INFO,
+                          ROUND, RUN_ID, RUN_READS, RUN_SAMPLES, WARNING)
+
+# Ledger files extension, replacing .log
+LEDGER_EXT = '.jsonl'
+LOG_EXT = '.log'
+
+# Ledger entries fields
+LEDGER_TYPE = 'type'
+LEDGER_RUN_ID = 'run_id'
+LEDGER_RUN_NAME = 'run_name'
+LEDGER_SAMPLES = 'samples'
+LEDGER_SAMPLE_ID = 'sample_id'
+LEDGER_ROUND = 'round'
+LEDGER_READS = 'reads'
+LEDGER_JOB_NAME = 'job_name'
+LEDGER_RUNS = 'runs'
+LEDGER_MESSAGE = 'message'
+
+
+def get_ledger_path(log_file_path):
+    """
+    :param: log_file_path (str): path to a log file
+    :return: str: path to the corresponding ledger file
+    """
+    return f"{os.path.splitext(log_file_path)[0]}{LEDGER_EXT}"
+
+
+def parse_log_line(log):
+    """
+    Converts a line of a log file into a ledger entry
+    :param: log (str): log line, <type>:<target>\t<message>
+    :return: dict: ledger entry, None for an empty line
+    """
+    log_split = log.rstrip('\n').split('\t', 1)
+    if log_split[0] == '':
+        return None
+    log_header = log_split[0]
+    message = log_split[1] if len(log_split) > 1 else ''
+    if log_header.startswith(f"{WARNING}."):
+        # Warnings written as WARNING.<run_id>
+        log_type, target = WARNING, log_header[len(WARNING) + 1:]
+    else:
+        log_type, _, target = log_header.partition(':')
+    entry = {LEDGER_TYPE: log_type}
+    if log_type == RUN_ID:
+        entry[LEDGER_RUN_ID], entry[LEDGER_RUN_NAME] = target.split('.', 1)
+    elif log_type == RUN_SAMPLES:
+        entry[LEDGER_RUN_ID] = target
+        entry[LEDGER_SAMPLES] = message.split()
+    elif log_type == RUN_READS:
+        entry[LEDGER_RUN_ID], entry[LEDGER_SAMPLE_ID] = target.split(':', 1)
+        entry[LEDGER_READS] = int(message)
+    elif log_type == AWS_JOB:
+        entry[LEDGER_JOB_NAME] = target
+        entry[LEDGER_RUNS] = message.split()
+    elif log_type == ROUND:
+        entry[LEDGER_ROUND] = int(target)
+        entry[LEDGER_MESSAGE] = message
+    else:
+        # Warnings on a sample are written <run_id>:<sample_id> or
+        # <run_id>.<sample_id>; run IDs contain neither : nor .
+        sample_id = None
+        for target_sep in [':', '.']:
+            if target_sep in target:
+                target, sample_id = target.split(target_sep, 1)
+                break
+        entry[LEDGER_RUN_ID] = target
+        if sample_id is not None:
+            entry[LEDGER_SAMPLE_ID] = sample_id
+        entry[LEDGER_MESSAGE] = message
+    return entry
+
+
+class RunLog:
+    """
+    Log file of a set of runs, written both as text and as a ledger
+    """
+    def __init__(self, log_file_path):
+        self.log_file = open(log_file_path, 'w')
+        self.ledger_file = open(get_ledger_path(log_file_path), 'w')
+
+    def write(self, log):
+        """
+        :param: log (str): one or several log lines, each ended by a newline
+        """
+        self.log_file.write(log)
+        for log_line in log.splitlines():
+            entry = parse_log_line(log_line)
+            if entry is not None:
+                self.ledger_file.write(f"{json.dumps(entry)}\n")
+
+    def close(self):
+        self.log_file.close()
+        self.ledger_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def convert_log_file(log_file_path):
+    """
+    Writes the ledger of an existing log file
+    :param: log_file_path (str): path to the log file
+    :return: str: path to the ledger file
+    """
+    ledger_file_path = get_ledger_path(log_file_path)
+    with open(log_file_path) as log_file, open(ledger_file_path,
+                                               'w') as ledger_file:
+        for log in log_file:
+            entry = parse_log_line(log)
+            if entry is not None:
+                ledger_file.write(f"{json.dumps(entry)}\n")
+    return ledger_file_path
+
+
+def read_ledger(log_file_path):
+    """
+    Reads the ledger of a log file; if there is no ledger, or if the log
+    file was modified after it (edited or regenerated log file), the log file
+    itself is read
+    :param: log_file_path (str): path to the log file (or to its ledger)
+    :return: list(dict): ledger entries
+    """
+    ledger_file_path = get_ledger_path(log_file_path)
+    if os.path.isfile(ledger_file_path) and (
+            not os.path.isfile(log_file_path)
+            or os.path.getmtime(log_file_path) <=
+            os.path.getmtime(ledger_file_path)):
+        with open(ledger_file_path) as ledger_file:
+            return [json.loads(entry) for entry in ledger_file]
+    with open(log_file_path) as log_file:
+        return [
+            entry for entry in map(parse_log_line, log_file)
+            if entry is not None
+        ]
+
+
+def get_run_names(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: dict(str, str): run ID -> run name
+    """
+    return {
+        entry[LEDGER_RUN_ID]: entry[LEDGER_RUN_NAME]
+        for entry in entries if entry[LEDGER_TYPE] == RUN_ID
+    }
+
+
+def get_run_samples(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: dict((str, str), list(str)): (run ID, run name) -> sample IDs
+    """
+    run_names = get_run_names(entries)
+    return {(entry[LEDGER_RUN_ID], run_names[entry[LEDGER_RUN_ID]]):
+            entry[LEDGER_SAMPLES]
+            for entry in entries if entry[LEDGER_TYPE] == RUN_SAMPLES}
+
+
+def read_runs_samples(log_file_paths):
+    """
+    :param: log_file_paths (list(str)): paths to input log files
+    :return: dict(str, list(str)): run ID -> sample IDs, for the runs of all
+    log files (from the last log file for a run present in several ones)
+    """
+    runs_samples = {}
+    for log_file_path in log_file_paths:
+        for (run_id, _), sample_id_list in get_run_samples(
+                read_ledger(log_file_path)).items():
+            runs_samples[run_id] = sample_id_list
+    return runs_samples
+
+
+def get_samples_reads(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: dict((str, str), int): (run ID, sample ID) -> number of read
+    pairs, for the samples whose FASTQ files were checked
+    """
+    return {(entry[LEDGER_RUN_ID], entry[LEDGER_SAMPLE_ID]):
+            entry[LEDGER_READS]
+            for entry in entries if entry[LEDGER_TYPE] == RUN_READS}
+
+
+def get_warnings(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: list(dict): WARNING entries
+    """
+    return [entry for entry in entries if entry[LEDGER_TYPE] == WARNING]
+
+
+def get_aws_commands(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: dict(str, str): run ID -> AWS command used to submit it
+    """
+    return {
+        entry[LEDGER_RUN_ID]: entry[LEDGER_MESSAGE]
+        for entry in entries if entry[LEDGER_TYPE] == AWS_CMD
+    }
+
+
+def get_run_jobs(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: dict(str, str): run ID -> name of the AWS Batch job of the run,
+    for the runs submitted with jobs packing (without packing, the job of a
+    run is named after the run)
+    """
+    return {
+        run_id: entry[LEDGER_JOB_NAME]
+        for entry in entries if entry[LEDGER_TYPE] == AWS_JOB
+        for run_id in entry[LEDGER_RUNS]
+    }
+
+
+def get_ok_runs(entries):
+    """
+    :param: entries (list(dict)): ledger entries
+    :return: list(str): IDs of the runs with an INFO entry and not logged as
+    unprocessed after their last INFO entry (failed job submission or results
+    extraction), in the order of their first INFO entry
+    """
+    runs_ok = {}
+    for entry in entries:
+        if entry[LEDGER_TYPE] == INFO:
+            runs_ok[entry[LEDGER_RUN_ID]] = True
+        elif (entry[LEDGER_TYPE] == WARNING
+              and entry[LEDGER_MESSAGE] == ERROR_RUN_UNPROCESSED
+              and entry[LEDGER_RUN_ID] in runs_ok):
+            runs_ok[entry[LEDGER_RUN_ID]] = False
+    return [run_id for run_id, run_ok in runs_ok.items() if run_ok]
+
+
+def get_input_runs(entries):
+    """
+    :param: entries (list(dict)): ledger entries of an input log file
+    :return: see read_input_log_file
+    """
+    run_names = get_run_names(entries)
+    unprocessed_runs = [(entry[LEDGER_RUN_ID], run_names[entry[LEDGER_RUN_ID]])
+                        for entry in get_warnings(entries)
+                        if entry[LEDGER_MESSAGE] == ERROR_RUN_UNPROCESSED]
+    # Runs whose job submission failed have samples but are unprocessed
+    unprocessed_run_ids = {run_id for (run_id, _) in unprocessed_runs}
+    sample_id_lists = {
+        (run_id, run_name): sample_id_list
+        for (run_id, run_name), sample_id_list in get_run_samples(
+            entries).items() if run_id not in unprocessed_run_ids
+    }
+    return (sample_id_lists, unprocessed_runs)
+
+
+def read_input_log_file(log_file_path):
+    """
+    Reads an input log file to extract the run IDs and the sample IDs  list for
+    each run.
+    :param: log_file_path (str): path to input log file
+    :return: dict(str,list(str)), list((str,str)):
+    dictionary, indexed by pairs (run_id, run_name), of sample lists
+    list (run_id, run_name) of unprocessed runs
+    """
+    return get_input_runs(read_ledger(log_file_path))
+
+
+def read_output_log_file(log_file_path):
+    """
+    Reads an output log file to extract the run ID for runs that went OK.
+    :param: log_file_path (str): path to output log file
+    :return: list(str): lst of run IDs
+    """
+    return get_ok_runs(read_ledger(log_file_path))
+
+
+if __name__ == "__main__":
+    """
+    Converts log files into ledger files (.log replaced by .jsonl)
+
+    Arguments:
+    - log_files: log files to convert
+    """
+    ARGS_LOG_FILES = ['log_files', None, 'Log files']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: conversion of log files into ledgers')
+    parser.add_argument(ARGS_LOG_FILES[0],
+                        type=str,
+                        nargs='+',
+                        help=ARGS_LOG_FILES[2])
+    args = parser.parse_args()
+
+    for log_file_path in args.log_files:
+        if not log_file_path.endswith(LOG_EXT):
+            print(f"{WARNING}\t{log_file_path}\tnot a log file")
+            continue
+        ledger_file_path = convert_log_file(log_file_path)
+        print(f"{INFO}\t{log_file_path}\t{ledger_file_path}")
@@ -6,15 +6,20 @@ Functions to run the indels pipeline on AWS for a list of runs
 # Standard imports
 import argparse
 import csv
+import gzip
 import os
 import re
-import subprocess
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # Local imports
-from common_utils import (AWS_CMD, ERROR_FASTQ, ERROR_NONE, ERROR_RUN_NO_DATA,
+from analysis_utils import CCHAUVE_S3_OUTPUT, RUN_IO_ERRORS, check_run_outputs
+from common_utils import (AWS_CMD, AWS_JOB, ERROR_FASTQ, ERROR_FASTQ_READS,
+                          ERROR_NONE, ERROR_RUN_DONE, ERROR_RUN_NO_DATA,
                           ERROR_RUN_NO_SAMPLE, ERROR_RUN_UNPROCESSED, INFO,
-                          RUN_ID, RUN_SAMPLES, WARNING, get_files_in_s3)
+                          RUN_ID, RUN_READS, RUN_SAMPLES, WARNING)
+from run_ledger import RunLog
+from s3_utils import S3Error, call_aws, get_files_in_s3, open_s3, retry
 
 # Manifests
 MANIFESTS = {
@@ -26,7 +31,22 @@ MANIFEST_KEY_LG = len(list(MANIFESTS.keys())[0])
 # Default AWS parameters
 AWS_QUEUE = 'cchauve-orchestration-default'
 AWS_DEF = 'cchauve'
+AWS_REGION = 'ca-central-1'
 AWS_RM = ['aws', 's3', 'rm']
+# Default maximum number of samples of a job running several runs; 0 to
+# submit one job per run. Packing runs requires an indels-pipeline branch
+# accepting lists of run IDs (see get_job_aws_cmd), so it is off by default
+JOB_CAPACITY = 0
+# Branches of the indels-pipeline repo accepting lists of run IDs, the only
+# ones runs can be packed with; none does yet
+JOB_PACKING_BRANCHES = set()
+# Separator of the run IDs of a job in the pipeline parameters
+JOB_RUNS_SEP = ','
+# Errors of a FASTQ file logged as a failed deep check: S3 errors and
+# corrupted or truncated files (see count_fastq_reads)
+FASTQ_ERRORS = RUN_IO_ERRORS + (ValueError, )
+# Default number of runs whose outputs are probed concurrently
+OUTPUT_PROBE_THREADS = 16
 
 
 def get_runs_manifests_list(runs_csv_file):
@@ -55,6 +75,11 @@ CHECK_SAMPLE_OUT_ERROR_DIR = 'not a sample dir'  # checked if sample directory
 CHECK_SAMPLE_OUT_ERROR_FILE = 'not a raw fastq file'  # Sample dir. not a FASTQ
 CHECK_SAMPLE_OUT_OK = 'raw fastq file'  # Sample directory and FASTQ file
 FASTQ_EXT = '_001.fastq.gz'
+# Deep check of the FASTQ files: number of files read concurrently and size of
+# the decompressed chunks
+FASTQ_CHECK_THREADS = 8
+FASTQ_CHUNK_SIZE = 1 << 20
+FASTQ_LINES_PER_READ = 4
 
 
 def is_sample_file(file_path_split):
@@ -90,20 +115,113 @@ def is_sample_file(file_path_split):
         return (CHECK_SAMPLE_OUT_OK, (sample_id, file_path_split[3]))
 
 
-def check_input_data(run_id, s3_bucket, log_file):
+def count_fastq_reads(fastq_file_path):
+    """
+    Counts the reads of a gzipped FASTQ file, streamed by chunks of
+    FASTQ_CHUNK_SIZE decompressed bytes; reading the file to its end checks
+    its gzip CRC32 and length
+    :param: fastq_file_path (str): path to the file, possibly in an S3 bucket
+    :return: int: number of reads
+    :raise: OSError, EOFError if the file is corrupted or truncated,
+    ValueError if its number of lines is not a multiple of 4
+    """
+    nb_lines = 0
+    with open_s3(fastq_file_path, 'rb', decompress=False) as gz_file:
+        with gzip.GzipFile(fileobj=gz_file) as fastq_file:
+            try:
+                for chunk in iter(lambda: fastq_file.read(FASTQ_CHUNK_SIZE),
+                                  b''):
+                    nb_lines += chunk.count(b'\n')
+            except (OSError, EOFError) as error:
+                raise type(error)(f"{fastq_file_path}: {error}") from error
+    if nb_lines % FASTQ_LINES_PER_READ != 0:
+        raise ValueError(f"{fastq_file_path}: {nb_lines} lines")
+    return nb_lines // FASTQ_LINES_PER_READ
+
+
+def check_fastq_files(run_id,
+                      s3_bucket,
+                      fastq_pairs,
+                      log_file,
+                      nb_threads=FASTQ_CHECK_THREADS):
+    """
+    Deep check of the FASTQ files of a run: each file is streamed from S3 and
+    its reads counted (see count_fastq_reads), nb_threads files at a time;
+    the R1 and R2 files of each pair must have the same number of reads.
+    The number of read pairs of each sample is logged as
+    RUN.READS:<run_id>:<sample_id>\t<number of read pairs>
+    :param: run_id (str): run ID
+    :param: s3_bucket (str): bucket containing the data (in input directory)
+    :param: fastq_pairs (dict(str, list((str, str)))): sample ID -> pairs of
+    R1 and R2 FASTQ file names
+    :param: log_file (opened file): log file
+    :param: nb_threads (int): number of files read concurrently
+    :return: bool: True if all files are valid
+    """
+    def get_fastq_path(sample_id, file_name):
+        return os.path.join('s3://', s3_bucket, 'input', run_id, sample_id,
+                            file_name)
+
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        reads_futures = {
+            sample_id: [(executor.submit(retry, count_fastq_reads,
+                                         get_fastq_path(sample_id, R1)),
+                         executor.submit(retry, count_fastq_reads,
+                                         get_fastq_path(sample_id, R2)))
+                        for (R1, R2) in pairs]
+            for sample_id, pairs in fastq_pairs.items()
+        }
+        check_ok = True
+        for sample_id, pairs_futures in reads_futures.items():
+            nb_reads, sample_ok = 0, True
+            for R1_future, R2_future in pairs_futures:
+                try:
+                    R1_nb_reads = R1_future.result()
+                    R2_nb_reads = R2_future.result()
+                except FASTQ_ERRORS as error:
+                    log_file.write(
+                        f"{WARNING}:{run_id}:{sample_id}\t{error}\n")
+                    sample_ok = False
+                    continue
+                if R1_nb_reads != R2_nb_reads:
+                    log_file.write(
+                        f"{WARNING}:{run_id}:{sample_id}\t{ERROR_FASTQ_READS}"
+                        f" {R1_nb_reads} {R2_nb_reads}\n")
+                    sample_ok = False
+                nb_reads += R1_nb_reads
+            if sample_ok:
+                log_file.write(
+                    f"{RUN_READS}:{run_id}:{sample_id}\t{nb_reads}\n")
+            check_ok = check_ok and sample_ok
+    return check_ok
+
+
+def check_input_data(run_id,
+                     s3_bucket,
+                     log_file,
+                     deep_check=False,
+                     nb_threads=FASTQ_CHECK_THREADS):
     """
     Checks that the input data for run_id exists and is composed of two raw
     FASTQ files per sample
     :param: run_id (str): run ID
     :param: s3_bucket (str): bucket containing the data (in input directory)
     :param: log_file (opened file): log file
-    :return: bool: True if all samples have the expected files
+    :param: deep_check (bool): if True, the content of the FASTQ files is
+    also checked (see check_fastq_files)
+    :param: nb_threads (int): number of FASTQ files read concurrently
+    :return: list(str): IDs of the samples of the run if all samples have the
+    expected files, None otherwise
     """
     prefix = f"input/{run_id}"
-    s3_files = get_files_in_s3(prefix, s3_bucket)
+    try:
+        s3_files = get_files_in_s3(prefix, s3_bucket)
+    except S3Error as error:
+        log_file.write(f"{WARNING}:{run_id}\t{error}\n")
+        return None
     if s3_files is None:
         log_file.write(f"{WARNING}.{run_id}\t{ERROR_RUN_NO_DATA}\n")
-        return False
+        return None
     else:
         fastq_files = defaultdict(list)
         for file in s3_files:
@@ -115,34 +233,319 @@ def check_input_data(run_id, s3_bucket, log_file):
             ]:
                 log_file.write(
                     f"{WARNING}:{run_id}\t{' '.join(s3_check_sample)}\n")
-                return False
+                return None
             if s3_check_sample[0] != CHECK_SAMPLE_OUT_FILE:
                 fastq_files[s3_check_sample[1][0]].append(
                     s3_check_sample[1][1])
         sample_id_list = list(fastq_files.keys())
         if len(sample_id_list) == 0:
             log_file.write(f"{WARNING}:{run_id}\t{ERROR_RUN_NO_SAMPLE}\n")
-            return False
+            return None
         else:
-            sample_id_correct = []
+            sample_id_correct, fastq_pairs = [], {}
             for sample_id in sample_id_list:
                 files_list = fastq_files[sample_id]
                 files_nb = len(files_list)
                 if files_nb % 2 != 0:
                     log_file.write(
                         f"{WARNING}:{run_id}:{sample_id}\t{ERROR_FASTQ}\n")
-                    return False
+                    return None
                 files_list.sort()
+                fastq_pairs[sample_id] = []
                 for i in range(0, files_nb, 2):
                     R1, R2 = files_list[i], files_list[i + 1]
                     if R1.replace('_R1_', '') != R2.replace('_R2_', ''):
                         log_file.write(
                             f"{WARNING}:{run_id}:{sample_id}\t{ERROR_FASTQ}\n")
-                        return False
+                        return None
+                    fastq_pairs[sample_id].append((R1, R2))
                 sample_id_correct.append(sample_id)
+            if deep_check and not check_fastq_files(
+                    run_id, s3_bucket, fastq_pairs, log_file, nb_threads):
+                return None
             log_file.write(
                 f"{RUN_SAMPLES}:{run_id}\t{' '.join(sample_id_correct)}\n")
-    return True
+            return sample_id_correct
+
+
+def check_packing_branch(branch, packing):
+    """
+    :param: branch (str): branch of the indels-pipeline repo to use
+    :param: packing (bool): True if runs are packed in jobs
+    :raise: ValueError if packing and branch is not in JOB_PACKING_BRANCHES
+    """
+    if packing and branch not in JOB_PACKING_BRANCHES:
+        raise ValueError(f"branch {branch} does not accept lists of run IDs, "
+                         f"runs can not be packed in jobs")
+
+
+def get_job_aws_cmd(job_name, run_id_list, manifest, branch, s3_input,
+                    s3_output, aws_def, aws_queue):
+    """
+    Returns the AWS Batch command submitting the indels pipeline for a list of
+    runs with the same manifest, in a single job; run IDs are given to the
+    pipeline as comma-separated lists (--run_id, --publish_dir_name) so that
+    the results of each run are written in <s3_output>/<run_id>.
+    For several runs, the branch must accept such lists for --run_id and
+    --publish_dir_name: a branch taking a single run ID would look for the
+    input of a run named after the joined IDs, which does not exist
+    :param: job_name (str): name of the AWS Batch job
+    :param: run_id_list (list(str)): run IDs
+    :param: manifest (str): amplicon manifest of the runs
+    :param: branch (str): branch of the indels-pipeline repo to use
+    :param: s3_input (str): S3 bucket containing the runs input data
+    :param: s3_output (str): S3 bucket where to store the results, None to use
+    the default value of nextflow.config
+    :param: aws_def (str): --job-definition value for aws
+    :param: aws_queue (str): --job-queue value for aws
+    :return: list(str): AWS command
+    :raise: ValueError if there are several runs and branch is not in
+    JOB_PACKING_BRANCHES
+    """
+    check_packing_branch(branch, len(run_id_list) > 1)
+    run_ids = JOB_RUNS_SEP.join(run_id_list)
+    aws_cmd = ['aws', 'batch', 'submit-job']
+    aws_cmd += ['--job-name', job_name]
+    aws_cmd += ['--job-queue', aws_queue]
+    aws_cmd += ['--job-definition', aws_def]
+    aws_cmd += ['--container-overrides']
+    cmd_options = ['command=contextual-genomics/indels-pipeline']
+    cmd_options += ['\"-r\"', f"\"{branch}\""]
+    cmd_options += ['\"--run_id\"', f"\"{run_ids}\""]
+    cmd_options += ['\"--manifest\"', f"\"{manifest}\""]
+    cmd_options += ['\"--snpeff_path\"', '\"/opt/snpEff\"']
+    cmd_options += ['\"--publish_dir_name\"', f"\"{run_ids}\""]
+    cmd_options += ['\"--input_dir\"', f"\"s3://{s3_input}/input/\""]
+    if s3_output is not None:
+        # Otherwise it uses arams.output_dir from nextflow.config
+        cmd_options += ['\"--output_dir\"', f"\"s3://{s3_output}/\""]
+    cmd_options += ['\"-resume\"']
+    aws_cmd += [','.join(cmd_options)]
+    aws_cmd += ['--region', AWS_REGION]
+    return aws_cmd
+
+
+def get_aws_cmd(run_id, manifest, branch, s3_input, s3_output, aws_def,
+                aws_queue):
+    """
+    Returns the AWS Batch command submitting the indels pipeline for a run,
+    in a job named after the run
+    :param: run_id (str): run ID
+    :param: manifest, branch, s3_input, s3_output, aws_def, aws_queue: see
+    get_job_aws_cmd
+    :return: list(str): AWS command
+    """
+    return get_job_aws_cmd(run_id, [run_id], manifest, branch, s3_input,
+                           s3_output, aws_def, aws_queue)
+
+
+def get_job_name(run_id_list):
+    """
+    :param: run_id_list (list(str)): IDs of the runs of a job
+    :return: str: name of the job, the run ID for a single run
+    """
+    if len(run_id_list) == 1:
+        return run_id_list[0]
+    return f"{run_id_list[0]}-{len(run_id_list)}runs"
+
+
+def pack_runs(runs_samples, capacity):
+    """
+    Groups runs into jobs of at most capacity samples, runs of a job sharing
+    the same manifest (first-fit decreasing); a run with more than capacity
+    samples is alone in its job
+    :param: runs_samples (list((str, str, int))): run ID, manifest and number
+    of samples of the runs
+    :param: capacity (int): maximum number of samples of a job
+    :return: list((str, list(str))): manifest and run IDs of each job, in the
+    order of creation of the jobs
+    """
+    jobs = []
+    for run_id, manifest, nb_samples in sorted(runs_samples,
+                                               key=lambda x: x[2],
+                                               reverse=True):
+        for job in jobs:
+            if job[0] == manifest and job[1] + nb_samples <= capacity:
+                job[1] += nb_samples
+                job[2].append(run_id)
+                break
+        else:
+            jobs.append([manifest, nb_samples, [run_id]])
+    return [(manifest, run_id_list) for manifest, _, run_id_list in jobs]
+
+
+def get_processed_runs(runs_samples,
+                       s3_output=None,
+                       nb_probes=OUTPUT_PROBE_THREADS):
+    """
+    Probes the outputs of a set of runs, nb_probes runs at a time, with the
+    checks of the analysis (see analysis_utils.check_run_outputs); a run
+    whose outputs can not be read is considered as not processed
+    :param: runs_samples (list((str, list(str)))): run ID and sample IDs of
+    the runs
+    :param: s3_output (str): S3 bucket containing the results, None for the
+    default results bucket of the analysis (CCHAUVE_S3_OUTPUT)
+    :param: nb_probes (int): number of runs probed concurrently
+    :return: list(str): IDs of the runs whose outputs are complete, in the
+    order of runs_samples
+    """
+    s3_bucket = CCHAUVE_S3_OUTPUT if s3_output is None else s3_output
+
+    def is_processed(run_id, sample_id_list):
+        try:
+            run_error = check_run_outputs(run_id, sample_id_list, s3_bucket)
+        except RUN_IO_ERRORS:
+            return False
+        return run_error == ERROR_NONE
+
+    with ThreadPoolExecutor(max_workers=nb_probes) as executor:
+        futures = [
+            executor.submit(is_processed, run_id, sample_id_list)
+            for run_id, sample_id_list in runs_samples
+        ]
+        return [
+            run_id for (run_id, _), future in zip(runs_samples, futures)
+            if future.result()
+        ]
+
+
+def submit_job(run_id_list, manifest, branch, s3_input, log_file, s3_output,
+               aws_def, aws_queue, packing):
+    """
+    Submits the AWS job of a list of runs, without retrying a failed
+    submission that may have created the job; the runs of a job whose
+    submission fails are logged as unprocessed
+    :param: run_id_list (list(str)): IDs of the runs of the job
+    :param: log_file (opened file): log file
+    :param: packing (bool): if True the job and its runs are logged (AWS.JOB)
+    :param: manifest, branch, s3_input, s3_output, aws_def, aws_queue: see
+    get_job_aws_cmd
+    """
+    job_name = get_job_name(run_id_list)
+    aws_cmd = get_job_aws_cmd(job_name, run_id_list, manifest, branch,
+                              s3_input, s3_output, aws_def, aws_queue)
+    if packing:
+        log_file.write(f"{AWS_JOB}:{job_name}\t{' '.join(run_id_list)}\n")
+    for run_id in run_id_list:
+        log_file.write(f"{INFO}:{run_id}\t{ERROR_NONE}\n")
+        log_file.write(f"{AWS_CMD}:{run_id}\t{' '.join(aws_cmd)}\n")
+    try:
+        call_aws(aws_cmd)
+    except S3Error as error:
+        for run_id in run_id_list:
+            log_file.write(f"{WARNING}:{run_id}\t{error}\n")
+            log_file.write(f"{WARNING}:{run_id}\t{ERROR_RUN_UNPROCESSED}\n")
+
+
+def get_input_log_file_path(runs_csv_file):
+    """
+    :param: runs_csv_file (str): path to the runs CSV file
+    :return: str: path to the input log file of the runs, in log
+    """
+    _, run_file_name = os.path.split(runs_csv_file)
+    return os.path.join('log', run_file_name.replace('.csv', '_input.log'))
+
+
+def submit_runs_list(runs_manifests_list,
+                     s3_input,
+                     branch,
+                     log_file,
+                     s3_output=None,
+                     aws_def=AWS_DEF,
+                     aws_queue=AWS_QUEUE,
+                     deep_check=False,
+                     nb_threads=FASTQ_CHECK_THREADS,
+                     job_capacity=JOB_CAPACITY,
+                     skip_done=False,
+                     nb_probes=OUTPUT_PROBE_THREADS):
+    """
+    Checks the input data for a list of runs and submits AWS jobs for the
+    valid runs; a run whose data can not be listed after retries or whose
+    job submission fails (not retried, see submit_job) is logged as
+    unprocessed
+    If job_capacity is positive, the valid runs are submitted once all runs
+    are checked, packed in jobs of at most job_capacity samples (see
+    pack_runs), each job being logged with its runs (AWS.JOB); otherwise
+    each valid run is submitted in its own job as soon as it is checked.
+    If skip_done is True, the valid runs are submitted once all runs are
+    checked and their outputs probed (see get_processed_runs): runs whose
+    outputs are complete are not submitted and are logged as already
+    processed (INFO), so they are analyzed with the submitted runs.
+    :param: runs_manifests_list (list((str, str, str))): run ID, manifest and
+    run name of the runs (see get_runs_manifests_list)
+    :param: log_file (opened file): log file
+    :param: s3_input, branch, s3_output, aws_def, aws_queue: see get_aws_cmd
+    :param: deep_check, nb_threads: see check_input_data
+    :param: job_capacity (int): maximum number of samples of a job
+    :param: skip_done (bool): if True, runs with complete outputs in
+    s3_output are not submitted
+    :param: nb_probes (int): see get_processed_runs
+    :raise: ValueError if job_capacity is positive and branch is not in
+    JOB_PACKING_BRANCHES
+    """
+    packing = job_capacity > 0
+    check_packing_branch(branch, packing)
+    runs_samples = []
+    for (run_id, manifest, run_name) in runs_manifests_list:
+        log_file.write(f"{RUN_ID}:{run_id}.{run_name}\n")
+        sample_id_list = check_input_data(run_id, s3_input, log_file,
+                                          deep_check, nb_threads)
+        if not sample_id_list:
+            log_file.write(f"{WARNING}:{run_id}\t{ERROR_RUN_UNPROCESSED}\n")
+        elif packing or skip_done:
+            runs_samples.append((run_id, manifest, sample_id_list))
+        else:
+            submit_job([run_id], manifest, branch, s3_input, log_file,
+                       s3_output, aws_def, aws_queue, packing)
+    if skip_done:
+        processed_runs = set(
+            get_processed_runs([(run_id, sample_id_list)
+                                for run_id, _, sample_id_list in runs_samples],
+                               s3_output, nb_probes))
+        for run_id, _, _ in runs_samples:
+            if run_id in processed_runs:
+                log_file.write(f"{INFO}:{run_id}\t{ERROR_RUN_DONE}\n")
+        runs_samples = [
+            run for run in runs_samples if run[0] not in processed_runs
+        ]
+    if packing:
+        runs_sizes = [(run_id, manifest, len(sample_id_list))
+                      for run_id, manifest, sample_id_list in runs_samples]
+        jobs = pack_runs(runs_sizes, job_capacity)
+    else:
+        jobs = [(manifest, [run_id]) for run_id, manifest, _ in runs_samples]
+    for manifest, run_id_list in jobs:
+        submit_job(run_id_list, manifest, branch, s3_input, log_file,
+                   s3_output, aws_def, aws_queue, packing)
+
+
+def submit_runs(runs_csv_file,
+                s3_input,
+                branch,
+                s3_output=None,
+                aws_def=AWS_DEF,
+                aws_queue=AWS_QUEUE,
+                deep_check=False,
+                nb_threads=FASTQ_CHECK_THREADS,
+                job_capacity=JOB_CAPACITY,
+                skip_done=False,
+                nb_probes=OUTPUT_PROBE_THREADS):
+    """
+    Checks the input data for a list of runs and submits AWS jobs for each
+    valid run (see submit_runs_list)
+    :param: runs_csv_file (str): CSV file with 2 fields <run_name>,<run_id>
+    :param: s3_input, branch, s3_output, aws_def, aws_queue: see get_aws_cmd
+    :param: deep_check, nb_threads: see check_input_data
+    :param: job_capacity, skip_done, nb_probes: see submit_runs_list
+    :return: str: path to the input log file of the runs
+    """
+    log_file_path = get_input_log_file_path(runs_csv_file)
+    with RunLog(log_file_path) as log_file:
+        submit_runs_list(get_runs_manifests_list(runs_csv_file), s3_input,
+                         branch, log_file, s3_output, aws_def, aws_queue,
+                         deep_check, nb_threads, job_capacity, skip_done,
+                         nb_probes)
+    return log_file_path
 
 
 if __name__ == "__main__":
@@ -168,6 +571,23 @@ if __name__ == "__main__":
       default value: cchauve-orchestration-default (AWS_QUEUE)
     - trace_path: optional parameters, if present, S3 directory where reports
       are written
+    - deep_check (optional): if present, the FASTQ files are also streamed
+      from S3 to check their gzip integrity and that R1 and R2 files have the
+      same number of reads; the number of read pairs of each sample is
+      written in the log file
+    - nb_threads (optional): number of FASTQ files read concurrently by the
+      deep check; default = 8
+    - job_capacity (optional): if positive, runs with the same manifest are
+      packed in AWS jobs of at most job_capacity samples, each job being
+      logged with its runs in a line AWS.JOB:<job_name>\t<run IDs>; requires
+      a branch of JOB_PACKING_BRANCHES, accepting lists of run IDs (see
+      get_job_aws_cmd); default = 0 (one job per run)
+    - skip_done (optional): if present, the outputs of the runs passing the
+      checks are probed in s3_output (default bucket of analysis_utils.py if
+      s3_output is not given) and the runs whose outputs are complete are not
+      submitted, being logged as INFO:<run_id>\talready processed
+    - nb_probes (optional): number of runs whose outputs are probed
+      concurrently; default = 16
 
     Checks the directory <s3_input>/input/<run_id> for each run and looks into
     every directory ending by -XX_SYY where XX and YY are integers that there
@@ -193,6 +613,14 @@ if __name__ == "__main__":
     ARGS_AWS_DEF = ['-d', '--aws_def', 'AWS definition']
     # AWS queue
     ARGS_AWS_QUEUE = ['-q', '--aws_queue', 'AWS queue']
+    # Deep check of the FASTQ files
+    ARGS_DEEP_CHECK = ['--deep_check', None, 'Check the FASTQ files content']
+    ARGS_NB_THREADS = ['-t', '--nb_threads', 'Number of FASTQ files read']
+    # Jobs packing
+    ARGS_JOB_CAPACITY = ['-c', '--job_capacity', 'Maximum samples per job']
+    # Runs already processed
+    ARGS_SKIP_DONE = ['--skip_done', None, 'Skip runs with complete outputs']
+    ARGS_NB_PROBES = ['--nb_probes', None, 'Number of runs outputs probed']
 
     parser = argparse.ArgumentParser(description='Indels pipeline: run on AWS')
     parser.add_argument(ARGS_RUNS_FILE[0], type=str, help=ARGS_RUNS_FILE[2])
@@ -214,45 +642,31 @@ if __name__ == "__main__":
                         default=AWS_QUEUE,
                         type=str,
                         help=ARGS_AWS_QUEUE[2])
+    parser.add_argument(ARGS_DEEP_CHECK[0],
+                        action='store_true',
+                        help=ARGS_DEEP_CHECK[2])
+    parser.add_argument(ARGS_NB_THREADS[0],
+                        ARGS_NB_THREADS[1],
+                        type=int,
+                        default=FASTQ_CHECK_THREADS,
+                        help=ARGS_NB_THREADS[2])
+    parser.add_argument(ARGS_JOB_CAPACITY[0],
+                        ARGS_JOB_CAPACITY[1],
+                        type=int,
+                        default=JOB_CAPACITY,
+                        help=ARGS_JOB_CAPACITY[2])
+    parser.add_argument(ARGS_SKIP_DONE[0],
+                        action='store_true',
+                        help=ARGS_SKIP_DONE[2])
+    parser.add_argument(ARGS_NB_PROBES[0],
+                        type=int,
+                        default=OUTPUT_PROBE_THREADS,
+                        help=ARGS_NB_PROBES[2])
     args = parser.parse_args()
 
-    # Creating a log file located in the same directory than the YAML
-    # configuration file and with the same name with .yaml replaced by .log
-    _, run_file_name = os.path.split(args.runs_csv_file)
-    log_file_path = os.path.join('log',
-                                 run_file_name.replace('.csv', '_input.log'))
-    log_file = open(log_file_path, 'w')
-
-    runs_manifests_list = get_runs_manifests_list(args.runs_csv_file)
-    for (run_id, manifest, run_name) in runs_manifests_list:
-        log_file.write(f"{RUN_ID}:{run_id}.{run_name}\n")
-        check_run = check_input_data(run_id, args.s3_input, log_file)
-        if check_run:
-            aws_cmd = ['aws', 'batch', 'submit-job']
-            aws_cmd += ['--job-name', run_id]
-            aws_cmd += ['--job-queue', args.aws_queue]
-            aws_cmd += ['--job-definition', args.aws_def]
-            aws_cmd += ['--container-overrides']
-            cmd_options = ['command=contextual-genomics/indels-pipeline']
-            cmd_options += ['\"-r\"', f"\"{args.branch}\""]
-            cmd_options += ['\"--run_id\"', f"\"{run_id}\""]
-            cmd_options += ['\"--manifest\"', f"\"{manifest}\""]
-            cmd_options += ['\"--snpeff_path\"', '\"/opt/snpEff\"']
-            cmd_options += ['\"--publish_dir_name\"', f"\"{run_id}\""]
-            cmd_options += [
-                '\"--input_dir\"', f"\"s3://{args.s3_input}/input/\""
-            ]
-            if args.s3_output is not None:
-                # Otherwise it uses arams.output_dir from nextflow.config
-                cmd_options += [
-                    '\"--output_dir\"', f"\"s3://{args.s3_output}/\""
-                ]
-            cmd_options += ['\"-resume\"']
-            aws_cmd += [','.join(cmd_options)]
-            aws_cmd += ['--region', 'ca-central-1']
-            log_file.write(f"{INFO}:{run_id}\t{ERROR_NONE}\n")
-            log_file.write(f"{AWS_CMD}:{run_id}\t{' '.join(aws_cmd)}\n")
-            subprocess.call(aws_cmd)
-        else:
-            log_file.write(f"{WARNING}:{run_id}\t{ERROR_RUN_UNPROCESSED}\n")
-    log_file.close()
+    # Creating a log file located in log with the same name than the runs CSV
+    # file with .csv replaced by _input.log
+    submit_runs(args.runs_csv_file, args.s3_input, args.branch,
+                args.s3_output, args.aws_def, args.aws_queue,
+                args.deep_check, args.nb_threads, args.job_capacity,
+                args.skip_done, args.nb_probes)
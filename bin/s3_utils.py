@@ -0,0 +1,307 @@
+"""
+Access to S3 and AWS commands with retries
+Each request (listing, read, copy) failing with a transient error
+(throttling, server or network error, incomplete copy) is attempted up to
+S3_RETRIES times, waiting between attempts an exponential backoff delay with
+full jitter; copied archives are verified against the checksum of the S3
+object. A request failing after all its attempts, or with a non transient
+AWS or I/O error, raises S3Error. AWS commands (job submissions) are not
+retried, as a failed submission may still have created its job.
+Only standard modules are imported at load time, third-party modules (boto3,
+smart_open) are imported by the functions using them
+"""
+
+# Standard imports
+import base64
+import gzip
+import hashlib
+import os
+import random
+import socket
+import subprocess
+import time
+import zlib
+
+# AWS cp command
+AWS_CP = ['aws', 's3', 'cp']
+S3_PREFIX = 's3://'
+
+# Number of attempts of a request
+S3_RETRIES = 5
+# Backoff delays in seconds: attempt i waits a random delay in
+# [0, min(S3_BACKOFF_MAX, S3_BACKOFF_BASE * 2^i)]
+S3_BACKOFF_BASE = 1.0
+S3_BACKOFF_MAX = 30.0
+# Size of the chunks read to compute checksums
+CHECKSUM_CHUNK_SIZE = 1 << 20
+# Codes of the AWS errors solved by retrying the request, in addition to the
+# server errors (HTTP status 5xx)
+TRANSIENT_ERROR_CODES = [
+    'Throttling', 'ThrottlingException', 'ThrottledException',
+    'RequestThrottledException', 'TooManyRequestsException', 'SlowDown',
+    'RequestLimitExceeded', 'RequestTimeout', 'RequestTimeoutException',
+    'InternalError', 'ServiceUnavailable'
+]
+
+
+class S3Error(Exception):
+    """
+    S3 request or AWS command failing after all its attempts
+    """
+    pass
+
+
+class S3TransientError(S3Error):
+    """
+    S3 request failing with an error that retrying it may solve
+    """
+    pass
+
+
+def is_transient_error(error):
+    """
+    :param: error (Exception): error raised by a request
+    :return: bool: True if the error is a throttling, server or network
+    error, or an incomplete copy
+    """
+    import botocore.exceptions
+
+    if isinstance(error, S3TransientError):
+        return True
+    elif isinstance(error, botocore.exceptions.ClientError):
+        response = error.response
+        error_code = response.get('Error', {}).get('Code')
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return error_code in TRANSIENT_ERROR_CODES or status >= 500
+    return isinstance(error, (botocore.exceptions.ConnectionError,
+                              botocore.exceptions.HTTPClientError,
+                              ConnectionError, TimeoutError, socket.gaierror))
+
+
+def get_backoff_delay(attempt,
+                      backoff_base=S3_BACKOFF_BASE,
+                      backoff_max=S3_BACKOFF_MAX):
+    """
+    :param: attempt (int): number of failed attempts, starting at 0
+    :param: backoff_base, backoff_max (float): see S3_BACKOFF_BASE,
+    S3_BACKOFF_MAX
+    :return: float: delay in seconds before the next attempt
+    """
+    return random.uniform(0, min(backoff_max, backoff_base * 2**attempt))
+
+
+def retry(function, *args, retries=S3_RETRIES, backoff_base=S3_BACKOFF_BASE,
+          **kwargs):
+    """
+    Calls function(*args, **kwargs) until it does not raise a transient error
+    (see is_transient_error)
+    :param: retries (int): maximum number of attempts
+    :param: backoff_base (float): see get_backoff_delay
+    :return: value returned by function
+    :raise: S3Error if all attempts fail or at the first non transient AWS or
+    I/O error, chained to the error; other exceptions are raised unchanged
+    """
+    import botocore.exceptions
+
+    function_name = getattr(function, '__name__', function)
+    for attempt in range(retries):
+        try:
+            return function(*args, **kwargs)
+        except Exception as error:
+            last_error = error
+            error_msg = ' '.join(str(error).split())
+            if is_transient_error(error):
+                if attempt < retries - 1:
+                    time.sleep(get_backoff_delay(attempt, backoff_base))
+            elif isinstance(error, S3Error):
+                raise
+            elif isinstance(error, (botocore.exceptions.BotoCoreError,
+                                    botocore.exceptions.ClientError,
+                                    OSError)):
+                raise S3Error(f"{function_name}: {error_msg}") from error
+            else:
+                raise
+    raise S3Error(f"{function_name}: {retries} failed attempts: "
+                  f"{error_msg}") from last_error
+
+
+def split_s3_path(s3_path):
+    """
+    :param: s3_path (str): s3://<bucket>/<key>
+    :return: (str, str): bucket, key
+    """
+    return tuple(s3_path[len(S3_PREFIX):].split('/', 1))
+
+
+def list_objects(prefix, s3_bucket):
+    import boto3
+
+    s3_client = boto3.client('s3')
+    s3_objects = s3_client.list_objects_v2(Bucket=s3_bucket, Prefix=prefix)
+    if s3_objects['KeyCount'] == 0:
+        return None
+    else:
+        return [obj['Key'] for obj in s3_objects['Contents']]
+
+
+def get_files_in_s3(prefix, s3_bucket, retries=S3_RETRIES):
+    """
+    Get a list of files from the indels pipeline output of a run.
+    :param: prefix (str): path to run data, e.g.
+    input/201014_M03829_0366_000000000-JBV6Y
+    :param: s3_bucket (str): S3 bucket containing files to read,
+    e.g. 'cchauve-orchestration-ch', 'ch-testdata'
+    :param: retries (int): maximum number of attempts
+
+    :return: list(str): file paths of files in directory prefix;
+    None if the directory is empty or does not exist
+    """
+    return retry(list_objects, prefix, s3_bucket, retries=retries)
+
+
+def open_s3(file_path, mode='r', decompress=True):
+    """
+    Opens a file that can be in an S3 bucket (path s3://<bucket>/<key>)
+    :param: file_path (str): path to the file
+    :param: mode (str): opening mode
+    :param: decompress (bool): if False, compressed files (.gz) are read as
+    is instead of being decompressed
+    :return: opened file
+    """
+    from smart_open import open as smart_open
+
+    if decompress:
+        return smart_open(file_path, mode)
+    return smart_open(file_path, mode, compression='disable')
+
+
+def read_lines(file_path):
+    with open_s3(file_path, 'r') as in_file:
+        return in_file.readlines()
+
+
+def read_s3_lines(file_path, retries=S3_RETRIES):
+    """
+    :param: file_path (str): path to a file, possibly in an S3 bucket
+    :param: retries (int): maximum number of attempts
+    :return: list(str): lines of the file, read in a single request
+    """
+    return retry(read_lines, file_path, retries=retries)
+
+
+def read_chunks(file_path):
+    with open(file_path, 'rb') as in_file:
+        yield from iter(lambda: in_file.read(CHECKSUM_CHUNK_SIZE), b'')
+
+
+def get_file_crc32(file_path):
+    """
+    :return: str: base64 encoded CRC32 of the file, as in S3 ChecksumCRC32
+    """
+    crc = 0
+    for chunk in read_chunks(file_path):
+        crc = zlib.crc32(chunk, crc)
+    return base64.b64encode(crc.to_bytes(4, 'big')).decode()
+
+
+def get_file_sha256(file_path):
+    """
+    :return: str: base64 encoded SHA256 of the file, as in S3 ChecksumSHA256
+    """
+    sha256 = hashlib.sha256()
+    for chunk in read_chunks(file_path):
+        sha256.update(chunk)
+    return base64.b64encode(sha256.digest()).decode()
+
+
+# S3 checksums of an object checked on downloaded files and the functions
+# computing them
+S3_CHECKSUMS = [('ChecksumSHA256', get_file_sha256),
+                ('ChecksumCRC32', get_file_crc32)]
+
+
+def check_gzip_file(file_path):
+    """
+    Reads a gzip file to its end, which checks the CRC32 of its members
+    :raise: OSError or EOFError if the file is corrupted or truncated
+    """
+    with gzip.open(file_path, 'rb') as in_file:
+        while in_file.read(CHECKSUM_CHUNK_SIZE):
+            pass
+
+
+def check_s3_checksum(s3_path, file_path):
+    """
+    Checks that a downloaded file is identical to the S3 object it was
+    copied from: same size and same SHA256 or CRC32 as the object if S3
+    stores one for the whole object (not for objects uploaded in several
+    parts, whose checksum is computed on the parts checksums); otherwise
+    a gzip file is checked with its own CRC32
+    :param: s3_path (str): s3://<bucket>/<key>
+    :param: file_path (str): path to the downloaded file
+    :raise: S3TransientError if the file differs from the S3 object
+    """
+    import boto3
+
+    s3_bucket, s3_key = split_s3_path(s3_path)
+    s3_object = boto3.client('s3').head_object(Bucket=s3_bucket,
+                                               Key=s3_key,
+                                               ChecksumMode='ENABLED')
+    file_size = os.path.getsize(file_path)
+    if file_size != s3_object['ContentLength']:
+        raise S3TransientError(f"{file_path}: size {file_size} differs from "
+                               f"{s3_path} size {s3_object['ContentLength']}")
+    for checksum_name, get_file_checksum in S3_CHECKSUMS:
+        s3_checksum = s3_object.get(checksum_name)
+        if s3_checksum is not None and '-' not in s3_checksum:
+            file_checksum = get_file_checksum(file_path)
+            if file_checksum != s3_checksum:
+                raise S3TransientError(
+                    f"{file_path}: {checksum_name} {file_checksum} differs "
+                    f"from {s3_path} {checksum_name} {s3_checksum}")
+            return
+    if file_path.endswith('.gz'):
+        try:
+            check_gzip_file(file_path)
+        except (OSError, EOFError, zlib.error) as error:
+            raise S3TransientError(f"{file_path}: {error}") from error
+
+
+def copy_file(s3_path, dest_dir):
+    aws_cmd = AWS_CP + [s3_path, dest_dir]
+    return_code = subprocess.call(aws_cmd)
+    # The copied object was listed, so a failed copy is assumed transient
+    if return_code != 0:
+        raise S3TransientError(
+            f"{' '.join(aws_cmd)}: return code {return_code}")
+    file_path = os.path.join(dest_dir, os.path.basename(s3_path))
+    try:
+        check_s3_checksum(s3_path, file_path)
+    except Exception:
+        os.remove(file_path)
+        raise
+    return file_path
+
+
+def download_s3_file(s3_path, dest_dir='.', retries=S3_RETRIES):
+    """
+    Copies a file from S3 with aws s3 cp and verifies its checksum
+    :param: s3_path (str): s3://<bucket>/<key>
+    :param: dest_dir (str): directory where the file is copied
+    :param: retries (int): maximum number of attempts
+    :return: str: path to the copied file
+    """
+    return retry(copy_file, s3_path, dest_dir, retries=retries)
+
+
+def call_aws(cmd):
+    """
+    Runs an AWS command once: the AWS CLI already retries throttled requests
+    and a command failing after it reached AWS, e.g. a job submission, may
+    have been applied, so running it again could duplicate it
+    :param: cmd (list(str)): command
+    :raise: S3Error if the return code of the command is not 0
+    """
+    return_code = subprocess.call(cmd)
+    if return_code != 0:
+        raise S3Error(f"{' '.join(cmd)}: return code {return_code}")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Sparse matrices of the indels calls of the samples of a set of runs
+- sample x variant matrices of VAF, TCOV and MCOV values
+- sample x amplicon matrix of SCOV values, over the manifests amplicons
+saved in a .npz file, so cross-samples statistics are computed on columns
+"""
+
+# Standard imports
+import argparse
+import os
+
+# Local imports
+from aggregate_dump_files import sample_sort_key, sort_chr
+from common_utils import (DUMP_VALUES_SEP, INDELS, SAMPLE_TYPE_DNA,
+                          SAMPLE_TYPES, VCFDumpRecord, get_amplicons_coords,
+                          get_aggregated_vcf_dump_file, read_dump_records)
+
+# Matrices file suffix
+MATRICES_EXT = '_matrices.npz'
+# Separator of the fields of a variant label
+VARIANT_KEY_SEP = ':'
+
+# Sample x variant matrices
+MATRIX_VAF = 'vaf'
+MATRIX_TCOV = 'tcov'
+MATRIX_MCOV = 'mcov'
+VARIANT_MATRICES = [MATRIX_VAF, MATRIX_TCOV, MATRIX_MCOV]
+# Sample x amplicon matrix
+MATRIX_SCOV = 'scov'
+# Labels of the rows and columns of the matrices
+LABELS_SAMPLES = 'samples'
+LABELS_VARIANTS = 'variants'
+LABELS_AMPLICONS = 'amplicons'
+# Smallest index in amplicons of the source amplicons of each variant, over
+# all its calls (-1 if no source amplicon is in amplicons)
+LABELS_VARIANT_AMPLICONS = 'variant_amplicons'
+# Fields of a CSR matrix in the .npz file
+CSR_FIELDS = ['data', 'indices', 'indptr', 'shape']
+
+
+def get_matrices_file(sample_type, prefix):
+    """
+    :param: sample_type (str): sample type
+    :param: prefix (str): prefix of the path to output directory
+    :return: str: path to the matrices file
+    """
+    return os.path.join(prefix,
+                        f"{sample_type}_samples_{INDELS}{MATRICES_EXT}")
+
+
+def parse_features(features):
+    """
+    :param: features (str): features string, e.g. SCOV:15406,TCOV:78,MCOV:39
+    :return: dict(str, str): feature -> value
+    """
+    return dict(
+        feature.split(':', 1) for feature in features.split(DUMP_VALUES_SEP)
+        if feature)
+
+
+def build_matrices(records, amplicon_ids):
+    """
+    Builds the VAF and coverage matrices of a list of indels calls; a
+    (sample, variant) pair called twice keeps its first call, and the SCOV
+    value of a call is recorded for each amplicon of its source
+    :param: records (list(VCFDumpRecord)): indels calls
+    :param: amplicon_ids (list(str)): amplicons IDs, columns of the SCOV matrix
+    :return: dict: labels (LABELS_*, numpy arrays) and CSR matrices
+    (MATRIX_*) indexed by name
+    """
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    samples = sorted({record.sample for record in records},
+                     key=sample_sort_key)
+    variants = sorted({(r.chr, r.pos, r.ref, r.alt)
+                       for r in records},
+                      key=lambda x: (sort_chr(x[0]), int(x[1]), x[2], x[3]))
+    sample_index = {sample: i for i, sample in enumerate(samples)}
+    variant_index = {variant: j for j, variant in enumerate(variants)}
+    amplicon_index = {amplicon: k for k, amplicon in enumerate(amplicon_ids)}
+
+    # Sparse coordinates and values of the calls
+    calls = {}
+    variant_amplicons = np.full(len(variants), -1, dtype=np.int32)
+    scov = {}
+    for record in records:
+        i = sample_index[record.sample]
+        j = variant_index[(record.chr, record.pos, record.ref, record.alt)]
+        if (i, j) in calls:
+            continue
+        features = parse_features(record.features_cov)
+        calls[(i, j)] = (float(record.VAF), int(features['TCOV']),
+                         int(features['MCOV']))
+        for amplicon in record.source.split(DUMP_VALUES_SEP):
+            k = amplicon_index.get(amplicon, -1)
+            if k < 0:
+                continue
+            if variant_amplicons[j] < 0 or k < variant_amplicons[j]:
+                variant_amplicons[j] = k
+            scov[(i, k)] = max(scov.get((i, k), 0), int(features['SCOV']))
+
+    matrices = {
+        LABELS_SAMPLES: np.array(samples),
+        LABELS_VARIANTS: np.array([VARIANT_KEY_SEP.join(v) for v in variants]),
+        LABELS_AMPLICONS: np.array(amplicon_ids),
+        LABELS_VARIANT_AMPLICONS: variant_amplicons
+    }
+    rows = np.fromiter((i for (i, _) in calls), dtype=np.int32,
+                       count=len(calls))
+    cols = np.fromiter((j for (_, j) in calls), dtype=np.int32,
+                       count=len(calls))
+    values = np.array(list(calls.values()), dtype=np.float64).reshape(-1, 3)
+    shape = (len(samples), len(variants))
+    for m, (name, dtype) in enumerate([(MATRIX_VAF, np.float32),
+                                       (MATRIX_TCOV, np.int32),
+                                       (MATRIX_MCOV, np.int32)]):
+        matrices[name] = csr_matrix(
+            (values[:, m].astype(dtype), (rows, cols)), shape=shape)
+    matrices[MATRIX_SCOV] = csr_matrix(
+        (np.fromiter(scov.values(), dtype=np.int32, count=len(scov)),
+         ([i for (i, _) in scov], [k for (_, k) in scov])),
+        shape=(len(samples), len(amplicon_ids)))
+    return matrices
+
+
+def save_matrices(matrices_file, matrices):
+    """
+    Saves matrices in a compressed .npz file, each CSR matrix as its
+    <name>_data, <name>_indices, <name>_indptr and <name>_shape arrays
+    :param: matrices_file (str): path to the .npz file
+    :param: matrices (dict): see build_matrices
+    """
+    import numpy as np
+    from scipy.sparse import issparse
+
+    arrays = {}
+    for name, matrix in matrices.items():
+        if issparse(matrix):
+            for field in CSR_FIELDS:
+                arrays[f"{name}_{field}"] = np.asarray(getattr(matrix, field))
+        else:
+            arrays[name] = matrix
+    np.savez_compressed(matrices_file, **arrays)
+
+
+def load_matrices(matrices_file):
+    """
+    :param: matrices_file (str): path to a .npz file written by save_matrices
+    :return: dict: see build_matrices
+    """
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    matrices = {}
+    with np.load(matrices_file) as arrays:
+        for name in [
+                LABELS_SAMPLES, LABELS_VARIANTS, LABELS_AMPLICONS,
+                LABELS_VARIANT_AMPLICONS
+        ]:
+            matrices[name] = arrays[name]
+        for name in VARIANT_MATRICES + [MATRIX_SCOV]:
+            data, indices, indptr, shape = [
+                arrays[f"{name}_{field}"] for field in CSR_FIELDS
+            ]
+            matrices[name] = csr_matrix((data, indices, indptr),
+                                        shape=tuple(shape))
+    return matrices
+
+
+def get_variants_stats(matrices):
+    """
+    Column statistics of the VAF matrix
+    :param: matrices (dict): see build_matrices
+    :return: (numpy array, numpy array, numpy array): for each variant, number
+    of samples carrying it, mean and maximum VAF over these samples
+    """
+    import numpy as np
+
+    vaf = matrices[MATRIX_VAF].tocsc()
+    nb_samples = np.diff(vaf.indptr)
+    vaf_sum = np.asarray(vaf.sum(axis=0)).ravel()
+    mean_vaf = np.divide(vaf_sum,
+                         nb_samples,
+                         out=np.zeros(len(nb_samples)),
+                         where=nb_samples > 0)
+    max_vaf = vaf.max(axis=0).toarray().ravel()
+    return nb_samples, mean_vaf, max_vaf
+
+
+if __name__ == "__main__":
+    """
+    Builds the matrices of the indels calls of one type of samples from the
+    aggregated dump file <sample_type>_samples_indels_dump.tsv written by
+    aggregate_dump_files.py and saves them in
+    <sample_type>_samples_indels_matrices.npz.
+
+    Arguments:
+    - output_dir: directory where the aggregated dump files are read and the
+      matrices are written
+    - sample_type (optional): DNA, ctrl or misc; default = DNA
+    """
+    # Results directory
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    # Sample type
+    ARGS_SAMPLE_TYPE = ['-t', '--sample_type', 'Sample type']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: VAF and coverage matrices')
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    parser.add_argument(ARGS_SAMPLE_TYPE[0],
+                        ARGS_SAMPLE_TYPE[1],
+                        type=str,
+                        choices=SAMPLE_TYPES,
+                        default=SAMPLE_TYPE_DNA,
+                        help=ARGS_SAMPLE_TYPE[2])
+    args = parser.parse_args()
+
+    dump_file = get_aggregated_vcf_dump_file(f"{args.sample_type}_samples",
+                                             args.output_dir,
+                                             INDELS,
+                                             init=False)
+    records = read_dump_records(dump_file, VCFDumpRecord)
+    amplicon_ids = sorted(get_amplicons_coords().keys())
+    matrices = build_matrices(records, amplicon_ids)
+    matrices_file = get_matrices_file(args.sample_type, args.output_dir)
+    save_matrices(matrices_file, matrices)
+    nb_samples, nb_variants = matrices[MATRIX_VAF].shape
+    print(f"INFO\tsamples:\t{nb_samples}")
+    print(f"INFO\tvariants:\t{nb_variants}")
+    print(f"INFO\tcalls:\t{matrices[MATRIX_VAF].nnz}")
+    print(f"INFO\tmatrices:\t{matrices_file}")
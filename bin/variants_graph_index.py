@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Compiled index of the variants graph files of a run
+The variants graph files <sample_id>_<amplicon_id>_variants_graph.txt of a
+run are compiled in a single binary file mapping
+(sample ID, amplicon ID, variant chr:pos:ref:alt) to the alignments
+supporting the variant (values separated by DUMP_VALUES_SEP), memory-mapped
+at query time.
+
+File layout (little endian):
+- header: magic (4s), version (I), number of slots (Q), number of entries (Q)
+- hash table of slots: key hash (Q), key offset (Q), key length (I),
+  value offset (Q), value length (I); slots with a key length 0 are empty
+- keys and values, UTF-8 encoded
+Keys are <sample_id>\t<amplicon_id>\t<chr:pos:ref:alt>; collisions are
+resolved by linear probing.
+"""
+
+# Standard imports
+import argparse
+import glob
+import hashlib
+import mmap
+import os
+import struct
+
+# Local imports
+from common_utils import DUMP_VALUES_SEP, V_GRAPH_SUFFIX, get_amplicons_coords
+
+# Index file extension
+V_GRAPH_INDEX_EXT = '_variants_graphs.idx'
+V_GRAPH_INDEX_MAGIC = b'VGIX'
+V_GRAPH_INDEX_VERSION = 1
+V_GRAPH_INDEX_HEADER = struct.Struct('<4sIQQ')
+V_GRAPH_INDEX_SLOT = struct.Struct('<QQIQI')
+# Separator of the fields of an index key
+V_GRAPH_KEY_SEP = '\t'
+
+
+def get_variants_graph_index_file(run_id, prefix):
+    """
+    :param: run_id (str): run ID
+    :param: prefix (str): prefix of the path to output directory
+    :return: str: path to the variants graphs index of the run
+    """
+    return os.path.join(prefix, run_id, f"{run_id}{V_GRAPH_INDEX_EXT}")
+
+
+def get_index_key(sample_id, amplicon_id, v_str):
+    return V_GRAPH_KEY_SEP.join([sample_id, amplicon_id, v_str]).encode()
+
+
+def get_key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(),
+                          'little')
+
+
+def read_variants_graph_file(v_graph_file, amplicon_chr, amplicon_start):
+    """
+    :param: v_graph_file (str): path to a variants graph file
+    :param: amplicon_chr, amplicon_start (str, int): amplicon coordinates
+    :return: dict(str, str): variant chr:pos:ref:alt -> alignments
+    """
+    v_graph_data = {}
+    with open(v_graph_file, 'r') as v_graph:
+        for variant in v_graph:
+            variant_data = variant.rstrip().split('\t')
+            v_str1 = variant_data[1].split(':')
+            v_start = amplicon_start + int(v_str1[2])
+            v_str = f"{amplicon_chr}:{v_start}:{v_str1[4]}:{v_str1[5]}"
+            alignments = variant_data[2]
+            v_graph_data[v_str] = alignments.replace('_', DUMP_VALUES_SEP)
+    return v_graph_data
+
+
+def build_variants_graph_index(tmp_run_dir,
+                               index_file,
+                               amplicons_coords,
+                               v_graph_pairs=None):
+    """
+    Compiles the variants graph files extracted in a directory
+    :param: tmp_run_dir (str): directory containing the variants graph files
+    :param: index_file (str): path to the index file to write
+    :param: amplicons_coords (dict(str, (str, int))): amplicons coordinates
+    :param: v_graph_pairs (set((str, str))): (sample ID, amplicon ID) of the
+    variants graph files to index, all files if None
+    :return: int: number of indexed variants
+    """
+    entries = []
+    v_graph_files = glob.glob(os.path.join(tmp_run_dir, f"*{V_GRAPH_SUFFIX}"))
+    for v_graph_file in sorted(v_graph_files):
+        file_name = os.path.basename(v_graph_file)[:-len(V_GRAPH_SUFFIX)]
+        sample_id, amplicon_id = file_name.rsplit('_', 1)
+        if (v_graph_pairs is not None
+                and (sample_id, amplicon_id) not in v_graph_pairs):
+            continue
+        amplicon_chr, amplicon_start = amplicons_coords[amplicon_id]
+        v_graph_data = read_variants_graph_file(v_graph_file, amplicon_chr,
+                                                amplicon_start)
+        for v_str, alignments in v_graph_data.items():
+            entries.append((get_index_key(sample_id, amplicon_id,
+                                          v_str), alignments.encode()))
+    nb_slots = 1
+    while nb_slots < 2 * len(entries):
+        nb_slots *= 2
+    slots = [None] * nb_slots
+    heap_offset = (V_GRAPH_INDEX_HEADER.size +
+                   nb_slots * V_GRAPH_INDEX_SLOT.size)
+    heap, offset = [], heap_offset
+    for key, value in entries:
+        key_hash = get_key_hash(key)
+        i = key_hash % nb_slots
+        while slots[i] is not None:
+            i = (i + 1) % nb_slots
+        slots[i] = (key_hash, offset, len(key), offset + len(key), len(value))
+        heap += [key, value]
+        offset += len(key) + len(value)
+    empty_slot = V_GRAPH_INDEX_SLOT.pack(0, 0, 0, 0, 0)
+    with open(index_file, 'wb') as out_index:
+        out_index.write(
+            V_GRAPH_INDEX_HEADER.pack(V_GRAPH_INDEX_MAGIC,
+                                      V_GRAPH_INDEX_VERSION, nb_slots,
+                                      len(entries)))
+        out_index.write(b''.join(
+            empty_slot if slot is None else V_GRAPH_INDEX_SLOT.pack(*slot)
+            for slot in slots))
+        out_index.write(b''.join(heap))
+    return len(entries)
+
+
+class VariantsGraphIndex:
+    """
+    Memory-mapped variants graphs index of a run
+    """
+    def __init__(self, index_file):
+        self.index_file = open(index_file, 'rb')
+        self.index = mmap.mmap(self.index_file.fileno(),
+                               0,
+                               access=mmap.ACCESS_READ)
+        magic, version, self.nb_slots, self.nb_entries = (
+            V_GRAPH_INDEX_HEADER.unpack_from(self.index, 0))
+        if magic != V_GRAPH_INDEX_MAGIC or version != V_GRAPH_INDEX_VERSION:
+            self.close()
+            raise ValueError(f"{index_file}: not a variants graphs index")
+
+    def get(self, sample_id, amplicon_id, v_str):
+        """
+        :return: str: alignments supporting variant v_str in amplicon
+        amplicon_id of sample sample_id, None if it is not indexed
+        """
+        key = get_index_key(sample_id, amplicon_id, v_str)
+        key_hash = get_key_hash(key)
+        i = key_hash % self.nb_slots
+        while True:
+            slot_hash, key_offset, key_len, value_offset, value_len = (
+                V_GRAPH_INDEX_SLOT.unpack_from(
+                    self.index,
+                    V_GRAPH_INDEX_HEADER.size + i * V_GRAPH_INDEX_SLOT.size))
+            if key_len == 0:
+                return None
+            if (slot_hash == key_hash and
+                    self.index[key_offset:key_offset + key_len] == key):
+                return self.index[value_offset:value_offset +
+                                  value_len].decode()
+            i = (i + 1) % self.nb_slots
+
+    def close(self):
+        self.index.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == "__main__":
+    """
+    Compiles the variants graph files of a run extracted in a directory (from
+    the <sample_id>_main.tar.gz archives) into
+    output_dir/<run_id>/<run_id>_variants_graphs.idx
+
+    Arguments:
+    - run_id: run ID
+    - v_graph_dir: directory containing the variants graph files
+    - output_dir: directory containing the results of the runs
+    Must be run from the root of the repository (amplicon manifests).
+    """
+    ARGS_RUN_ID = ['run_id', None, 'Run ID']
+    ARGS_V_GRAPH_DIR = ['v_graph_dir', None, 'Variants graph files directory']
+    ARGS_OUTPUT_DIR = ['output_dir', None, 'Output directory']
+    parser = argparse.ArgumentParser(
+        description='Indels pipeline: variants graphs index')
+    parser.add_argument(ARGS_RUN_ID[0], type=str, help=ARGS_RUN_ID[2])
+    parser.add_argument(ARGS_V_GRAPH_DIR[0],
+                        type=str,
+                        help=ARGS_V_GRAPH_DIR[2])
+    parser.add_argument(ARGS_OUTPUT_DIR[0], type=str, help=ARGS_OUTPUT_DIR[2])
+    args = parser.parse_args()
+
+    index_file = get_variants_graph_index_file(args.run_id, args.output_dir)
+    nb_entries = build_variants_graph_index(args.v_graph_dir, index_file,
+                                            get_amplicons_coords())
+    print(f"INFO\t{index_file}\tvariants:\t{nb_entries}")